@@ -1,2 +1,12 @@
-from audiodotturn.adt import AudioDotTurn
 __version__ = VERSION = "0.5.3"
+
+
+def __getattr__(name):
+    # the AudioDotTurn stack is only imported once it is used, `adt -v` and `adt -h` never load it
+    if name == "AudioDotTurn":
+        from audiodotturn.adt import AudioDotTurn
+        return AudioDotTurn
+    if name == "AsyncAudioDotTurn":
+        from audiodotturn.aio import AsyncAudioDotTurn
+        return AsyncAudioDotTurn
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
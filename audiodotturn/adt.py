@@ -1,33 +1,184 @@
-from typing import List, Dict, Any
-from audiodotturn.config import ConfigUser
-from audiodotturn.construct import Constructor
+from __future__ import annotations
+
+import time
+import itertools
+from typing import List, Dict, Any, Iterable, Iterator, Callable, TYPE_CHECKING
+from audiodotturn.config import ConfigUser, Settings, load_settings
+from audiodotturn.construct import Constructor, load_templates
 from audiodotturn.extract import Extractor
-from audiodotturn.database import Database
+from audiodotturn.database import Database, QueryProfiler
+from audiodotturn.hooks import Hooks
+
+# ingest, scan and rename pull in process pools, hashing and sockets, they are
+# imported by the methods that use them so short commands start faster
+if TYPE_CHECKING:
+    from audiodotturn.ingest import Ingestor, IngestStats
+    from audiodotturn.rename import RenamePlan
+
+# seconds between checks of the config file's mtime when reload_config is set
+RELOAD_INTERVAL = 1.0
 
 
 class AudioDotTurn:
-    def __init__(self, config_path: str = None, db_path: str = None):
-        self.config = ConfigUser(config_path)
-        self.extractor = Extractor(self.config.exts, self.config.output_opts)
-        self.database = Database(db_path or self.config.db_path)
+    def __init__(
+        self,
+        config_path: str = None,
+        db_path: str = None,
+        readonly: bool = False,
+        immutable: bool = False,
+        profile: bool = False,
+        reload_config: bool = False,
+        fuzzy_artists: float = None,
+        probe_tags: bool = None
+    ):
+        """
+        With `reload_config` the config file is checked for changes at most every
+        RELOAD_INTERVAL seconds and `settings`, the extractor and the constructor templates
+        follow it, for long-lived processes such as `adt serve`. The database stays the one
+        opened here.
+
+        `fuzzy_artists` overrides the similarity from which new artist names are mapped onto
+        existing artists, see `Database`, 0 turns it off. None uses the config.
+
+        `probe_tags` overrides whether `extract_files`, `extract_file` and ingests fill the
+        artist and title a file name lacks from the file's embedded tags, in every output
+        format, see `audiodotturn.probe`. None uses the config.
+        """
+        self.config_path = config_path
+        self.reload_config = reload_config
+        self._probe_tags = probe_tags
+        self._config = None
+        self._settings = None
+        self._reload_at = 0.0
         self.current_data = None
         self.constructor = None
+        self._templates = None
+        self._apply_settings(load_settings(config_path))
+        # statements slower than the configured threshold are logged with their query plan
+        profiler = QueryProfiler(self._settings.slow_query_ms / 1000) if profile else None
+        self.database = Database(
+            db_path or self._settings.db_path,
+            readonly=readonly,
+            immutable=immutable,
+            profiler=profiler,
+            fuzzy_threshold=self._settings.fuzzy_artists if fuzzy_artists is None else fuzzy_artists
+        )
+        # pipeline hooks, see `Hooks`. Methods only take the instrumented path while one is registered
+        self.hooks = Hooks()
+
+    @property
+    def settings(self) -> Settings:
+        """
+        The resolved config, see `Settings`.
+        """
+        if self.reload_config and time.monotonic() >= self._reload_at:
+            self._reload_at = time.monotonic() + RELOAD_INTERVAL
+            settings = load_settings(self.config_path, reload=True)
+            if settings is not self._settings:
+                self._apply_settings(settings)
+        return self._settings
+
+    @property
+    def probe_tags(self) -> bool:
+        """
+        Whether the fields file names lack are read from embedded tags.
+        """
+        return self.settings.probe_tags if self._probe_tags is None else self._probe_tags
+
+    def _apply_settings(self, settings: Settings) -> None:
+        """
+        Switches to a new settings snapshot, everything built from the old one is rebuilt.
+        """
+        self._settings = settings
+        self._config = None
+        self._templates = None
+        self.extractor = Extractor(settings.exts, settings.output_opts)
+
+    @property
+    def config(self) -> ConfigUser:
+        """
+        The raw config parser, only built when used. Prefer `settings`, every property of
+        ConfigUser reads and splits the config again.
+        """
+        if self._config is None:
+            self._config = ConfigUser(self.config_path)
+        return self._config
+
+    @property
+    def templates(self):
+        """
+        Built-in and configured constructor styles, compiled on first use.
+        """
+        settings = self.settings
+        if self._templates is None:
+            self._templates = load_templates(settings.constructor_templates)
+        return self._templates
 
     def extract_files(self, files: List[str], output_format: str = "dict") -> List[Any]:
         """
         Extracts metadata from multiple audio files and returns a list of dictionaries which
         contain the data or a list of the data in the chosen format.
         """
-        self.current_data = self.extractor.extract_complex_list(files, output_format)
+        # tags are merged into dict extractions, other formats are converted afterwards
+        opt = "dict" if self.probe_tags else output_format
+        if self.hooks:
+            self.current_data = list(self._hooked_extract(files, opt))
+        else:
+            self.current_data = self.extractor.extract_complex_list(files, opt)
+        if self.probe_tags:
+            from audiodotturn.probe import fill_extractions
+            fill_extractions(files, self.current_data, self.settings.exts)
+            self.current_data = [self.extractor.format_extraction(data, output_format) for data in self.current_data]
         return self.current_data
 
+    def iter_extract(self, files: Iterable[str], output_format: str = "dict") -> Iterator[Any]:
+        """
+        Lazily extracts metadata from any iterable of audio files, yielding one extraction per file
+        as it is consumed. Unlike `extract_files` nothing is kept in `current_data`.
+        """
+        if self.hooks:
+            return self._hooked_extract(files, output_format)
+        return self.extractor.iter_extract(files, output_format)
+
+    def _hooked_extract(self, files: Iterable[str], output_format: str) -> Iterator[Any]:
+        """
+        `iter_extract` emitting on_extract around every file.
+        """
+        current = {}
+
+        # the extractor pulls one file per extraction, so the file it pulled last is the one extracted
+        def announce(files):
+            for file in files:
+                current["file"] = file
+                self.hooks.emit("on_extract", "start", {"file": file})
+                yield file
+
+        for extraction in self.extractor.iter_extract(announce(files), output_format):
+            self.hooks.emit("on_extract", "end", {
+                "file": current["file"],
+                "status": self.extractor.extracted_data["status"],
+                "rule": self.extractor.rule
+            })
+            yield extraction
+
     def extract_file(self, file: str, opt: str = "dict") -> List[Any]:
         """
         Extracts metadata from a single audio file and returns a list containing a single
         dictionary containing the data.
         """
-        self.extractor.complex_extract(file)
-        self.current_data = self.extractor.get_extraction(opt)
+        output_format = opt
+        # tags are merged into the dict extraction, other formats are converted afterwards
+        if self.probe_tags:
+            opt = "dict"
+        if self.hooks:
+            self.current_data = next(self._hooked_extract([file], opt))
+        else:
+            self.extractor.complex_extract(file)
+            self.current_data = self.extractor.get_extraction(opt)
+        if self.probe_tags:
+            from audiodotturn.probe import fill_extractions
+            fill_extractions([file], [self.current_data], self.settings.exts)
+            self.current_data = self.extractor.format_extraction(self.current_data, output_format)
         return [self.current_data]
 
     def update_database(self, data: List[Dict] = None) -> None:
@@ -36,8 +187,147 @@ class AudioDotTurn:
         """
         self.database.create_database()
         self.database.create_tables()
-        return self.database.update_database(data or self.current_data)
-    
+        data = data or self.current_data
+        if not self.hooks:
+            return self.database.update_database(data)
+
+        with self.hooks.span("on_db_batch", rows=len(data)) as end:
+            new_artists, new_songs, updated, failure = self.database.update_database(data)
+            end.update(new_artists=new_artists, new_songs=new_songs, updated=updated, failure=failure)
+        return new_artists, new_songs, updated, failure
+
+    def ingest(
+        self,
+        paths: Iterable[str],
+        workers: int = None,
+        batch_size: int = 1000,
+        progress: Callable[[IngestStats], None] = None,
+        sharded: bool = False,
+        stat: bool = False
+    ) -> IngestStats:
+        """
+        Extracts files and writes them to the database as a pipeline, extraction runs in
+        `workers` processes while a writer thread commits every `batch_size` extractions.
+        Paths are consumed lazily so any iterable can be passed.
+
+        With `sharded` every worker writes into its own temporary database instead and the
+        shards are merged once extraction is done, which scales better for first-time imports.
+
+        With `stat` the paths are stat'ed and recorded in the file index like walked files,
+        paths that cannot be stat'ed are skipped and counted as failures.
+        """
+        ingestor = self._ingestor(workers, batch_size, progress)
+        if stat:
+            paths = ingestor.stat_paths(paths)
+        return ingestor.run_sharded(paths) if sharded else ingestor.run(paths)
+
+    def ingest_directory(
+        self,
+        directory: str,
+        workers: int = None,
+        batch_size: int = 1000,
+        progress: Callable[[IngestStats], None] = None,
+        sharded: bool = False
+    ) -> IngestStats:
+        """
+        Recursively walks a directory and ingests every file with a configured extension,
+        see `ingest`. The files are recorded in the database's file index, directories and
+        files that cannot be read are skipped and counted as failures.
+        """
+        ingestor = self._ingestor(workers, batch_size, progress)
+        files = ingestor.walk(directory)
+        return ingestor.run_sharded(files) if sharded else ingestor.run(files)
+
+    def sync(
+        self,
+        directory: str,
+        workers: int = None,
+        batch_size: int = 1000,
+        progress: Callable[[IngestStats], None] = None
+    ) -> IngestStats:
+        """
+        Incrementally rescans a directory, only new or changed files are extracted and
+        files that no longer exist are removed from the database.
+        """
+        return self._ingestor(workers, batch_size, progress).sync(directory)
+
+    def plan_scan(self, roots: List[str], shards: int, manifest_path: str) -> List[int]:
+        """
+        Writes a scan manifest partitioning the files under `roots` into `shards` shards,
+        returns the number of files in each shard.
+        """
+        from audiodotturn.scan import Scanner
+        return Scanner(self.settings.exts, self.settings.output_opts).plan(roots, shards, manifest_path)
+
+    def run_scan(
+        self,
+        shard: int,
+        shards: int,
+        bundle_path: str,
+        manifest_path: str = None,
+        roots: List[str] = None,
+        workers: int = None
+    ) -> IngestStats:
+        """
+        Extracts one shard, listed in a manifest or found by walking `roots`, into a
+        portable SQLite (.db) or NDJSON (.ndjson) bundle.
+        """
+        from audiodotturn.scan import Scanner
+        scanner = Scanner(self.settings.exts, self.settings.output_opts, workers=workers)
+        return scanner.run(shard, shards, bundle_path, manifest_path, roots)
+
+    def merge_scan(self, bundle_path: str) -> tuple:
+        """
+        Merges a scan bundle into the database. Returns (new_artists, new_songs, updated, files),
+        or None if the bundle was already merged.
+        """
+        from audiodotturn.scan import Scanner
+        return Scanner(self.settings.exts, self.settings.output_opts).merge(self.database, bundle_path)
+
+    def _ingestor(self, workers: int, batch_size: int, progress: Callable[[IngestStats], None]) -> Ingestor:
+        from audiodotturn.ingest import Ingestor
+        return Ingestor(
+            self.database,
+            self.settings.exts,
+            self.settings.output_opts,
+            workers=workers,
+            batch_size=batch_size,
+            progress=progress,
+            hooks=self.hooks,
+            probe_tags=self.probe_tags
+        )
+
+    def snapshot(self, dest_path: str) -> None:
+        """
+        Writes a consistent copy of the database to `dest_path`, safe while an ingest is running.
+        Open the copy with `AudioDotTurn(db_path=dest_path, immutable=True)` for lock-free browsing.
+        """
+        self.database.snapshot(dest_path)
+
+    def export_catalogue(self, path: str, batch_size: int = 1000, progress: Callable[[int], None] = None) -> int:
+        """
+        Streams every song with its artist into a .csv or .ndjson file, optionally .gz compressed.
+        Returns the number of exported rows.
+        """
+        return self.database.export_catalogue(path, batch_size, progress)
+
+    def import_catalogue(self, path: str, batch_size: int = 1000, progress: Callable[[int], None] = None) -> tuple:
+        """
+        Upserts a file written by `export_catalogue` in batches, returns (new_artists, new_songs, updated, failure).
+        """
+        self.database.create_database()
+        self.database.create_tables()
+        return self.database.import_catalogue(path, batch_size, progress)
+
+    def query_profile(self, limit: int = None) -> List[Dict]:
+        """
+        Returns per-statement counts, total and max latency and rows touched of every
+        database statement so far, most expensive first. Requires `profile=True`.
+        """
+        if self.database.profiler is None:
+            raise UserWarning("Query profiling is not enabled")
+        return self.database.profiler.summary(limit)
+
     def get_all_artists(self) -> List[Dict]:
         """
         Returns a list of all artists in the database.
@@ -50,6 +340,82 @@ class AudioDotTurn:
         """
         return self.database.get_artist_by_id(artist_id)
 
+    def find_duplicate_artists(self, threshold: float = None) -> List[List[Dict]]:
+        """
+        Returns groups of artists with similar names, the artist with the most songs first.
+        See `Database.find_duplicate_artists`.
+        """
+        if threshold is None:
+            return self.database.find_duplicate_artists()
+        return self.database.find_duplicate_artists(threshold)
+
+    def merge_artists(self, keep_id: int, artist_ids: List[int]) -> tuple:
+        """
+        Merges artists into `keep_id`, returns (artists, moved, merged). See `Database.merge_artists`.
+        """
+        return self.database.merge_artists(keep_id, artist_ids)
+
+    def fingerprint(
+        self,
+        directory: str = None,
+        workers: int = None,
+        kib: int = None,
+        rehash: bool = False,
+        batch_size: int = 1000,
+        progress: Callable[[int, int], None] = None
+    ) -> tuple:
+        """
+        Fingerprints the recorded files that have none yet, see `audiodotturn.fingerprint`.
+        A file keeps its fingerprint until an ingest or sync sees its size, mtime or inode change.
+
+        Parameters:
+            directory : str, optional
+                Only files below this directory are fingerprinted.
+            workers : int, optional
+                Reader threads.
+            kib : int, optional
+                KiB hashed from each end of a file, by default FINGERPRINT_KIB.
+            rehash : bool, optional
+                Fingerprint every file again, needed after changing `kib`.
+            batch_size : int, optional
+                Fingerprints written per transaction.
+            progress : callable, optional
+                Called with (hashed, failed) after every transaction.
+
+        Returns:
+            tuple : (hashed, failed), failed files are missing or unreadable.
+        """
+        from audiodotturn.fingerprint import fingerprint_files, FINGERPRINT_KIB
+        self.database.create_database()
+        self.database.create_tables()
+
+        paths = self.database.iter_fingerprint_paths(directory, rehash, batch_size)
+        hashed = failed = 0
+        batch = []
+        for path, fingerprint in fingerprint_files(paths, workers, kib or FINGERPRINT_KIB):
+            if fingerprint is None:
+                failed += 1
+                continue
+            batch.append((path, fingerprint))
+            if len(batch) >= batch_size:
+                self.database.set_fingerprints(batch)
+                hashed += len(batch)
+                batch = []
+                if progress:
+                    progress(hashed, failed)
+        if batch:
+            self.database.set_fingerprints(batch)
+            hashed += len(batch)
+        if progress:
+            progress(hashed, failed)
+        return hashed, failed
+
+    def find_duplicate_files(self) -> List[List[Dict]]:
+        """
+        Returns groups of files with the same fingerprint, see `Database.find_duplicate_files`.
+        """
+        return self.database.find_duplicate_files()
+
     def get_all_artists_and_songs(self) -> Dict:
         """
         Returns a dict of all artists and their songs in the database.
@@ -72,17 +438,143 @@ class AudioDotTurn:
         """
         return self.database.get_song_by_id(song_id)
 
-    def construct(self, constructor: str, data: List[Dict] = None, auto: bool = False) -> Dict:
+    def construct(self, constructor: str, data: List[Dict] = None, auto: bool = False, option: int = None) -> Dict:
         """
         Constructs new audio files from the data in the database and returns a dictionary containing the
-        filenames and the options used to construct them.
+        filenames and the options used to construct them. `option` selects a single option by index.
         """
         data = data or self.current_data
-        if constructor not in self.config.constructors:
+        if constructor not in self.settings.constructors:
             raise TypeError(f"constructor {constructor} does not exist")
-        self.constructor = Constructor(data, constructor, auto)
-        self.constructor.from_dict()
+        self.constructor = Constructor(data, constructor, auto, self.templates, option)
+        if self.hooks:
+            for status, result in self._hooked_construct(self.constructor, data, constructor):
+                (self.constructor.success if status else self.constructor.failure).append(result)
+        else:
+            self.constructor.from_dict()
         return {
             "success": self.constructor.get_success(),
             "failure": self.constructor.get_failure()
         }
+
+    def iter_construct(
+        self,
+        constructor: str,
+        records: Iterable[Dict],
+        auto: bool = False,
+        option: int = None
+    ) -> Iterator[tuple]:
+        """
+        Streaming version of `construct`, accepts any iterable of extractions (such as `iter_extract`)
+        and yields (True, (original_file, options)) or (False, original_file) per record as it is produced.
+        """
+        if constructor not in self.settings.constructors:
+            raise TypeError(f"constructor {constructor} does not exist")
+        builder = Constructor(None, constructor, auto, self.templates, option)
+        if self.hooks:
+            return self._hooked_construct(builder, records, constructor)
+        return builder.iter_construct(records)
+
+    def _hooked_construct(self, builder: Constructor, records: Iterable[Dict], constructor: str) -> Iterator[tuple]:
+        """
+        `iter_construct` emitting on_construct around every record.
+        """
+        current = {}
+
+        # records are pulled one per result, see `_hooked_extract`
+        def announce(records):
+            for record in records:
+                current["file"] = record.get("original_file") if isinstance(record, dict) else None
+                self.hooks.emit("on_construct", "start", {"file": current["file"], "constructor": constructor})
+                yield record
+
+        for status, result in builder.iter_construct(announce(records)):
+            self.hooks.emit("on_construct", "end", {"file": current["file"], "constructor": constructor, "status": status})
+            yield status, result
+
+    def construct_from_db(
+        self,
+        query: Dict = None,
+        constructor: str = "simple",
+        auto: bool = False,
+        option: int = None
+    ) -> Iterator[tuple]:
+        """
+        Constructs from the catalogued metadata instead of extracting again, yields the same results
+        as `iter_construct`. `query` filters the songs, see `Database.iter_extractions`.
+        """
+        return self.iter_construct(constructor, self.database.iter_extractions(query), auto, option)
+
+    def plan_rename(
+        self,
+        paths: Iterable[str],
+        constructor: str,
+        auto: bool = False,
+        option: int = None,
+        query: Dict = None
+    ) -> RenamePlan:
+        """
+        Constructs a single new name for every path and plans the renames, see `Renamer.plan`.
+        Paths are extracted and constructed one at a time while the plan is built. With a `query`
+        the names are constructed from the database instead, `paths` may then be None to plan the
+        renames of every recorded file the query matches.
+        """
+        if not auto and option is None:
+            raise TypeError("renaming needs a single name per file, use auto or an option")
+
+        if query is not None:
+            if paths is not None:
+                query = dict(query, paths=paths)
+            records, sources = itertools.tee(self.database.iter_extractions(query))
+            sources = (record["path"] for record in sources)
+        else:
+            sources, names = itertools.tee(paths)
+            records = self.iter_extract(names)
+        results = self.iter_construct(constructor, records, auto, option)
+        from audiodotturn.rename import Renamer
+        return Renamer().plan(
+            (source, result[1] if status else None)
+            for source, (status, result) in zip(sources, results)
+        )
+
+    def rename(
+        self,
+        paths: Iterable[str],
+        constructor: str,
+        auto: bool = False,
+        option: int = None,
+        dry: bool = None,
+        journal_path: str = None,
+        workers: int = None,
+        query: Dict = None
+    ) -> Dict:
+        """
+        Renames files to their constructed names and journals the renames so `undo_rename`
+        can restore them. `dry` defaults to the dry setting of the config, a dry run only plans.
+        `query` constructs from the database, see `plan_rename`.
+        Returns a dictionary with the plan, the renamed count, the failures and the journal path.
+        """
+        dry = self.settings.dry if dry is None else dry
+        plan = self.plan_rename(paths, constructor, auto, option, query)
+        if dry or not plan.ops:
+            return {"plan": plan, "renamed": 0, "failures": [], "journal": None}
+
+        from audiodotturn.rename import Renamer
+        journal_path = journal_path or Renamer.default_journal()
+        renamed, failures = Renamer(workers).apply(plan, journal_path)
+        return {"plan": plan, "renamed": renamed, "failures": failures, "journal": journal_path}
+
+    def undo_rename(self, journal_path: str, workers: int = None) -> tuple:
+        """
+        Restores the names recorded in a rename journal, returns (restored, failures).
+        """
+        from audiodotturn.rename import Renamer
+        return Renamer(workers).undo(journal_path)
+
+    def serve(self, socket_path: str = None) -> None:
+        """
+        Runs the `adt serve` daemon on a Unix socket until it is shut down, see `Server`.
+        The socket defaults to the DAEMON socket of the config.
+        """
+        from audiodotturn.serve import Server
+        Server(self, socket_path or self.settings.daemon_socket).serve_forever()
@@ -0,0 +1 @@
+from audiodotturn.aio.aio import AsyncAudioDotTurn, CHUNK_SIZE, QUERY_BATCH_SIZE
\ No newline at end of file
@@ -0,0 +1,366 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterable, List, Optional, Union, TYPE_CHECKING
+from audiodotturn.extract import Extractor
+from audiodotturn.construct import Constructor, load_templates
+
+if TYPE_CHECKING:
+    from audiodotturn.adt import AudioDotTurn
+    from audiodotturn.ingest import IngestStats
+
+# files or records sent to the executor at a time
+CHUNK_SIZE = 256
+
+# rows fetched per step of a streamed query
+QUERY_BATCH_SIZE = 1000
+
+
+class AsyncAudioDotTurn:
+    """
+    asyncio facade of AudioDotTurn for async services. Nothing it does blocks the event loop:
+
+      - extraction and construction run in chunks on `executor`, a thread pool by default.
+        Pass a ProcessPoolExecutor to spread them over cores, the chunk functions are
+        module level and only get plain data.
+      - every database write, ingests included, runs on one dedicated writer thread, so
+        writes are serialized like SQLite needs them to be and never wait on each other's locks.
+      - reads run on their own small thread pool, they do not queue behind a running ingest.
+
+    At most `concurrency` chunks are in the executor at once over all iterators of the
+    instance, and an iterator never holds more than that many finished chunks, so a slow
+    consumer holds back production instead of piling results up. Iterators cancel their
+    pending chunks when they are closed or their task is cancelled. A cancelled ingest
+    stops extracting, commits the rows that already reached its writer, and then raises
+    CancelledError.
+
+    Confirmations are the business of the caller, nothing here ever prompts.
+
+        async with AsyncAudioDotTurn() as adt:
+            async for extraction in adt.extract(paths):
+                ...
+            stats = await adt.ingest_directory("/music")
+
+    Attributes:
+        adt : AudioDotTurn
+            The wrapped instance, built from `kwargs` if none is given.
+        executor : Executor
+            Runs extraction and construction chunks.
+        concurrency : int
+            Chunks in the executor at once.
+        chunk_size : int
+            Files or records per chunk.
+    """
+    def __init__(
+        self,
+        adt: AudioDotTurn = None,
+        executor: Executor = None,
+        concurrency: int = 4,
+        chunk_size: int = CHUNK_SIZE,
+        **kwargs
+    ) -> None:
+        if adt is None:
+            from audiodotturn.adt import AudioDotTurn
+            adt = AudioDotTurn(**kwargs)
+        self.adt = adt
+        self.concurrency = max(1, concurrency)
+        self.chunk_size = max(1, chunk_size)
+        self._own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="adt-async")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="adt-async-writer")
+        self._readers = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="adt-async-reader")
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self) -> AsyncAudioDotTurn:
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """
+        Waits for running writes and shuts the threads down, an executor that was passed
+        in is left running.
+        """
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def close(self) -> None:
+        """
+        Blocking version of `aclose`.
+        """
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True, cancel_futures=True)
+        if self._own_executor:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+
+    async def extract(
+        self,
+        files: Union[Iterable[str], AsyncIterable[str]],
+        output_format: str = "dict"
+    ) -> AsyncIterator[Any]:
+        """
+        Async iterator of the extractions of `files`, in the order of `files`, see
+        `AudioDotTurn.iter_extract`. `files` can be an async iterable, a plain iterable is
+        read on the event loop and should not block.
+        """
+        settings = self.adt.settings
+        args = (list(settings.exts), list(settings.output_opts), output_format, self.adt.probe_tags)
+        async for extraction in self._map_chunks(files, _extract_chunk, args):
+            yield extraction
+
+    async def construct(
+        self,
+        constructor: str,
+        records: Union[Iterable[Dict], AsyncIterable[Dict]],
+        auto: bool = False,
+        option: int = None
+    ) -> AsyncIterator[tuple]:
+        """
+        Async iterator of the constructions of `records`, such as the output of `extract`
+        or `query`, see `AudioDotTurn.iter_construct`.
+
+        Raises:
+            TypeError: If `constructor` does not exist.
+        """
+        settings = self.adt.settings
+        if constructor not in settings.constructors:
+            raise TypeError(f"constructor {constructor} does not exist")
+        args = (dict(settings.constructor_templates), constructor, auto, option)
+        async for result in self._map_chunks(records, _construct_chunk, args):
+            yield result
+
+    async def query(self, query: Dict = None, batch_size: int = QUERY_BATCH_SIZE) -> AsyncIterator[Dict]:
+        """
+        Async iterator of the catalogued extractions matching `query`, see
+        `Database.iter_extractions`. Rows are fetched a batch at a time, the next batch
+        only once the previous one is consumed.
+        """
+        # a cursor belongs to the thread that opened it, every batch is fetched on the same one
+        fetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="adt-async-query")
+        loop = asyncio.get_running_loop()
+        rows = None
+        try:
+            rows = await loop.run_in_executor(fetcher, self.adt.database.iter_extractions, query, batch_size)
+            while True:
+                batch = await loop.run_in_executor(fetcher, _take, rows, batch_size)
+                if not batch:
+                    return
+                for row in batch:
+                    yield row
+        finally:
+            if rows is not None:
+                fetcher.submit(rows.close)
+            fetcher.shutdown(wait=False)
+
+    async def construct_from_db(
+        self,
+        query: Dict = None,
+        constructor: str = "simple",
+        auto: bool = False,
+        option: int = None
+    ) -> AsyncIterator[tuple]:
+        """
+        Async iterator of constructions from the catalogued metadata, see `AudioDotTurn.construct_from_db`.
+        """
+        async for result in self.construct(constructor, self.query(query), auto, option):
+            yield result
+
+    async def get_all_artists(self) -> List[Dict]:
+        return await self._read(self.adt.get_all_artists)
+
+    async def get_artist_by_id(self, artist_id: int) -> Dict:
+        return await self._read(self.adt.get_artist_by_id, artist_id)
+
+    async def get_songs_by_artist(self, artist_id: int) -> List[Dict]:
+        return await self._read(self.adt.get_songs_by_artist, artist_id)
+
+    async def get_song_by_id(self, song_id: int) -> Dict:
+        return await self._read(self.adt.get_song_by_id, song_id)
+
+    async def find_duplicate_artists(self, threshold: float = None) -> List[List[Dict]]:
+        return await self._read(self.adt.find_duplicate_artists, threshold)
+
+    async def find_duplicate_files(self) -> List[List[Dict]]:
+        return await self._read(self.adt.find_duplicate_files)
+
+    async def update_database(self, data: List[Dict]) -> tuple:
+        """
+        Writes extractions on the writer thread, returns (new_artists, new_songs, updated, failure).
+        """
+        return await self._write(self.adt.update_database, data)
+
+    async def merge_artists(self, keep_id: int, artist_ids: List[int]) -> tuple:
+        """
+        Merges artists on the writer thread, see `AudioDotTurn.merge_artists`.
+        """
+        return await self._write(self.adt.merge_artists, keep_id, artist_ids)
+
+    async def ingest(
+        self,
+        paths: Iterable[str],
+        workers: int = None,
+        batch_size: int = 1000,
+        progress: Callable[[IngestStats], None] = None,
+        sharded: bool = False,
+        stat: bool = False
+    ) -> IngestStats:
+        """
+        Runs `AudioDotTurn.ingest` on the writer thread. `paths` is read there, so it may be
+        a blocking generator. `progress` is called on the event loop.
+        """
+        return await self._ingest(
+            lambda guard, progress: self.adt.ingest(guard(paths), workers, batch_size, progress, sharded, stat),
+            progress
+        )
+
+    async def ingest_directory(
+        self,
+        directory: str,
+        workers: int = None,
+        batch_size: int = 1000,
+        progress: Callable[[IngestStats], None] = None,
+        sharded: bool = False
+    ) -> IngestStats:
+        """
+        Walks and ingests a directory on the writer thread, see `AudioDotTurn.ingest_directory`.
+        """
+        from audiodotturn.ingest import walk
+
+        def run(guard, progress):
+            unreadable = []
+            files = guard(walk(directory, self.adt.settings.exts, unreadable.append))
+            stats = self.adt.ingest(files, workers, batch_size, progress, sharded)
+            # counted as `AudioDotTurn.ingest_directory` counts them
+            stats.unreadable += len(unreadable)
+            stats.failure += len(unreadable)
+            return stats
+
+        return await self._ingest(run, progress)
+
+    async def sync(
+        self,
+        directory: str,
+        workers: int = None,
+        batch_size: int = 1000,
+        progress: Callable[[IngestStats], None] = None
+    ) -> IngestStats:
+        """
+        Syncs a directory on the writer thread, see `AudioDotTurn.sync`. A cancelled sync
+        stops at its next commit.
+        """
+        return await self._ingest(lambda guard, progress: self.adt.sync(directory, workers, batch_size, progress), progress)
+
+    async def _ingest(self, run: Callable, progress: Optional[Callable[[IngestStats], None]]) -> IngestStats:
+        """
+        Runs an ingest on the writer thread. On cancellation the ingest is stopped where it
+        next reads a path or commits, and awaited, so its writer has flushed before
+        CancelledError reaches the caller.
+        """
+        loop = asyncio.get_running_loop()
+        stop = threading.Event()
+
+        def guard(paths):
+            for path in paths:
+                if stop.is_set():
+                    raise asyncio.CancelledError()
+                yield path
+
+        def forward(stats):
+            # called by the ingest's writer thread after every commit
+            if stop.is_set():
+                raise asyncio.CancelledError()
+            if progress is not None:
+                loop.call_soon_threadsafe(progress, stats)
+
+        future = asyncio.wrap_future(self._writer.submit(run, guard, forward))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            stop.set()
+            try:
+                await future
+            except BaseException:
+                pass
+            raise
+
+    async def _read(self, function: Callable, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._readers, function, *args)
+
+    async def _write(self, function: Callable, *args) -> Any:
+        # shielded, a started transaction is finished even if the caller is cancelled
+        return await asyncio.shield(asyncio.get_running_loop().run_in_executor(self._writer, function, *args))
+
+    async def _map_chunks(self, items: Union[Iterable, AsyncIterable], function: Callable, args: tuple) -> AsyncIterator[Any]:
+        """
+        Runs `function(*args, chunk)` on the executor for every chunk of `items` and yields
+        the results of each chunk in order.
+        """
+        loop = asyncio.get_running_loop()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        slots = self._slots
+        pending = deque()
+        try:
+            async for chunk in _chunks(items, self.chunk_size):
+                await slots.acquire()
+                future = loop.run_in_executor(self.executor, function, *args, chunk)
+                future.add_done_callback(lambda _: slots.release())
+                pending.append(future)
+                while pending and (pending[0].done() or len(pending) >= self.concurrency):
+                    for result in await pending.popleft():
+                        yield result
+            while pending:
+                for result in await pending.popleft():
+                    yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+async def _chunks(items: Union[Iterable, AsyncIterable], size: int) -> AsyncIterator[list]:
+    """
+    Lists of up to `size` items of a plain or an async iterable.
+    """
+    if hasattr(items, "__aiter__"):
+        chunk = []
+        async for item in items:
+            chunk.append(item)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+        return
+
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _take(rows, size: int) -> list:
+    return list(itertools.islice(rows, size))
+
+
+def _extract_chunk(exts: List[str], output_opts: List[str], output_format: str, probe_tags: bool, files: List[str]) -> List[Any]:
+    """
+    Extracts a chunk on the executor, with an extractor of its own so chunks can run in parallel.
+    """
+    extractions = Extractor(exts, output_opts).extract_complex_list(files, output_format)
+    if probe_tags:
+        from audiodotturn.probe import fill_extractions
+        fill_extractions(files, extractions, exts)
+    return extractions
+
+
+def _construct_chunk(templates: Dict, constructor: str, auto: bool, option: int, records: List[Dict]) -> List[tuple]:
+    """
+    Constructs a chunk on the executor, the templates are compiled where it runs.
+    """
+    return list(Constructor(None, constructor, auto, load_templates(templates), option).iter_construct(records))
@@ -1 +1 @@
-from audiodotturn.config.config import ConfigUser
+from audiodotturn.config.config import ConfigUser, Settings, load_settings
\ No newline at end of file
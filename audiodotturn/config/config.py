@@ -1,6 +1,19 @@
 import os
 import configparser
-import pkg_resources
+from types import MappingProxyType
+from dataclasses import dataclass
+from importlib import resources
+from typing import Dict, Mapping, Optional, Tuple, FrozenSet
+
+# values of the report setting besides empty, the choices of --report
+REPORT_TYPES = ("none", "console", "html", "text", "csv", "ndjson")
+
+
+def package_config_path() -> str:
+    """
+    Path of the config.ini shipped with the package.
+    """
+    return str(resources.files(__package__).joinpath("config.ini"))
 
 
 class ConfigBase:
@@ -10,7 +23,7 @@ class ConfigBase:
     def __init__(self):
         self.config = configparser.ConfigParser()
         self.userconfig = configparser.ConfigParser()
-        self.path = pkg_resources.resource_filename(__name__, "config.ini")
+        self.path = package_config_path()
         self.config.read(self.path)
 
     @property
@@ -58,7 +71,22 @@ class ConfigUser(ConfigBase):
                     self.path = path
                     break
             if self.path is None:
-                self.path = pkg_resources.resource_filename(__name__, "config.ini")
+                self.path = package_config_path()
+
+    @property
+    def constructors(self):
+        return list(dict.fromkeys(super().constructors + list(self.constructor_templates)))
+
+    @property
+    def constructor_templates(self):
+        """
+        Constructor styles defined in a CONSTRUCTORS section, one option template per line.
+        """
+        templates = {}
+        for config in (self.config, self.userconfig):
+            if config.has_section('CONSTRUCTORS'):
+                templates.update(config['CONSTRUCTORS'])
+        return templates
 
     @property
     def config_path(self):
@@ -76,17 +104,119 @@ class ConfigUser(ConfigBase):
             except:
                 raise TypeError("PROBLEM WITH CONFIG")
 
+    @property
+    def slow_query_ms(self):
+        try:
+            return float(self.userconfig['DATABASE']['slow_query_ms'])
+        except KeyError:
+            try:
+                return float(self.config['DATABASE']['slow_query_ms'])
+            except:
+                raise TypeError("PROBLEM WITH CONFIG")
+
+    @property
+    def fuzzy_artists(self):
+        """
+        Similarity from which ingests map a new artist name onto an existing artist, 0 to
+        only match names exactly.
+        """
+        try:
+            value = self.userconfig['DATABASE']['fuzzy_artists']
+        except KeyError:
+            try:
+                value = self.config['DATABASE']['fuzzy_artists']
+            except:
+                raise TypeError("PROBLEM WITH CONFIG")
+        return float(value.strip() or 0)
+
+    @property
+    def daemon_socket(self):
+        """
+        Unix socket of `adt serve`, an empty setting picks a per-user path in
+        $XDG_RUNTIME_DIR or the temp directory.
+        """
+        try:
+            path = self.userconfig['DAEMON']['socket']
+        except KeyError:
+            try:
+                path = self.config['DAEMON']['socket']
+            except:
+                raise TypeError("PROBLEM WITH CONFIG")
+        if path.strip():
+            return os.path.expanduser(path.strip())
+        runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+        if runtime_dir:
+            return os.path.join(runtime_dir, 'audiodotturn.sock')
+        return os.path.join('/tmp', f'audiodotturn-{os.getuid()}.sock')
+
+    @property
+    def metrics_json(self):
+        """
+        Path of the JSON run summary, None for no summary. '{command}' is replaced by the command.
+        """
+        return self._metrics_path('json')
+
+    @property
+    def metrics_prometheus(self):
+        """
+        Path of the Prometheus textfile, None for no textfile. '{command}' is replaced by the command.
+        """
+        return self._metrics_path('prometheus')
+
+    def _metrics_path(self, key):
+        try:
+            path = self.userconfig['METRICS'][key]
+        except KeyError:
+            try:
+                path = self.config['METRICS'][key]
+            except:
+                raise TypeError("PROBLEM WITH CONFIG")
+        return os.path.expanduser(path.strip()) or None
+
     @property
     def dry(self):
+        return self._boolean('dry')
+
+    @property
+    def report(self):
+        """
+        Report type used when no --report is given, None to ask.
+        """
+        try:
+            report = self.userconfig['PROGRAM']['report']
+        except KeyError:
+            try:
+                report = self.config['PROGRAM']['report']
+            except:
+                raise TypeError("PROBLEM WITH CONFIG")
+        return report.strip().lower() or None
+
+    @property
+    def assume_yes(self):
+        return self._boolean('yes')
+
+    @property
+    def probe_tags(self):
+        """
+        Whether ingests read the artist and title a file name lacks from its embedded tags.
+        """
+        return self._boolean('probe_tags')
+
+    def _boolean(self, key):
+        """
+        A true/false setting of the PROGRAM section, anything configparser does not read as a boolean is an error.
+        """
         try:
-            dry = self.userconfig['PROGRAM']['dry']
-            return dry.lower() == 'true'
+            value = self.userconfig['PROGRAM'][key]
         except KeyError:
             try:
-                dry = self.config['PROGRAM']['dry']
-                return dry.lower() == 'true'
+                value = self.config['PROGRAM'][key]
             except:
                 raise TypeError("PROBLEM WITH CONFIG")
+        try:
+            return configparser.ConfigParser.BOOLEAN_STATES[value.strip().lower()]
+        except KeyError:
+            raise TypeError(f"PROBLEM WITH CONFIG: {key} must be True or False, not {value}")
 
     @property
     def exts(self):
@@ -97,3 +227,140 @@ class ConfigUser(ConfigBase):
                 return self.config['PROGRAM']['exts'].replace(' ', '').split(',')
             except:
                 raise TypeError("PROBLEM WITH CONFIG")
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Immutable snapshot of the config, resolved and validated once. Reading a field is a plain
+    attribute access, unlike the properties of ConfigUser that go back to the config parser
+    and split the strings again on every access.
+
+    Use `load_settings` to get one, snapshots are cached per config file.
+
+    Attributes:
+        exts : Tuple[str, ...]
+            Extensions as configured, ready for str.endswith.
+        ext_set : FrozenSet[str]
+            The same extensions lowercased, for case-insensitive membership tests.
+        mtime_ns : int
+            Modification time of the config file the snapshot was read from, None if it
+            has none, used by `load_settings` to reload changed files.
+        user_paths : Tuple[str, ...]
+            The user config paths that were probed, used by `load_settings` to notice a
+            user config created after a snapshot of the package config was taken.
+    """
+    app_name: str
+    config_path: str
+    db_path: str
+    slow_query_ms: float
+    fuzzy_artists: float
+    daemon_socket: str
+    metrics_json: Optional[str]
+    metrics_prometheus: Optional[str]
+    constructors: Tuple[str, ...]
+    constructor_templates: Mapping[str, str]
+    dry: bool
+    report: Optional[str]
+    assume_yes: bool
+    probe_tags: bool
+    exts: Tuple[str, ...]
+    ext_set: FrozenSet[str]
+    output_opts: Tuple[str, ...]
+    mtime_ns: Optional[int]
+    user_paths: Tuple[str, ...]
+
+    @classmethod
+    def from_config(cls, config: ConfigUser) -> "Settings":
+        """
+        Resolves every setting of `config`.
+
+        Raises:
+            TypeError: If a setting is missing or invalid.
+        """
+        exts = tuple(ext for ext in config.exts if ext)
+        if not exts:
+            raise TypeError("PROBLEM WITH CONFIG: exts is empty")
+        slow_query_ms = config.slow_query_ms
+        if slow_query_ms < 0:
+            raise TypeError("PROBLEM WITH CONFIG: slow_query_ms must not be negative")
+        fuzzy_artists = config.fuzzy_artists
+        if not 0 <= fuzzy_artists <= 1:
+            raise TypeError("PROBLEM WITH CONFIG: fuzzy_artists must be between 0 and 1")
+        report = config.report
+        if report is not None and report not in REPORT_TYPES:
+            raise TypeError(f"PROBLEM WITH CONFIG: report must be empty or one of {', '.join(REPORT_TYPES)}, not {report}")
+
+        return cls(
+            app_name=config.app_name,
+            config_path=config.config_path,
+            db_path=config.db_path,
+            slow_query_ms=slow_query_ms,
+            fuzzy_artists=fuzzy_artists,
+            daemon_socket=config.daemon_socket,
+            metrics_json=config.metrics_json,
+            metrics_prometheus=config.metrics_prometheus,
+            constructors=tuple(config.constructors),
+            constructor_templates=MappingProxyType(dict(config.constructor_templates)),
+            dry=config.dry,
+            report=report,
+            assume_yes=config.assume_yes,
+            probe_tags=config.probe_tags,
+            exts=exts,
+            ext_set=frozenset(ext.lower() for ext in exts),
+            output_opts=tuple(config.output_opts),
+            mtime_ns=_mtime_ns(config.config_path),
+            user_paths=tuple(config.user_paths)
+        )
+
+
+# snapshots by the config_path they were loaded for, None for the user config
+_settings_cache: Dict[Optional[str], Settings] = {}
+
+
+def load_settings(config_path: str = None, reload: bool = False) -> Settings:
+    """
+    Returns the settings of `config_path`, or of the first user config found when None.
+    The config is read and the user paths are probed once per process, later calls get
+    the cached snapshot.
+
+    Parameters:
+        config_path (str, optional): A specific config file.
+        reload (bool): Stat the config file and read it again if its mtime changed, for
+            long-lived processes that pick up config edits without restarting. A snapshot
+            of the package config is also reloaded once a user config appears.
+
+    Raises:
+        TypeError: If a setting is missing or invalid.
+    """
+    settings = _settings_cache.get(config_path)
+    if settings is not None and not (reload and _changed(settings, config_path)):
+        return settings
+
+    settings = Settings.from_config(ConfigUser(config_path))
+    _settings_cache[config_path] = settings
+    return settings
+
+
+def _changed(settings: Settings, config_path: Optional[str]) -> bool:
+    """
+    Whether the config a snapshot was read from changed, or for the user config whether
+    a user path earlier than the one read, or than the package config fallback, exists now.
+    """
+    if _mtime_ns(settings.config_path) != settings.mtime_ns:
+        return True
+    if config_path is not None:
+        return False
+    for path in settings.user_paths:
+        if path == settings.config_path:
+            return False
+        if os.path.exists(path):
+            return True
+    return False
+
+
+def _mtime_ns(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
@@ -1 +1,2 @@
 from audiodotturn.construct.construction import Constructor
+from audiodotturn.construct.templates import ConstructorTemplate, load_templates
\ No newline at end of file
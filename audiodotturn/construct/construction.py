@@ -1,4 +1,5 @@
-from typing import List, LiteralString, Dict
+from typing import List, LiteralString, Dict, Union, Iterable, Iterator
+from audiodotturn.construct.templates import ConstructorTemplate, load_templates
 
 class Constructor:
     """
@@ -15,26 +16,52 @@ class Constructor:
             A flag for whether or not to perform auto-construction.
         constructor : LiteralString
             A string representing the constructor style to use.
+        option : int
+            Index of the single option to construct, None for all options.
+        template : ConstructorTemplate
+            The compiled templates of the constructor style.
     """
-    def __init__(self, data_list: List, constructor: LiteralString, auto: bool = False) -> None:
+    def __init__(
+        self,
+        data_list: Iterable,
+        constructor: LiteralString,
+        auto: bool = False,
+        templates: Dict[str, ConstructorTemplate] = None,
+        option: int = None
+    ) -> None:
         """
         Load the constructor with the data, a constructor choice and optional auto option.
 
         Parameters:
-            data_list (List): A list of datasets. Each dataset should be a dictionary of extracted data 
-                generated by the Extractor() class.
-            constructor (LiteralString): A string that sets the constructor style to use. Options are 'custom', 
-                'simple', or 'block'.
+            data_list (Iterable): A list, or any iterable, of datasets. Each dataset should be a dictionary of
+                extracted data generated by the Extractor() class.
+            constructor (LiteralString): A string that sets the constructor style to use. Built-in options are
+                'simple' and 'enclosed', more (such as 'custom') can be defined in the CONSTRUCTORS section of a config.
             auto (bool): An optional boolean that sets whether or not to use auto-construction. Default is False.
+            templates (Dict[str, ConstructorTemplate]): Available constructor styles, see `load_templates`.
+                Defaults to the built-in styles.
+            option (int): An optional index of the only option to construct, ignored when auto is True.
 
         Returns:
             None
+
+        Raises:
+            TypeError: If the constructor or the option does not exist.
         """
         self.data_in = data_list
         self.success = []
         self.failure = []
         self.auto = auto
         self.constructor = constructor
+        self.option = option
+
+        templates = templates if templates is not None else load_templates()
+        if constructor not in templates:
+            raise TypeError(f"constructor {constructor} does not exist")
+        self.template = templates[constructor]
+        if option is not None and not auto:
+            # fail before the first record instead of partway through a stream
+            self.template.check_option(option)
 
     # return successful constructions
     def get_success(self):
@@ -77,43 +104,54 @@ class Constructor:
         Returns:
             None
         """
-        # cycle through extractions within the data list
-        for _data in self.data_in:
+        for status, result in self.iter_construct():
+            if status:
+                self.success.append(result)
+            else:
+                self.failure.append(result)
+
+    # streaming construction, results are yielded as they are produced and
+    # nothing is kept on the instance
+    def iter_construct(self, records: Iterable[Dict] = None) -> Iterator[tuple]:
+        """
+        Constructs from any iterable of extractions, yielding each result as soon as it is produced.
+        Records are only pulled from `records` as results are consumed, so the output of a streaming
+        extractor can be passed straight in and nothing accumulates in memory.
+
+        Parameters:
+            records (Iterable[Dict], optional): Extractions to construct from. Defaults to the data the
+                Constructor was loaded with.
+
+        Returns:
+            Iterator[tuple]: (True, construction) for successful extractions, where construction is the
+                tuple returned by `run`, and (False, original_file) for unsuccessful ones.
 
-            # if a dataset within the list is not a dict, then raise TypeError
+        Raises:
+            TypeError: If a record is not a dict.
+        """
+        records = self.data_in if records is None else records
+
+        # cycle through extractions as they come in
+        for _data in records:
+
+            # if a dataset is not a dict, then raise TypeError
             if not isinstance(_data, Dict):
                 raise TypeError("All data in list should be dicts")
 
-            # get the `status` of the current extraction
-            status = _data["status"]
-            # get the original filename of the current extraction
-            original_file = _data["original_file"]
-
-            # if the extraction status = True aka successful, then get the values
-            # from the extraction data and send them through the run method - the 
-            # resulting tuple will be appended to the `success` property
-            if status:
-                artist = _data["artist"]
-                title = _data["title"]
-                features = _data["features"]
-                misc = _data["misc"]
-                filetype = _data["filetype"]
-                youtube_id = _data["youtube_id"]
-
-                self.success.append(
-                    self.run(
-                        original_file,
-                        artist,
-                        title,
-                        features,
-                        misc,
-                        filetype,
-                        youtube_id
-                    )
+            # if the extraction status = True aka successful, then send the values
+            # from the extraction data through the run method
+            if _data["status"]:
+                yield True, self.run(
+                    _data["original_file"],
+                    _data["artist"],
+                    _data["title"],
+                    _data["features"],
+                    _data["misc"],
+                    _data["filetype"],
+                    _data["youtube_id"]
                 )
-            if not status:
-                self.failure.append(original_file)
-
+            else:
+                yield False, _data["original_file"]
 
     def run(
         self,
@@ -130,6 +168,8 @@ class Constructor:
         returns a tuple containing the original filename and a list containing its new formatting options, if auto is 
         true then the most detailed option is returned with the filename instead of a list of options.
 
+        Only the requested options are rendered, segments of an option whose values are missing are left out.
+
         Parameters:
             original_file (LiteralString): The original filename to be formatted.
             artist (LiteralString): The artist name extracted from the file.
@@ -141,38 +181,15 @@ class Constructor:
 
         Returns:
             tuple: A tuple containing the original filename and a list of options for the formatted filename. If 
-                auto is True, the most detailed option is returned with the filename instead of a list of options.
+                auto is True, the most detailed option is returned with the filename instead of a list of options,
+                the same goes for a single option selected by index.
                 Tuple[str, List] or Tuple[str, str]
         """
-
-        if self.constructor == "custom":
-            # have user select desired values
-            # have user select layout from options generated from selected values
-            pass
-
-        if self.constructor == "simple":
-            options = [
-                f"{artist} - {title}.{filetype}",
-                f"{artist} - {title} [{youtube_id}].{filetype}",
-                f"{artist} - {title} ({misc}).{filetype}",
-                f"{artist} - {title} ft. {features}.{filetype}",
-                f"{artist} - {title} ft. {features} ({misc}).{filetype}",
-                f"{artist} - {title} ft. {features} [{youtube_id}].{filetype}",
-                f"{artist} - {title} ft. {features} ({misc}) [{youtube_id}].{filetype}",
-            ]
-
-        elif self.constructor == "enclosed":
-            options = [
-                f"({artist})({title}).{filetype}",
-                f"({artist})({title})({misc}).{filetype}",
-                f"({artist})({title})({features}).{filetype}",
-                f"({artist})({title})({youtube_id}).{filetype}",
-                f"({artist})({title})({features})({misc}).{filetype}",
-                f"({artist})({title})({features})({youtube_id}).{filetype}",
-                f"({artist})({title})({features})({misc})({youtube_id}).{filetype}"
-            ]
-
         if self.auto:
-            return (original_file, options[-1])
+            option = "auto"
+        elif self.option is not None:
+            option = self.option
+        else:
+            option = "all"
 
-        return (original_file, options)
+        return (original_file, self.template.render((artist, title, features, misc, youtube_id, filetype), option))
@@ -0,0 +1,159 @@
+import string
+from functools import lru_cache
+from typing import List, Dict, Callable, Union
+
+# fields of an extraction a template can refer to, in the order render functions take them
+FIELDS = ("artist", "title", "features", "misc", "youtube_id", "filetype")
+
+# built-in constructors, one template per option from least to most detailed
+DEFAULT_TEMPLATES = {
+    "simple": """
+        {artist}| - {title}|.{filetype}
+        {artist}| - {title}| [{youtube_id}]|.{filetype}
+        {artist}| - {title}| ({misc})|.{filetype}
+        {artist}| - {title}| ft. {features}|.{filetype}
+        {artist}| - {title}| ft. {features}| ({misc})|.{filetype}
+        {artist}| - {title}| ft. {features}| [{youtube_id}]|.{filetype}
+        {artist}| - {title}| ft. {features}| ({misc})| [{youtube_id}]|.{filetype}
+    """,
+    "enclosed": """
+        ({artist})|({title})|.{filetype}
+        ({artist})|({title})|({misc})|.{filetype}
+        ({artist})|({title})|({features})|.{filetype}
+        ({artist})|({title})|({youtube_id})|.{filetype}
+        ({artist})|({title})|({features})|({misc})|.{filetype}
+        ({artist})|({title})|({features})|({youtube_id})|.{filetype}
+        ({artist})|({title})|({features})|({misc})|({youtube_id})|.{filetype}
+    """
+}
+
+
+@lru_cache(maxsize=None)
+def compile_option(template: str) -> Callable[..., str]:
+    """
+    Compiles a single option template into a render function.
+
+    A template is split into segments by '|', each segment is rendered only when every
+    field it refers to is non-empty, so a missing feature drops ' ft. {features}' instead of
+    rendering 'ft. None'. Segments without fields are always rendered.
+
+    The render function is generated once per distinct template, it takes the values of
+    FIELDS as positional arguments and only evaluates the segments of its own template.
+
+    Parameters:
+        template (str): e.g. '{artist}| - {title}| ft. {features}|.{filetype}'
+
+    Returns:
+        Callable[..., str]: render(artist, title, features, misc, youtube_id, filetype) -> str
+
+    Raises:
+        ValueError: If the template refers to an unknown field or uses a conversion.
+    """
+    parts = []
+
+    for segment in template.split("|"):
+        pieces = []
+        fields = []
+        for literal, field, spec, conversion in string.Formatter().parse(segment):
+            if literal:
+                pieces.append(repr(literal))
+            if field is None:
+                continue
+            if field not in FIELDS:
+                raise ValueError(f"unknown field {field} in constructor template, use one of {', '.join(FIELDS)}")
+            if conversion:
+                raise ValueError(f"conversions are not supported in constructor templates: {segment}")
+            pieces.append(f"format({field}, {spec!r})" if spec else f"str({field})")
+            fields.append(field)
+
+        if not pieces:
+            continue
+        expression = " + ".join(pieces)
+        if fields:
+            condition = " and ".join(dict.fromkeys(fields))
+            expression = f"(({expression}) if {condition} else '')"
+        parts.append(expression)
+
+    source = f"def render({', '.join(FIELDS)}):\n    return {' + '.join(parts) or repr('')}\n"
+    namespace = {}
+    exec(compile(source, f"<constructor template {template!r}>", "exec"), namespace)
+    return namespace["render"]
+
+
+class ConstructorTemplate:
+    """
+    A constructor style made of one or more option templates, see `compile_option`.
+
+    Attributes:
+        name : str
+            The constructor name.
+        options : List[str]
+            The option templates, from least to most detailed.
+        renderers : List[Callable[..., str]]
+            The compiled render function of each option.
+    """
+    def __init__(self, name: str, options: Union[str, List[str]]) -> None:
+        """
+        Parameters:
+            name (str): The constructor name.
+            options (Union[str, List[str]]): A list of option templates, or a string with
+                one template per line as written in a config file.
+        """
+        if isinstance(options, str):
+            options = [line.strip() for line in options.splitlines() if line.strip()]
+        if not options:
+            raise ValueError(f"constructor {name} has no options")
+
+        self.name = name
+        self.options = options
+        self.renderers = [compile_option(option) for option in options]
+
+    def render(self, values: tuple, option: Union[str, int] = "all") -> Union[str, List[str]]:
+        """
+        Renders the requested options only.
+
+        Parameters:
+            values (tuple): The values of FIELDS, in that order.
+            option (Union[str, int]): 'auto' for the most detailed option, an index for a
+                single option or 'all' for every distinct option.
+
+        Returns:
+            Union[str, List[str]]: A single filename for 'auto' and indexes, otherwise a list.
+
+        Raises:
+            TypeError: If `option` is an index outside of the options.
+        """
+        if option == "auto":
+            return self.renderers[-1](*values)
+        if option == "all":
+            # options that only differ in empty segments render the same name
+            return list(dict.fromkeys(render(*values) for render in self.renderers))
+        self.check_option(option)
+        return self.renderers[option](*values)
+
+    def check_option(self, option: int) -> None:
+        """
+        Raises:
+            TypeError: If `option` is not the index of one of the options.
+        """
+        if not isinstance(option, int) or not 0 <= option < len(self.renderers):
+            raise TypeError(
+                f"option {option} does not exist for constructor {self.name}, "
+                f"expected 0 to {len(self.renderers) - 1}"
+            )
+
+
+def load_templates(templates: Dict[str, Union[str, List[str]]] = None) -> Dict[str, ConstructorTemplate]:
+    """
+    Builds the built-in constructors plus the given ones, given templates replace
+    built-in constructors of the same name.
+
+    Parameters:
+        templates (Dict[str, Union[str, List[str]]], optional): Constructor names mapped to
+            their option templates, e.g. the CONSTRUCTORS section of a user config.
+
+    Returns:
+        Dict[str, ConstructorTemplate]: Constructor names mapped to compiled constructors.
+    """
+    merged = dict(DEFAULT_TEMPLATES, **(templates or {}))
+    return {name: ConstructorTemplate(name, options) for name, options in merged.items()}
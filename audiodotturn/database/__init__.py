@@ -1 +1,3 @@
-from audiodotturn.database.database import Database
+from audiodotturn.database.database import Database, FileEntry
+from audiodotturn.database.profiling import QueryProfiler
+from audiodotturn.database.fuzzy import ArtistIndex, DUPLICATE_THRESHOLD, normalize_artist, similarity
\ No newline at end of file
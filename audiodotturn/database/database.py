@@ -1,18 +1,97 @@
+import os
+import csv
+import gzip
+import json
 import sqlite3
-from typing import List, Dict
+import pathlib
+from typing import List, Dict, Iterable, Iterator, NamedTuple, Callable, IO
+from audiodotturn.database.profiling import QueryProfiler, ProfiledConnection
+from audiodotturn.database.fuzzy import ArtistIndex, DUPLICATE_THRESHOLD, similarity
+
+
+# upsert clause of the files table, a file keeps its fingerprint only while its stat values are unchanged
+KEEP_FINGERPRINT = (
+    'fingerprint = CASE WHEN files.size = excluded.size AND files.mtime_ns = excluded.mtime_ns '
+    'AND files.inode = excluded.inode THEN files.fingerprint END'
+)
+
+
+class FileEntry(NamedTuple):
+    """
+    A file as recorded in the `files` table, the stat values are what an incremental
+    sync compares against to decide whether a file needs to be extracted again.
+    """
+    path: str
+    size: int
+    mtime_ns: int
+    inode: int
+
 
 class DatabaseInit:
-    def __init__(self, path: str) -> None:
+    # bytes of the database file read through a memory map by read-only connections
+    MMAP_SIZE = 1 << 30
+
+    def __init__(
+        self,
+        path: str,
+        readonly: bool = False,
+        immutable: bool = False,
+        profiler: QueryProfiler = None,
+        fuzzy_threshold: float = None
+    ) -> None:
         """
         Constructs a new Database object.
 
         Parameters:
             path : str
                 A string representing the file path of the database. Database must be a `.db` file.
+            readonly : bool, optional
+                Open every connection read-only, any write raises sqlite3.OperationalError.
+                Reads never take the write lock, so they do not contend with a running ingest.
+            immutable : bool, optional
+                Read-only and additionally promise SQLite the file never changes, so no locks
+                are taken at all. Only for snapshots or other databases nothing writes to.
+            profiler : QueryProfiler, optional
+                Records the timing of every statement executed through `connect`.
+            fuzzy_threshold : float, optional
+                Upserts map an artist name that is not in the database onto the most similar
+                existing artist at or above this similarity, see `ArtistIndex`. None or 0
+                only matches names exactly.
         """
         self.path = path if path.endswith('.db') else None
         if self.path is None:
             raise TypeError("Database must be a .db file")
+        self.immutable = immutable
+        self.readonly = readonly or immutable
+        self.profiler = profiler
+        self.fuzzy_threshold = fuzzy_threshold or None
+        # artist names mapped onto an existing artist by the fuzzy threshold
+        self.fuzzy_matched = 0
+        self._artist_index = None
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Opens a new connection to the database. Every method goes through here, so
+        connection settings only need to be applied in one place.
+
+        Returns:
+            sqlite3.Connection : an open connection to the database at `self.path`.
+        """
+        factory = sqlite3.Connection if self.profiler is None else ProfiledConnection
+
+        if not self.readonly:
+            conn = sqlite3.connect(self.path, factory=factory)
+        else:
+            uri = pathlib.Path(self.path).absolute().as_uri() + "?mode=ro"
+            if self.immutable:
+                uri += "&immutable=1"
+            conn = sqlite3.connect(uri, uri=True, factory=factory)
+
+        if self.profiler is not None:
+            conn.profiler = self.profiler
+        if self.readonly:
+            conn.execute(f'PRAGMA mmap_size = {self.MMAP_SIZE}')
+        return conn
 
 
 class DatabaseCreate(DatabaseInit):
@@ -21,7 +100,7 @@ class DatabaseCreate(DatabaseInit):
         Creates a new database file at the specified path if it does not exist.
         """
         try:
-            conn = sqlite3.connect(self.path)
+            conn = self.connect()
             conn.close()
         except:
             raise sqlite3.OperationalError(f'Could not create database in {self.path}')
@@ -30,9 +109,12 @@ class DatabaseCreate(DatabaseInit):
         """
         Creates the necessary tables for the database.
         """
-        conn = sqlite3.connect(self.path)
+        conn = self.connect()
         cursor = conn.cursor()
 
+        # readers keep reading the last commit while a write is in progress instead of waiting on it
+        cursor.execute('PRAGMA journal_mode = WAL')
+
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS artists (
                 artist_id INTEGER PRIMARY KEY,
@@ -53,10 +135,78 @@ class DatabaseCreate(DatabaseInit):
             )
         """)
 
+        # every upsert looks a song up by artist and title
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS songs_artist_title ON songs (artist_id, title)
+        """)
+
+        # index of the files each song was extracted from
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime_ns INTEGER,
+                inode INTEGER,
+                song_id INTEGER,
+                fingerprint TEXT,
+                FOREIGN KEY(song_id) REFERENCES songs(song_id)
+            )
+        """)
+
+        # databases from before fingerprints get the column added
+        if 'fingerprint' not in [column[1] for column in cursor.execute('PRAGMA table_info(files)')]:
+            cursor.execute('ALTER TABLE files ADD COLUMN fingerprint TEXT')
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS files_song ON files (song_id)
+        """)
+
+        # duplicate audio is found by grouping on the fingerprint
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS files_fingerprint ON files (fingerprint)
+        """)
+
+        # scan bundles that were already merged, so merging one twice is a no-op
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS bundles (
+                bundle_id TEXT PRIMARY KEY,
+                shard INTEGER,
+                shards INTEGER,
+                merged_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
         conn.commit()
         conn.close()
 
 
+    def snapshot(self, dest_path: str) -> None:
+        """
+        Writes a consistent copy of the database through the SQLite backup API, the copy
+        reflects a single point in time even while other connections keep writing. Snapshots
+        can be browsed without any locking by opening them with `immutable=True`.
+
+        Parameters:
+            dest_path : str
+                Path of the copy, must be a `.db` file that does not exist yet.
+        """
+        if not dest_path.endswith('.db'):
+            raise TypeError("Database must be a .db file")
+        if os.path.exists(dest_path):
+            raise FileExistsError(f"{dest_path} already exists")
+
+        conn = self.connect()
+        dest = sqlite3.connect(dest_path)
+        try:
+            # copied in one step, a stepwise backup restarts whenever another connection commits
+            conn.backup(dest)
+            # a snapshot is a single file, no -wal or -shm next to it
+            dest.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            dest.close()
+            conn.close()
+
+
 class DatabaseRead(DatabaseInit):
     def get_all_artists(self) -> List[Dict]:
         """
@@ -66,7 +216,7 @@ class DatabaseRead(DatabaseInit):
             A list of dictionaries representing each artist in the database,
             with keys 'artist_id' and 'name'.
         """
-        conn = sqlite3.connect(self.path)
+        conn = self.connect()
         cursor = conn.cursor()
         cursor.execute('SELECT artist_id, name FROM artists')
         result = cursor.fetchall()
@@ -87,7 +237,7 @@ class DatabaseRead(DatabaseInit):
             A dictionary representing the artist in the database,
             with keys 'artist_id' and 'name'.
         """
-        conn = sqlite3.connect(self.path)
+        conn = self.connect()
         cursor = conn.cursor()
         cursor.execute('SELECT artist_id, name FROM artists WHERE artist_id = ?', (artist_id,))
         result = cursor.fetchall()
@@ -108,7 +258,7 @@ class DatabaseRead(DatabaseInit):
             A list of dictionaries representing each song by the artist in the database,
             with keys 'song_id', 'title', 'features', 'misc', 'youtube_id', and 'file_extension'.
         """
-        conn = sqlite3.connect(self.path)
+        conn = self.connect()
         cursor = conn.cursor()
         cursor.execute('SELECT song_id, title, features, misc, youtube_id, file_extension '
                     'FROM songs WHERE artist_id = ?', (artist_id,))
@@ -131,7 +281,7 @@ class DatabaseRead(DatabaseInit):
             A dictionary representing the song in the database,
             with keys 'song_id', 'title', 'features', 'misc', 'youtube_id', and 'file_extension'.
         """
-        conn = sqlite3.connect(self.path)
+        conn = self.connect()
         cursor = conn.cursor()
         cursor.execute('SELECT song_id, title, features, misc, youtube_id, file_extension '
                     'FROM songs WHERE song_id = ?', (song_id,))
@@ -144,6 +294,120 @@ class DatabaseRead(DatabaseInit):
 
 
 class DatabaseUpdate(DatabaseInit):
+    def update_row(self, cursor: sqlite3.Cursor, row: Dict) -> tuple:
+        """
+        Upserts a single extraction through an already open cursor, nothing is committed.
+        If the artist exists, the data is added as a new song for that artist.
+        If the artist does not exist, a new artist entry is created and the data is added as the first song.
+        If the song already exists, any missing information is updated without changing existing information.
+
+        Parameters:
+            cursor : sqlite3.Cursor
+                A cursor of an open connection to the database.
+            row : dict
+                A single extraction produced by the Extractor.
+
+        Returns:
+            tuple : (outcome, song_id)
+                outcome is one of 'new_artist', 'new_song', 'updated', 'unchanged' or 'failure',
+                song_id is None for failed extractions.
+        """
+        if not row["status"]:
+            return "failure", None
+
+        artist_name = row["artist"].lower()
+        song_title = row["title"]
+        features = row["features"]
+        misc = row["misc"]
+        youtube_id = row["youtube_id"]
+        file_extension = row["filetype"]
+
+        # check if artist exists in database
+        try:
+            cursor.execute('SELECT artist_id FROM artists WHERE name = ?', (artist_name,))
+            result = cursor.fetchone()
+
+        except sqlite3.OperationalError:
+            result = False
+
+        if not result and self.fuzzy_threshold:
+            result = self._fuzzy_artist(cursor, artist_name)
+
+        if not result:
+            # add a new artist and song
+            cursor.execute('INSERT INTO artists (name) VALUES (?)', (artist_name,))
+            artist_id = cursor.lastrowid
+            cursor.execute('INSERT INTO songs (artist_id, title, features, misc, youtube_id, file_extension) '
+                        'VALUES (?, ?, ?, ?, ?, ?)', (artist_id, song_title, features, misc, youtube_id, file_extension))
+            return "new_artist", cursor.lastrowid
+
+        artist_id = result[0]
+        cursor.execute('SELECT song_id, features, misc, youtube_id FROM songs WHERE title = ? AND artist_id = ?',
+                    (song_title, artist_id))
+        result = cursor.fetchone()
+
+        if not result:
+            # add a new song for the artist
+            cursor.execute('INSERT INTO songs (artist_id, title, features, misc, youtube_id, file_extension) '
+                        'VALUES (?, ?, ?, ?, ?, ?)', (artist_id, song_title, features, misc, youtube_id, file_extension))
+            return "new_song", cursor.lastrowid
+
+        check = False
+        song_id = result[0]
+        # update only the missing information for the existing song
+        if result[1] is None:
+            check = True
+            cursor.execute('UPDATE songs SET features = ? WHERE song_id = ?', (features, song_id))
+        if result[2] is None:
+            check = True
+            cursor.execute('UPDATE songs SET misc = ? WHERE song_id = ?', (misc, song_id))
+        if result[3] is None:
+            check = True
+            cursor.execute('UPDATE songs SET youtube_id = ? WHERE song_id = ?', (youtube_id, song_id))
+
+        return ("updated" if check else "unchanged"), song_id
+
+    def update_rows(self, cursor: sqlite3.Cursor, data: List[Dict], files: List[FileEntry] = None) -> tuple:
+        """
+        Upserts a batch of extractions through an already open cursor, nothing is committed.
+        Used by `update_database` and by writers that keep their own connection open
+        across several batches.
+
+        Parameters:
+            cursor : sqlite3.Cursor
+                A cursor of an open connection to the database.
+            data : list of dicts
+                A list of extractions produced by the Extractor.
+            files : list of FileEntry, optional
+                The files the extractions were made from, in the same order as `data`.
+                When given, each file is recorded in the `files` table with its song.
+
+        Returns:
+            tuple : (new_artists, new_songs, updated, failure)
+                Stats of the batch
+        """
+        new_artists = 0
+        new_songs = 0
+        updated = 0
+        failure = 0
+
+        for index, row in enumerate(data):
+            outcome, song_id = self.update_row(cursor, row)
+            if files is not None and files[index] is not None:
+                self.index_file(cursor, files[index], song_id)
+            match outcome:
+                case "new_artist":
+                    new_artists += 1
+                    new_songs += 1
+                case "new_song":
+                    new_songs += 1
+                case "updated":
+                    updated += 1
+                case "failure":
+                    failure += 1
+
+        return new_artists, new_songs, updated, failure
+
     def update_database(self, data: List[Dict]) -> None:
         """
         Updates the database with the provided data from an extractor.
@@ -160,74 +424,725 @@ class DatabaseUpdate(DatabaseInit):
             tuple : (new_artists, new_songs, updated, failure)
                 Stats of last update run
         """
-        conn = sqlite3.connect(self.path)
+        conn = self.connect()
         cursor = conn.cursor()
-        new_artists = 0
-        new_songs = 0
-        updated = 0
-        failure = 0
+        stats = self.update_rows(cursor, data)
+        conn.commit()
+        conn.close()
+        return stats
+
+
+class DatabaseArtists(DatabaseInit):
+    def _fuzzy_artist(self, cursor: sqlite3.Cursor, name: str) -> tuple:
+        """
+        Looks up the artist `update_row` should file `name` under when there is no exact
+        match, through an ArtistIndex kept for the lifetime of this object.
+
+        Returns:
+            tuple : (artist_id,) of the most similar artist, None if none is similar enough.
+        """
+        if self._artist_index is None:
+            self._artist_index = ArtistIndex()
+        index = self._artist_index
+        # artist ids only grow, so artists added since the last lookup, by this or any other
+        # connection, are a range read of the primary key
+        cursor.execute('SELECT artist_id, name FROM artists WHERE artist_id > ?', (index.last_id,))
+        for artist_id, artist_name in cursor.fetchall():
+            index.add(artist_id, artist_name)
+
+        for artist_id, _ in index.matches(name, self.fuzzy_threshold):
+            # merged artists are gone from the table but not from the index
+            cursor.execute('SELECT artist_id FROM artists WHERE artist_id = ?', (artist_id,))
+            result = cursor.fetchone()
+            if result:
+                self.fuzzy_matched += 1
+                return result
+        return None
+
+    def find_duplicate_artists(self, threshold: float = DUPLICATE_THRESHOLD) -> List[List[Dict]]:
+        """
+        Finds groups of artists whose names are at least `threshold` similar, such as
+        'artist', 'the artist' and 'artíst'. Every artist is looked up once in a trigram
+        index, so the work grows with the number of artists and not with the number of pairs.
+
+        Parameters:
+            threshold : float, optional
+                Minimum similarity of two names, above 0 and at most 1.
+
+        Returns:
+            List[List[Dict]] : per group the artists with keys 'artist_id', 'name', 'songs'
+                and 'similarity'. The artist with the most songs comes first, of those with as
+                many the one most similar to the rest. It is the one the others are compared
+                with and would be merged into.
+        """
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute('SELECT artist_id, name FROM artists')
+        index = ArtistIndex.build(cursor.fetchall())
+        cursor.execute('SELECT artist_id, COUNT(*) FROM songs GROUP BY artist_id')
+        songs = dict(cursor.fetchall())
+        conn.close()
 
+        groups = []
+        for group in index.duplicates(threshold):
+            names = [index.names[artist_id] for artist_id in group]
+            # among artists with as many songs, keep the name closest to all the others
+            closeness = {
+                artist_id: sum(similarity(name, other) for other in names)
+                for artist_id, name in zip(group, names)
+            }
+            group.sort(key=lambda artist_id: (-songs.get(artist_id, 0), -closeness[artist_id], artist_id))
+            keep = index.names[group[0]]
+            groups.append([
+                {
+                    'artist_id': artist_id,
+                    'name': index.names[artist_id],
+                    'songs': songs.get(artist_id, 0),
+                    'similarity': round(similarity(keep, index.names[artist_id]), 3)
+                }
+                for artist_id in group
+            ])
+        return groups
 
-        for row in data:
-            if not row["status"]:
-                failure += 1
+    def merge_artists(self, keep_id: int, artist_ids: Iterable[int]) -> tuple:
+        """
+        Merges artists into the artist `keep_id` in one transaction. Their songs move to it,
+        a song whose title the kept artist already has is merged into that song instead:
+        missing information is filled in and its files point to the kept song.
+
+        Parameters:
+            keep_id : int
+                The artist that remains.
+            artist_ids : Iterable[int]
+                The artists merged into it and removed.
+
+        Returns:
+            tuple : (artists, moved, merged)
+                Artists removed, songs moved and songs merged into an existing song.
+        """
+        conn = self.connect()
+        cursor = conn.cursor()
+        artists = moved = merged = 0
+        try:
+            for artist_id in artist_ids:
+                if artist_id == keep_id:
+                    continue
+                cursor.execute('SELECT song_id, title, features, misc, youtube_id FROM songs WHERE artist_id = ?',
+                            (artist_id,))
+                for song_id, title, features, misc, youtube_id in cursor.fetchall():
+                    cursor.execute('SELECT song_id FROM songs WHERE title = ? AND artist_id = ?', (title, keep_id))
+                    existing = cursor.fetchone()
+                    if existing is None:
+                        cursor.execute('UPDATE songs SET artist_id = ? WHERE song_id = ?', (keep_id, song_id))
+                        moved += 1
+                        continue
+                    # the same rule as an upsert, only missing information is filled in
+                    cursor.execute(
+                        'UPDATE songs SET features = COALESCE(features, ?), misc = COALESCE(misc, ?), '
+                        'youtube_id = COALESCE(youtube_id, ?) WHERE song_id = ?',
+                        (features, misc, youtube_id, existing[0])
+                    )
+                    cursor.execute('UPDATE files SET song_id = ? WHERE song_id = ?', (existing[0], song_id))
+                    cursor.execute('DELETE FROM songs WHERE song_id = ?', (song_id,))
+                    merged += 1
+                cursor.execute('DELETE FROM artists WHERE artist_id = ?', (artist_id,))
+                artists += cursor.rowcount
+            conn.commit()
+        except:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return artists, moved, merged
+
+
+class DatabaseFiles(DatabaseInit):
+    def get_file_index(self, directory: str) -> Dict[str, tuple]:
+        """
+        Retrieves the recorded files under a directory.
+
+        Parameters:
+            directory : str
+                An absolute directory path, every file below it is returned.
+
+        Returns:
+            A dict mapping each recorded path to a tuple of (size, mtime_ns, inode).
+        """
+        prefix = directory.rstrip(os.sep) + os.sep
+        # a range over the primary key instead of LIKE, so the index is used and no escaping is needed
+        upper = prefix[:-1] + chr(ord(os.sep) + 1)
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute('SELECT path, size, mtime_ns, inode FROM files WHERE path >= ? AND path < ?',
+                    (prefix, upper))
+        index = {row[0]: (row[1], row[2], row[3]) for row in cursor}
+        conn.close()
+        return index
+
+    def index_file(self, cursor: sqlite3.Cursor, entry: FileEntry, song_id: int) -> None:
+        """
+        Records a file and the song extracted from it, nothing is committed. If the file
+        was previously linked to another song that no other file points to, that song is removed.
+
+        Parameters:
+            cursor : sqlite3.Cursor
+                A cursor of an open connection to the database.
+            entry : FileEntry
+                The file and its stat values.
+            song_id : int
+                The song extracted from the file, None for failed extractions.
+        """
+        cursor.execute('SELECT song_id FROM files WHERE path = ?', (entry.path,))
+        previous = cursor.fetchone()
+        cursor.execute('INSERT INTO files (path, size, mtime_ns, inode, song_id) VALUES (?, ?, ?, ?, ?) '
+                    f'ON CONFLICT(path) DO UPDATE SET {KEEP_FINGERPRINT}, size = excluded.size, '
+                    'mtime_ns = excluded.mtime_ns, inode = excluded.inode, song_id = excluded.song_id',
+                    (entry.path, entry.size, entry.mtime_ns, entry.inode, song_id))
+        if previous and previous[0] is not None and previous[0] != song_id:
+            self._drop_orphan_song(cursor, previous[0])
+
+    def remove_files(self, paths: Iterable[str]) -> int:
+        """
+        Removes files from the index, songs only linked to removed files are removed as well.
+        Songs that were added without a file (through `update_database`) are never touched.
+
+        Parameters:
+            paths : iterable of str
+                The paths to remove.
+
+        Returns:
+            int : the number of removed files.
+        """
+        removed = 0
+        conn = self.connect()
+        cursor = conn.cursor()
+        for path in paths:
+            cursor.execute('DELETE FROM files WHERE path = ? RETURNING song_id', (path,))
+            result = cursor.fetchone()
+            if result is None:
                 continue
+            removed += 1
+            if result[0] is not None:
+                self._drop_orphan_song(cursor, result[0])
+        conn.commit()
+        conn.close()
+        return removed
 
-            artist_name = row["artist"].lower()
-            song_title = row["title"]
-            features = row["features"]
-            misc = row["misc"]
-            youtube_id = row["youtube_id"]
-            file_extension = row["filetype"]
+    def iter_fingerprint_paths(self, directory: str = None, rehash: bool = False, batch_size: int = 1000) -> Iterator[str]:
+        """
+        Streams the recorded files that have no fingerprint yet, a page of `batch_size` paths
+        at a time in path order. Fingerprints written while iterating do not disturb it.
 
-            # check if artist exists in database
-            try:
-                cursor.execute('SELECT artist_id FROM artists WHERE name = ?', (artist_name,))
-                result = cursor.fetchone()
+        Parameters:
+            directory : str, optional
+                Only files below this directory are returned.
+            rehash : bool, optional
+                Return every file, also those that already have a fingerprint.
+            batch_size : int, optional
+                Paths per query.
 
-            except sqlite3.OperationalError:
-                result = False
+        Returns:
+            Iterator[str] : the paths.
+        """
+        lower, upper = '', None
+        if directory is not None:
+            lower = os.path.abspath(directory).rstrip(os.sep) + os.sep
+            upper = lower[:-1] + chr(ord(os.sep) + 1)
+        where = 'path > ?' + ('' if upper is None else ' AND path < ?') + ('' if rehash else ' AND fingerprint IS NULL')
 
-            if result:
-                artist_id = result[0]
-                cursor.execute('SELECT song_id, features, misc, youtube_id FROM songs WHERE title = ? AND artist_id = ?',
-                            (song_title, artist_id))
-                result = cursor.fetchone()
-                if result:
-                    check = False
-                    song_id = result[0]
-                    # update only the missing information for the existing song
-                    if result[1] is None:
-                        check = True
-                        cursor.execute('UPDATE songs SET features = ? WHERE song_id = ?', (features, song_id))
-                    if result[2] is None:
-                        check = True
-                        cursor.execute('UPDATE songs SET misc = ? WHERE song_id = ?', (misc, song_id))
-                    if result[3] is None:
-                        check = True
-                        cursor.execute('UPDATE songs SET youtube_id = ? WHERE song_id = ?', (youtube_id, song_id))
-                    if check:
-                        updated += 1
-                else:
-                    # add a new song for the artist
-                    cursor.execute('INSERT INTO songs (artist_id, title, features, misc, youtube_id, file_extension) '
-                                'VALUES (?, ?, ?, ?, ?, ?)', (artist_id, song_title, features, misc, youtube_id, file_extension))
-                    new_songs += 1
-            else:
-                # add a new artist and song
-                cursor.execute('INSERT INTO artists (name) VALUES (?)', (artist_name,))
-                artist_id = cursor.lastrowid
-                cursor.execute('INSERT INTO songs (artist_id, title, features, misc, youtube_id, file_extension) '
-                            'VALUES (?, ?, ?, ?, ?, ?)', (artist_id, song_title, features, misc, youtube_id, file_extension))
-                new_songs += 1
-                new_artists += 1
+        conn = self.connect()
+        try:
+            # keyset pagination over the primary key, every page is a fresh index range read
+            last = lower
+            while True:
+                rows = conn.execute(
+                    f'SELECT path FROM files WHERE {where} ORDER BY path LIMIT ?',
+                    (last,) + (() if upper is None else (upper,)) + (batch_size,)
+                ).fetchall()
+                if not rows:
+                    return
+                for row in rows:
+                    yield row[0]
+                last = rows[-1][0]
+        finally:
+            conn.close()
+
+    def set_fingerprints(self, fingerprints: List[tuple]) -> None:
+        """
+        Records the fingerprints of files in one transaction.
 
+        Parameters:
+            fingerprints : list of tuples
+                (path, fingerprint) per file, see `audiodotturn.fingerprint`.
+        """
+        conn = self.connect()
+        conn.executemany('UPDATE files SET fingerprint = ? WHERE path = ?',
+                    [(fingerprint, path) for path, fingerprint in fingerprints])
         conn.commit()
         conn.close()
-        return new_artists, new_songs, updated, failure
+
+    def find_duplicate_files(self) -> List[List[Dict]]:
+        """
+        Groups the files with the same fingerprint, the same audio under different names.
+
+        Returns:
+            List[List[Dict]] : per group the files with keys 'path', 'size', 'fingerprint',
+                'song_id', 'artist' and 'title', the largest groups first.
+        """
+        conn = self.connect()
+        try:
+            rows = conn.execute("""
+                SELECT f.path, f.size, f.fingerprint, f.song_id, a.name, s.title
+                FROM files f
+                LEFT JOIN songs s ON s.song_id = f.song_id
+                LEFT JOIN artists a ON a.artist_id = s.artist_id
+                WHERE f.fingerprint IN (
+                    SELECT fingerprint FROM files WHERE fingerprint IS NOT NULL
+                    GROUP BY fingerprint HAVING COUNT(*) > 1
+                )
+                ORDER BY f.fingerprint, f.path
+            """).fetchall()
+        except sqlite3.OperationalError:
+            # a database that was never fingerprinted has no fingerprint column
+            rows = []
+        finally:
+            conn.close()
+
+        groups = {}
+        for path, size, fingerprint, song_id, artist, title in rows:
+            groups.setdefault(fingerprint, []).append({
+                'path': path,
+                'size': size,
+                'fingerprint': fingerprint,
+                'song_id': song_id,
+                'artist': artist,
+                'title': title
+            })
+        return sorted(groups.values(), key=lambda group: (-len(group), group[0]['path']))
+
+    def _drop_orphan_song(self, cursor: sqlite3.Cursor, song_id: int) -> None:
+        """
+        Removes a song no file points to anymore, and its artist if it has no songs left.
+        """
+        cursor.execute('DELETE FROM songs WHERE song_id = ? AND NOT EXISTS '
+                    '(SELECT 1 FROM files WHERE song_id = ?) RETURNING artist_id', (song_id, song_id))
+        result = cursor.fetchone()
+        if result is not None:
+            cursor.execute('DELETE FROM artists WHERE artist_id = ? AND NOT EXISTS '
+                        '(SELECT 1 FROM songs WHERE artist_id = ?)', (result[0], result[0]))
+
+    # columns selected for `iter_extractions`, in the order of EXTRACTION_FIELDS
+    EXTRACTION_COLUMNS = 's.song_id, a.name, s.title, s.features, s.misc, s.youtube_id, s.file_extension, f.path'
+    EXTRACTION_FIELDS = ['song_id', 'artist', 'title', 'features', 'misc', 'youtube_id', 'filetype', 'path']
+
+    def iter_extractions(self, query: Dict = None, batch_size: int = 1000) -> Iterator[Dict]:
+        """
+        Streams catalogued songs as extractions, so they can be passed to a Constructor without
+        running the extractor again. A song yields one record per file recorded for it, songs
+        without files yield a single record with a path of None.
+
+        Parameters:
+            query : dict, optional
+                Filters, all optional: 'artist' (exact artist name), 'artist_id', 'song_id',
+                'path_prefix' (only files below this directory) or 'paths' (these files only,
+                in the given order, paths that are not recorded yield failed extractions).
+            batch_size : int
+                Rows per fetch.
+
+        Returns:
+            An iterator of dicts with the keys of an extraction plus 'song_id' and 'path',
+            'original_file' is the name of the file.
+        """
+        query = query or {}
+        if query.get('paths') is not None:
+            yield from self._iter_extractions_by_path(query['paths'], batch_size)
+            return
+
+        clauses = []
+        params = []
+        if query.get('artist') is not None:
+            clauses.append('a.name = ?')
+            params.append(query['artist'])
+        if query.get('artist_id') is not None:
+            clauses.append('s.artist_id = ?')
+            params.append(query['artist_id'])
+        if query.get('song_id') is not None:
+            clauses.append('s.song_id = ?')
+            params.append(query['song_id'])
+        if query.get('path_prefix') is not None:
+            prefix = os.path.abspath(query['path_prefix']).rstrip(os.sep) + os.sep
+            clauses.append('f.path >= ? AND f.path < ?')
+            params.extend((prefix, prefix[:-1] + chr(ord(os.sep) + 1)))
+
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT {self.EXTRACTION_COLUMNS} FROM songs s '
+                        'JOIN artists a ON a.artist_id = s.artist_id LEFT JOIN files f ON f.song_id = s.song_id'
+                        + (' WHERE ' + ' AND '.join(clauses) if clauses else '') +
+                        ' ORDER BY s.song_id, f.path', params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield self._extraction(row)
+        finally:
+            conn.close()
+
+    def _iter_extractions_by_path(self, paths: Iterable[str], batch_size: int) -> Iterator[Dict]:
+        """
+        Looks paths up `batch_size` at a time and yields their extractions in the given order.
+        """
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            batch = []
+            for path in paths:
+                batch.append(os.path.abspath(path))
+                if len(batch) >= batch_size:
+                    yield from self._lookup_paths(cursor, batch)
+                    batch = []
+            if batch:
+                yield from self._lookup_paths(cursor, batch)
+        finally:
+            conn.close()
+
+    def _lookup_paths(self, cursor: sqlite3.Cursor, paths: List[str]) -> Iterator[Dict]:
+        """
+        Yields the extraction of each path, a failed one for paths that are not recorded.
+        """
+        cursor.execute(f'SELECT {self.EXTRACTION_COLUMNS} FROM files f '
+                    'JOIN songs s ON s.song_id = f.song_id JOIN artists a ON a.artist_id = s.artist_id '
+                    f'WHERE f.path IN ({", ".join("?" * len(paths))})', paths)
+        found = {row[-1]: row for row in cursor.fetchall()}
+        for path in paths:
+            row = found.get(path)
+            if row is not None:
+                yield self._extraction(row)
+            else:
+                yield dict(dict.fromkeys(self.EXTRACTION_FIELDS), original_file=os.path.basename(path), path=path, status=False)
+
+    def _extraction(self, row: tuple) -> Dict:
+        """
+        Builds an extraction from a row selected with EXTRACTION_COLUMNS.
+        """
+        record = dict(zip(self.EXTRACTION_FIELDS, row))
+        record['original_file'] = os.path.basename(record['path']) if record['path'] else None
+        record['status'] = True
+        return record
+
+
+class DatabaseMerge(DatabaseInit):
+    def is_merged(self, bundle_id: str) -> bool:
+        """
+        Checks whether a scan bundle was already merged into the database.
+
+        Parameters:
+            bundle_id : str
+                The id of the bundle.
+
+        Returns:
+            bool : True if the bundle was merged before.
+        """
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1 FROM bundles WHERE bundle_id = ?', (bundle_id,))
+        result = cursor.fetchone()
+        conn.close()
+        return result is not None
+
+    def record_bundle(self, cursor: sqlite3.Cursor, bundle: Dict) -> None:
+        """
+        Marks a scan bundle as merged, nothing is committed so it can share the merge's transaction.
+
+        Parameters:
+            cursor : sqlite3.Cursor
+                A cursor of an open connection to the database.
+            bundle : dict
+                The bundle header, with keys 'bundle_id', 'shard' and 'shards'.
+        """
+        cursor.execute('INSERT OR IGNORE INTO bundles (bundle_id, shard, shards) VALUES (?, ?, ?)',
+                    (bundle["bundle_id"], bundle["shard"], bundle["shards"]))
+
+    def merge_database(self, shard_path: str, bundle: Dict = None) -> tuple:
+        """
+        Merges another audiodotturn database (usually a shard written by a single ingest worker)
+        into this one with set-based statements instead of row by row upserts.
+
+        Artists are matched by name. Songs are matched by artist and title with the same
+        semantics as `update_database`: missing fields of existing songs are filled in without
+        changing existing information and everything else is inserted as a new song. Indexed
+        files are carried over and linked to the merged songs.
+
+        Parameters:
+            shard_path : str
+                Path of the database to merge, its tables must have been created by `create_tables`.
+            bundle : dict, optional
+                A scan bundle header, recorded as merged in the same transaction.
+
+        Returns:
+            tuple : (new_artists, new_songs, updated, files)
+                Stats of the merge
+        """
+        conn = self.connect()
+        cursor = conn.cursor()
+        attached = False
+
+        try:
+            cursor.execute('ATTACH DATABASE ? AS shard', (shard_path,))
+            attached = True
+
+            cursor.execute('INSERT OR IGNORE INTO main.artists (name) '
+                        'SELECT name FROM shard.artists ORDER BY artist_id')
+            new_artists = cursor.rowcount
+
+            # every shard song with its artist id in this database and its matching song, if any
+            cursor.execute("""
+                CREATE TEMP TABLE merge_songs AS
+                SELECT s.song_id AS shard_song_id, a.artist_id, s.title, s.features, s.misc,
+                    s.youtube_id, s.file_extension,
+                    (SELECT m.song_id FROM main.songs m
+                        WHERE m.artist_id = a.artist_id AND m.title = s.title) AS song_id
+                FROM shard.songs s
+                JOIN shard.artists sa ON sa.artist_id = s.artist_id
+                JOIN main.artists a ON a.name = sa.name
+            """)
+
+            # update only the missing information for existing songs
+            cursor.execute("""
+                UPDATE main.songs SET
+                    features = COALESCE(songs.features, m.features),
+                    misc = COALESCE(songs.misc, m.misc),
+                    youtube_id = COALESCE(songs.youtube_id, m.youtube_id)
+                FROM temp.merge_songs m
+                WHERE songs.song_id = m.song_id
+                    AND (songs.features IS NULL OR songs.misc IS NULL OR songs.youtube_id IS NULL)
+            """)
+            updated = cursor.rowcount
+
+            # ids for new songs are assigned up front so files can be linked without a lookup
+            cursor.execute("""
+                UPDATE temp.merge_songs SET song_id = n.song_id FROM (
+                    SELECT shard_song_id,
+                        (SELECT COALESCE(MAX(song_id), 0) FROM main.songs)
+                            + row_number() OVER (ORDER BY shard_song_id) AS song_id
+                    FROM temp.merge_songs WHERE song_id IS NULL
+                ) AS n
+                WHERE merge_songs.shard_song_id = n.shard_song_id
+            """)
+
+            cursor.execute("""
+                INSERT INTO main.songs (song_id, artist_id, title, features, misc, youtube_id, file_extension)
+                SELECT m.song_id, m.artist_id, m.title, m.features, m.misc, m.youtube_id, m.file_extension
+                FROM temp.merge_songs m
+                WHERE NOT EXISTS (SELECT 1 FROM main.songs s WHERE s.song_id = m.song_id)
+                ORDER BY m.song_id
+            """)
+            new_songs = cursor.rowcount
+
+            # songs the merged paths point to now, they may lose their last file below
+            cursor.execute("""
+                CREATE TEMP TABLE merge_previous AS
+                SELECT DISTINCT f.song_id FROM main.files f
+                JOIN shard.files s ON s.path = f.path
+                WHERE f.song_id IS NOT NULL
+            """)
+
+            cursor.execute(f"""
+                INSERT INTO main.files (path, size, mtime_ns, inode, song_id)
+                SELECT f.path, f.size, f.mtime_ns, f.inode, m.song_id
+                FROM shard.files f
+                LEFT JOIN temp.merge_songs m ON m.shard_song_id = f.song_id
+                WHERE true
+                ON CONFLICT(path) DO UPDATE SET {KEEP_FINGERPRINT}, size = excluded.size,
+                    mtime_ns = excluded.mtime_ns, inode = excluded.inode, song_id = excluded.song_id
+            """)
+            files = cursor.rowcount
+
+            # the same cleanup as `index_file`, songs no file points to anymore and their
+            # artists if they have no songs left
+            cursor.execute("""
+                DELETE FROM main.songs WHERE song_id IN (SELECT song_id FROM temp.merge_previous)
+                    AND NOT EXISTS (SELECT 1 FROM main.files WHERE files.song_id = songs.song_id)
+                RETURNING artist_id
+            """)
+            orphan_artists = {row[0] for row in cursor.fetchall()}
+            cursor.executemany('DELETE FROM main.artists WHERE artist_id = ? AND NOT EXISTS '
+                        '(SELECT 1 FROM main.songs WHERE artist_id = ?)',
+                        [(artist_id, artist_id) for artist_id in orphan_artists])
+            cursor.execute('DROP TABLE temp.merge_previous')
+
+            if bundle is not None:
+                self.record_bundle(cursor, bundle)
+
+            cursor.execute('DROP TABLE temp.merge_songs')
+            conn.commit()
+
+        except:
+            conn.rollback()
+            raise
+
+        finally:
+            try:
+                if attached:
+                    cursor.execute('DETACH DATABASE shard')
+            finally:
+                conn.close()
+
+        return new_artists, new_songs, updated, files
+
+
+class DatabaseTransfer(DatabaseInit):
+    # columns of exported catalogue rows, the names match the keys of an extraction
+    CATALOGUE_FIELDS = ['song_id', 'artist', 'title', 'features', 'misc', 'youtube_id', 'filetype']
+
+    def iter_catalogue(self, batch_size: int = 1000) -> Iterator[Dict]:
+        """
+        Streams every song with its artist, rows are fetched from the cursor `batch_size` at a time
+        so memory use does not depend on the size of the catalogue.
+
+        Parameters:
+            batch_size : int
+                Rows per fetch.
+
+        Returns:
+            An iterator of dicts with the keys in `CATALOGUE_FIELDS`.
+        """
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT s.song_id, a.name, s.title, s.features, s.misc, s.youtube_id, s.file_extension '
+                        'FROM songs s JOIN artists a ON a.artist_id = s.artist_id ORDER BY s.song_id')
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(zip(self.CATALOGUE_FIELDS, row))
+        finally:
+            conn.close()
+
+    def export_catalogue(self, path: str, batch_size: int = 1000, progress: Callable[[int], None] = None) -> int:
+        """
+        Writes the catalogue to a NDJSON (`.ndjson`, `.jsonl`) or CSV (`.csv`) file, a `.gz`
+        suffix compresses it with gzip. Rows are streamed straight from the database.
+
+        Parameters:
+            path : str
+                The file to write.
+            batch_size : int
+                Rows per fetch, `progress` is called after each batch.
+            progress : callable, optional
+                Called with the number of rows written so far.
+
+        Returns:
+            int : the number of exported rows.
+        """
+        fmt = self.transfer_format(path)
+        count = 0
+
+        with self._open_transfer(path, "wt") as out:
+            if fmt == "csv":
+                writer = csv.DictWriter(out, fieldnames=self.CATALOGUE_FIELDS)
+                writer.writeheader()
+                write = writer.writerow
+            else:
+                write = lambda row: out.write(json.dumps(row) + "\n")
+
+            for row in self.iter_catalogue(batch_size):
+                write(row)
+                count += 1
+                if progress is not None and count % batch_size == 0:
+                    progress(count)
+
+        if progress is not None:
+            progress(count)
+        return count
+
+    def import_catalogue(self, path: str, batch_size: int = 1000, progress: Callable[[int], None] = None) -> tuple:
+        """
+        Reads a file written by `export_catalogue` and upserts it in batches with the same
+        semantics as `update_database`, only one batch is held in memory at a time.
+        NDJSON files produced elsewhere work as long as each line has the keys of an extraction,
+        rows without an artist are counted as failures.
+
+        Parameters:
+            path : str
+                The file to read, the format follows the extension as in `export_catalogue`.
+            batch_size : int
+                Rows per transaction, `progress` is called after each batch.
+            progress : callable, optional
+                Called with the number of rows read so far.
+
+        Returns:
+            tuple : (new_artists, new_songs, updated, failure)
+        """
+        fmt = self.transfer_format(path)
+        totals = [0, 0, 0, 0]
+        count = 0
+
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        def flush(batch):
+            for index, value in enumerate(self.update_rows(cursor, batch)):
+                totals[index] += value
+            conn.commit()
+            if progress is not None:
+                progress(count)
+
+        try:
+            with self._open_transfer(path, "rt") as source:
+                if fmt == "csv":
+                    # csv has no null, empty cells are read back as None
+                    rows = ({key: value or None for key, value in row.items()} for row in csv.DictReader(source))
+                else:
+                    rows = (json.loads(line) for line in source if line.strip())
+
+                batch = []
+                for row in rows:
+                    row["status"] = bool(row.get("artist")) and row.get("status", True)
+                    for key in ('title', 'features', 'misc', 'youtube_id', 'filetype'):
+                        row.setdefault(key, None)
+                    batch.append(row)
+                    count += 1
+                    if len(batch) >= batch_size:
+                        flush(batch)
+                        batch = []
+                if batch:
+                    flush(batch)
+        finally:
+            conn.close()
+
+        return tuple(totals)
+
+    @staticmethod
+    def transfer_format(path: str) -> str:
+        """
+        Returns 'csv' or 'ndjson' for an export or import path, a `.gz` suffix is ignored.
+
+        Raises:
+            TypeError: For any other extension.
+        """
+        base = path[:-3] if path.endswith('.gz') else path
+        if base.endswith('.csv'):
+            return "csv"
+        if base.endswith(('.ndjson', '.jsonl')):
+            return "ndjson"
+        raise TypeError("file must be a .csv, .ndjson or .jsonl file, optionally with .gz")
+
+    @staticmethod
+    def _open_transfer(path: str, mode: str) -> IO:
+        """
+        Opens an export or import file as text, through gzip for `.gz` paths.
+        """
+        if path.endswith('.gz'):
+            return gzip.open(path, mode, encoding="utf-8", newline="")
+        return open(path, mode, encoding="utf-8", newline="")
 
 
-class Database(DatabaseCreate, DatabaseRead, DatabaseUpdate):
+class Database(DatabaseCreate, DatabaseRead, DatabaseUpdate, DatabaseArtists, DatabaseFiles, DatabaseMerge, DatabaseTransfer):
     """
     Subclass of all Database Classes, usually what will be instantiated.
     """
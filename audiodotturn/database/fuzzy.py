@@ -0,0 +1,237 @@
+import math
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# similarity from which `Database.find_duplicate_artists` suggests two artists as duplicates.
+# Mapping names during an ingest should use a higher one, see fuzzy_artists in the config.
+DUPLICATE_THRESHOLD = 0.7
+
+# slack for the float products of thresholds and trigram counts, 0.7 * 10 is not 7
+EPSILON = 1e-9
+
+# articles dropped from the start of a name, "The Artist" and "Artist" are the same artist
+ARTICLES = ("the ",)
+
+
+def normalize_artist(name: str) -> str:
+    """
+    The form artist names are compared in: accents removed, case folded, punctuation
+    replaced by spaces, a leading article dropped and whitespace collapsed.
+    "The Artíst." and "artist" both become "artist".
+    """
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(char for char in name if not unicodedata.combining(char)).casefold()
+    # punctuation separates words, "jay-z" and "jay z" are the same name
+    name = "".join(char if char.isalnum() or char.isspace() else " " for char in name)
+    name = " ".join(name.split())
+    for article in ARTICLES:
+        if name.startswith(article) and len(name) > len(article):
+            name = name[len(article):]
+    return name
+
+
+def trigrams(name: str) -> Set[str]:
+    """
+    The trigrams of a normalized name, padded like pg_trgm so the start and end of
+    the name count for more than its middle.
+    """
+    if not name:
+        return set()
+    padded = f"  {name} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+def similarity(first: str, second: str) -> float:
+    """
+    Jaccard similarity of the trigrams of two artist names, 1.0 for names that normalize
+    to the same form.
+    """
+    return _jaccard(trigrams(normalize_artist(first)), trigrams(normalize_artist(second)))
+
+
+class ArtistIndex:
+    """
+    In-memory inverted index from trigrams to artists, answers "which artists have a name
+    similar to this one" without comparing the name against every artist.
+
+    A query only reads the posting lists of its rarest trigrams. Two names with a Jaccard
+    similarity of at least t share at least ceil(t * n) of the n trigrams of the query, so
+    one of any n - ceil(t * n) + 1 of them has to be shared too, and only the artists found
+    there are compared in full. Common trigrams, the padded first letters above all, are
+    never read. Names with different numbers in them never match, "artist 2" and
+    "artist 22" share most of their trigrams but are not the same artist.
+
+        index = ArtistIndex.build([(1, "artist"), (2, "someone else")])
+        index.matches("The Artíst", 0.8)    # [(1, 1.0)]
+
+    Attributes:
+        names : Dict[int, str]
+            Name of every indexed artist.
+        last_id : int
+            Highest artist id in the index, 0 while it is empty.
+    """
+    def __init__(self) -> None:
+        self.names: Dict[int, str] = {}
+        self.last_id = 0
+        self._grams: Dict[int, frozenset] = {}
+        self._digits: Dict[int, str] = {}
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+
+    @classmethod
+    def build(cls, artists: Iterable[Tuple[int, str]]) -> "ArtistIndex":
+        """
+        Indexes (artist_id, name) pairs.
+        """
+        index = cls()
+        for artist_id, name in artists:
+            index.add(artist_id, name)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, artist_id: int, name: str) -> None:
+        """
+        Adds an artist, an artist already in the index is ignored.
+        """
+        if artist_id in self.names:
+            return
+        normalized = normalize_artist(name)
+        grams = frozenset(trigrams(normalized))
+        self.names[artist_id] = name
+        self.last_id = max(self.last_id, artist_id)
+        self._grams[artist_id] = grams
+        self._digits[artist_id] = _digits(normalized)
+        for gram in grams:
+            self._postings[gram].append(artist_id)
+
+    def matches(self, name: str, threshold: float, exclude: int = None) -> List[Tuple[int, float]]:
+        """
+        Artists whose name has a similarity of at least `threshold` with `name`.
+
+        Parameters:
+            name : str
+                The name to look up, it does not need to be in the index.
+            threshold : float
+                Minimum similarity, above 0 and at most 1.
+            exclude : int, optional
+                An artist id left out of the result, the queried artist itself.
+
+        Returns:
+            List[Tuple[int, float]] : (artist_id, similarity), most similar first and
+                the oldest artist first among equals.
+        """
+        normalized = normalize_artist(name)
+        return self._matches(trigrams(normalized), _digits(normalized), threshold, exclude)
+
+    def best_match(self, name: str, threshold: float) -> Optional[int]:
+        """
+        The id of the most similar artist at or above `threshold`, None if there is none.
+        """
+        matches = self.matches(name, threshold)
+        return matches[0][0] if matches else None
+
+    def _matches(self, grams: Set[str], digits: str, threshold: float, exclude: int = None) -> List[Tuple[int, float]]:
+        if not grams or not 0 < threshold <= 1:
+            return []
+        postings = self._postings
+        # shortest posting lists first, any of them is a valid prefix, the short ones are cheap
+        prefix = sorted(grams, key=lambda gram: len(postings.get(gram, ())))
+        prefix = prefix[:_prefix_length(len(grams), threshold)]
+
+        candidates = set()
+        for gram in prefix:
+            candidates.update(postings.get(gram, ()))
+        candidates.discard(exclude)
+
+        result = [
+            (artist_id, score) for artist_id, score in self._verify(grams, digits, candidates, threshold)
+        ]
+        result.sort(key=lambda match: (-match[1], match[0]))
+        return result
+
+    def _verify(self, grams: Set[str], digits: str, candidates: Iterable[int], threshold: float) -> Iterator[Tuple[int, float]]:
+        """
+        The candidates that really are at least `threshold` similar to `grams`.
+        """
+        size = len(grams)
+        # a similar name has between threshold * size and size / threshold trigrams
+        low = threshold * size - EPSILON
+        high = size / threshold + EPSILON
+        for artist_id in candidates:
+            other = self._grams[artist_id]
+            if not low <= len(other) <= high or self._digits[artist_id] != digits:
+                continue
+            score = _jaccard(grams, other)
+            if score >= threshold - EPSILON:
+                yield artist_id, score
+
+    def duplicates(self, threshold: float = DUPLICATE_THRESHOLD) -> List[List[int]]:
+        """
+        Groups of artists with similar names. Artists are grouped when they are similar to
+        any artist of the group, so each artist is in at most one group.
+
+        Returns:
+            List[List[int]] : the artist ids of each group in ascending order, groups
+                ordered by their first artist.
+        """
+        parent: Dict[int, int] = {}
+
+        def find(artist_id: int) -> int:
+            root = artist_id
+            while parent.get(root, root) != root:
+                root = parent[root]
+            # path compression keeps the chains short for large groups
+            while parent.get(artist_id, artist_id) != root:
+                parent[artist_id], artist_id = root, parent[artist_id]
+            return root
+
+        if not 0 < threshold <= 1:
+            return []
+
+        # a self-join only indexes the prefix of every name. With the same order of trigrams
+        # for all names, rarest first, two similar names share a trigram in their prefixes,
+        # so the common trigrams are not read on either side
+        frequency = {gram: len(ids) for gram, ids in self._postings.items()}
+        prefixes: Dict[str, List[int]] = defaultdict(list)
+        for artist_id, grams in self._grams.items():
+            if not grams:
+                continue
+            prefix = sorted(grams, key=lambda gram: (frequency[gram], gram))
+            prefix = prefix[:_prefix_length(len(grams), threshold)]
+
+            candidates = set()
+            for gram in prefix:
+                candidates.update(prefixes.get(gram, ()))
+            for other, _ in self._verify(grams, self._digits[artist_id], candidates, threshold):
+                first, second = find(artist_id), find(other)
+                if first != second:
+                    parent[max(first, second)] = min(first, second)
+
+            for gram in prefix:
+                prefixes[gram].append(artist_id)
+
+        groups: Dict[int, List[int]] = defaultdict(list)
+        for artist_id in parent:
+            groups[find(artist_id)].append(artist_id)
+
+        return [sorted(set(groups[root]) | {root}) for root in sorted(groups)]
+
+
+def _digits(name: str) -> str:
+    return "".join(char for char in name if char.isdigit())
+
+
+def _prefix_length(size: int, threshold: float) -> int:
+    """
+    Trigrams of a name of `size` trigrams of which a name at least `threshold` similar
+    shares one, whichever of them are taken.
+    """
+    return size - math.ceil(threshold * size - EPSILON) + 1
+
+
+def _jaccard(first: Set[str], second: Set[str]) -> float:
+    shared = len(first & second)
+    total = len(first) + len(second) - shared
+    return shared / total if total else 0.0
@@ -0,0 +1,132 @@
+import time
+import logging
+import sqlite3
+import threading
+from typing import List, Dict
+
+logger = logging.getLogger("audiodotturn.database")
+
+
+class QueryProfiler:
+    """
+    Collects per-statement timings of every connection opened by a Database it is attached to.
+
+    Statements are keyed by their SQL text with whitespace collapsed, so the same statement
+    with different parameters is counted together. Statements slower than `threshold` are
+    logged as warnings on the 'audiodotturn.database' logger together with their query plan.
+
+    The time of a SELECT covers executing the statement and stepping to its first row,
+    rows fetched afterwards are not timed.
+
+    Attributes:
+        threshold : float
+            Seconds after which a statement is logged as slow, None disables the slow log.
+        stats : Dict[str, List]
+            SQL text mapped to [count, total seconds, max seconds, rows touched].
+    """
+    def __init__(self, threshold: float = 0.1) -> None:
+        self.threshold = threshold
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, conn: sqlite3.Connection, sql: str, parameters, elapsed: float, rows: int) -> None:
+        """
+        Adds one execution of a statement, called by ProfiledCursor.
+        """
+        key = " ".join(sql.split())
+        with self._lock:
+            entry = self.stats.get(key)
+            if entry is None:
+                entry = self.stats[key] = [0, 0.0, 0.0, 0]
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], elapsed)
+            entry[3] += max(rows, 0)
+
+        if self.threshold is not None and elapsed >= self.threshold:
+            plan = self.explain(conn, sql, parameters)
+            logger.warning("slow query (%.1f ms): %s%s", elapsed * 1000, key, "\n" + plan if plan else "")
+
+    @staticmethod
+    def explain(conn: sqlite3.Connection, sql: str, parameters) -> str:
+        """
+        Returns the EXPLAIN QUERY PLAN of a statement as indented text, parameters are needed
+        to prepare it. Statements that cannot be explained (PRAGMA, ATTACH...) return ''.
+        """
+        if parameters is None:
+            return ""
+        try:
+            # the plain Connection.execute, a profiled one would record the EXPLAIN itself
+            rows = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+        except sqlite3.Error:
+            return ""
+        depth = {0: 0}
+        lines = []
+        for node, parent, _, detail in rows:
+            depth[node] = depth.get(parent, 0) + 1
+            lines.append("  " * depth[node] + detail)
+        return "\n".join(lines)
+
+    def summary(self, limit: int = None) -> List[Dict]:
+        """
+        Returns the recorded statements sorted by total time, most expensive first.
+
+        Parameters:
+            limit (int, optional): Only return the first `limit` statements.
+
+        Returns:
+            List[Dict]: dicts with the keys 'sql', 'count', 'total', 'max', 'mean' and 'rows',
+                times in seconds.
+        """
+        with self._lock:
+            items = [
+                {"sql": sql, "count": count, "total": total, "max": longest, "mean": total / count, "rows": rows}
+                for sql, (count, total, longest, rows) in self.stats.items()
+            ]
+        items.sort(key=lambda item: item["total"], reverse=True)
+        return items[:limit] if limit else items
+
+    def reset(self) -> None:
+        """
+        Clears all recorded statements.
+        """
+        with self._lock:
+            self.stats = {}
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """
+    Cursor that reports every execute and executemany to the connection's profiler.
+    """
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        result = super().execute(sql, parameters)
+        self.connection.profiler.record(self.connection, sql, parameters, time.perf_counter() - start, self.rowcount)
+        return result
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        result = super().executemany(sql, seq_of_parameters)
+        self.connection.profiler.record(self.connection, sql, None, time.perf_counter() - start, self.rowcount)
+        return result
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """
+    Connection factory used by Database when a profiler is attached, every cursor it
+    hands out, including the ones behind the execute shortcuts, is a ProfiledCursor.
+
+    Attributes:
+        profiler : QueryProfiler
+            Set by Database.connect right after connecting.
+    """
+    profiler = None
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
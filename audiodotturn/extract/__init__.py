@@ -1 +1 @@
-from audiodotturn.extract.extraction import Extractor
\ No newline at end of file
+from audiodotturn.extract.extraction import Extractor, FAILURE_RULES, SIMPLE_FORMATS, BULK_SIZE
\ No newline at end of file
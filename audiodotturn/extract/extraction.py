@@ -1,8 +1,53 @@
 import re
 import json
 import os
-from typing import Union, List, LiteralString, Any, Dict
-import yaml
+from collections import Counter
+from typing import Union, List, LiteralString, Any, Dict, Iterable, Iterator, Optional
+
+# rules `complex_extract` counts a failed extraction under, every other rule is a success
+FAILURE_RULES = ("unsupported_ext", "unmatched")
+
+# files `extract_complex_list` hands to `extract_bulk` at a time
+BULK_SIZE = 4096
+
+# the formats `simple_extract` knows, in the order they are tried. Each rule has its patterns,
+# each with a literal every match of it contains, and the group of every extracted value
+# (artist, title, features, misc, youtube_id, filetype), 0 for values the format does not have.
+# Names without the literal are not searched, the lazy groups make a failed search far more
+# expensive than the substring test. No pattern can match across a newline and all of them end
+# at $, so the MULTILINE copies find in a newline joined chunk exactly the match `search` finds
+# in each of its names, see `extract_bulk`.
+SIMPLE_FORMATS = (
+    ("simple_full", (
+        (r"\[(.+?)\][ ]?\[(.+?)\][ ]?\[(.+?)\][ ]?\[(.+?)\][ ]?\[(.+?)\][ ]?\.(\w+)$", "]"),
+        (r"^(.+?)[ ]?-[ ](.+?) ft\. (.+?) \((.+?)\) \[(.+?)\]\.(\w+)$|^(.+?)[ ]-[ ]?(.+?)ft\.(.+?)\((.+?)\) \[(.+?)\]\.(\w+)$", "ft."),
+        (r"\((.+?)\)[ ]?\((.+?)\)[ ]?\((.+?)\)[ ]?\((.+?)\)[ ]?\((.+?)\)[ ]?\.(\w+)$", ")"),
+    ), (1, 2, 3, 4, 5, 6)),
+    ("simple_no_id", (
+        (r"\[(.+?)\][ ]?\[(.+?)\][ ]?\[(.+?)\][ ]?\[(.+?)\]\.(\w+)$", "]."),
+        (r"^(.+?)[ ]?-[ ](.+?)ft\.(.+?)\((.+?)\)\.(\w+)$|^(.+?)[ ]-[ ]?(.+?)ft\.(.+?)\((.+?)\)\.(\w+)$", "ft."),
+        (r"\((.+?)\)[ ]?\((.+?)\)[ ]?\((.+?)\)[ ]?\((.+?)\)\.(\w+)$", ")."),
+    ), (1, 2, 3, 4, 0, 5)),
+    ("simple_short", (
+        (r"\[(.+?)\][ ]?\[(.+?)\][ ]?\[(.+?)\]\.(\w+)$", "]."),
+        (r"\((.+?)\)[ ]?\((.+?)\)[ ]?\((.+?)\)\.(\w+)$", ")."),
+    ), (1, 2, 3, 0, 0, 4)),
+)
+
+# (rule, literal, pattern, multiline pattern, groups) per pattern, in the order they are tried
+_SIMPLE_PATTERNS = [
+    (rule, literal, re.compile(pattern), re.compile(pattern, re.MULTILINE), groups)
+    for rule, patterns, groups in SIMPLE_FORMATS
+    for pattern, literal in patterns
+]
+
+
+def _simple_values(match: re.Match, groups: tuple) -> List[Optional[str]]:
+    """
+    The extracted values of a simple format match, see SIMPLE_FORMATS.
+    """
+    return [match[group] if group else None for group in groups]
+
 
 class Extractor:
     """
@@ -17,6 +62,13 @@ class Extractor:
         
         extracted_data: Dict[str, Union[str, Any]]
             The extracted metadata from the last extraction.
+
+        rule: str
+            The rule that decided the last extraction: simple_full, simple_no_id, simple_short
+            or complex when it succeeded, unsupported_ext or unmatched when it failed.
+
+        rules: Counter
+            Extractions made by `complex_extract` per rule, see FAILURE_RULES.
     """
     # initialize extractor instance with optional extension list
     def __init__(self, exts: List, output_opts = List):
@@ -30,7 +82,11 @@ class Extractor:
 
         self.exts = tuple(exts)
         self.output_opts = output_opts
+        # get_extraction checks the option of every extraction
+        self._output_set = frozenset(output_opts)
         self.extracted_data = None
+        self.rule = None
+        self.rules = Counter()
 
     def get_extraction(self, opt: str = "dict"):
         """
@@ -48,24 +104,41 @@ class Extractor:
         Raises:
             None
         """
-        if opt and opt.lower() in self.output_opts and self.extracted_data:
+        return self.format_extraction(self.extracted_data, opt)
+
+    def format_extraction(self, data: Dict[str, Any], opt: str = "dict"):
+        """
+        Returns a dict extraction in a specified format, see `get_extraction`.
+
+        Parameters:
+            data: Dict[str, Any]
+                An extraction as returned with the "dict" option.
+            opt: str, optional
+                The desired format, see `get_extraction`.
+
+        Raises:
+            UserWarning: If `data` is empty or `opt` is not an output option.
+        """
+        if opt and opt.lower() in self._output_set and data:
             match opt:
                 case "json":
-                    return json.dumps(self.extracted_data)
+                    return json.dumps(data)
                 case "yaml":
-                    return yaml.dump(self.extracted_data)
+                    # yaml is only imported by the runs that ask for it
+                    import yaml
+                    return yaml.dump(data)
                 case "dict":
-                    return self.extracted_data
+                    return data
                 case "str":
-                    return ' '.join([str(value) for value in self.extracted_data.values()])
+                    return ' '.join([str(value) for value in data.values()])
                 case "list":
-                    return list(self.extracted_data)
+                    return list(data)
                 case "keys":
-                    return list(self.extracted_data.keys())
+                    return list(data.keys())
                 case "values":
-                    return list(self.extracted_data.values())
+                    return list(data.values())
                 case _:
-                    return self.extracted_data
+                    return data
         else:
             raise UserWarning("Extracted data is empty")
 
@@ -121,7 +194,7 @@ class Extractor:
             TypeError:
                 If `info` is not a list.
         """
-        if not isinstance(info, List):
+        if not isinstance(info, list):
             raise TypeError("info must be a list of 7 values")
 
         self.extracted_data = {
@@ -169,74 +242,17 @@ class Extractor:
         _file = os.path.basename(_file)
 
         if not _file.endswith(self.exts):
+            self.rule = "unsupported_ext"
             return self.false_extract(_file)
 
-        format_check = re.search(
-            r"\[(.+?)\][ ]?\[(.+?)\][ ]?\[(.+?)\][ ]?\[(.+?)\][ ]?\[(.+?)\][ ]?\.(\w+)$", _file
-        ) or re.search(
-            r"^(.+?)[ ]?-[ ](.+?) ft\. (.+?) \((.+?)\) \[(.+?)\]\.(\w+)$|^(.+?)[ ]-[ ]?(.+?)ft\.(.+?)\((.+?)\) \[(.+?)\]\.(\w+)$",
-            _file
-        ) or re.search(
-            r"\((.+?)\)[ ]?\((.+?)\)[ ]?\((.+?)\)[ ]?\((.+?)\)[ ]?\((.+?)\)[ ]?\.(\w+)$", _file
-        )
-
-        if format_check:
-
-            return self.true_extract([
-                    _file,
-                    format_check[1],
-                    format_check[2],
-                    format_check[3],
-                    format_check[4],
-                    format_check[5],
-                    format_check[6],
-                    True
-                ])
-
-        format_check = re.search(
-            r"\[(.+?)\][ ]?\[(.+?)\][ ]?\[(.+?)\][ ]?\[(.+?)\]\.(\w+)$",
-            _file
-        ) or re.search(
-            r"^(.+?)[ ]?-[ ](.+?)ft\.(.+?)\((.+?)\)\.(\w+)$|^(.+?)[ ]-[ ]?(.+?)ft\.(.+?)\((.+?)\)\.(\w+)$",
-            _file
-        ) or re.search(
-            r"\((.+?)\)[ ]?\((.+?)\)[ ]?\((.+?)\)[ ]?\((.+?)\)\.(\w+)$",
-            _file
-        )
-
-        if format_check:
-
-            return self.true_extract([
-                    _file,
-                    format_check[1],
-                    format_check[2],
-                    format_check[3],
-                    format_check[4],
-                    None,
-                    format_check[5],
-                    True
-            ])
-
-        format_check = re.search(
-            r"\[(.+?)\][ ]?\[(.+?)\][ ]?\[(.+?)\]\.(\w+)$", _file
-        ) or re.search(
-            r"\((.+?)\)[ ]?\((.+?)\)[ ]?\((.+?)\)\.(\w+)$", _file
-        )
+        for rule, literal, pattern, _, groups in _SIMPLE_PATTERNS:
+            format_check = literal in _file and pattern.search(_file)
+            if format_check:
+                self.rule = rule
+                return self.true_extract([_file, *_simple_values(format_check, groups), True])
 
-        if format_check:
-            return self.true_extract([
-                    _file,
-                    format_check[1],
-                    format_check[2],
-                    format_check[3],
-                    None,
-                    None,
-                    format_check[4],
-                    True
-            ])
-       
-        if not format_check:
-            return self.false_extract(_file)
+        self.rule = "unmatched"
+        return self.false_extract(_file)
 
     # 'complex' extraction for any filename
     # if filename info is extracted successfully, then use true extract method to set current
@@ -280,13 +296,24 @@ class Extractor:
         _file = os.path.basename(_file)
 
         if not _file.endswith(self.exts):
+            self.rule = "unsupported_ext"
+            self.rules["unsupported_ext"] += 1
             return self.false_extract(_file)
 
         self.simple_extract(_file)
         check = self.get_extraction("dict")
         if check["status"]:
+            self.rules[self.rule] += 1
             return
 
+        return self._heuristic_extract(_file)
+
+    # the part of `complex_extract` for names no simple format matches
+    def _heuristic_extract(self, _file: str) -> List[Any]:
+        """
+        Extracts a basename no simple format matched by looking for features, a youtube id
+        and misc info first and splitting what is left into artist and title.
+        """
         # create a copy of the filename, one for editing, one for backup
         __file = _file
 
@@ -337,6 +364,8 @@ class Extractor:
 
         # at this point if file cant be formatted, return with a false extract
         if not common_regex:
+            self.rule = "unmatched"
+            self.rules["unmatched"] += 1
             return self.false_extract(__file)
 
         # if file is formattable, check for existing data and fill it in. Use defaults set in config
@@ -401,6 +430,8 @@ class Extractor:
         artist = artist.strip("-：:•\uFF02\"'“() ")
 
         # create formatted file name
+        self.rule = "complex"
+        self.rules["complex"] += 1
         return self.true_extract([
                 __file,
                 artist,
@@ -419,7 +450,8 @@ class Extractor:
         """
         Extracts data from a list of files using the `complex_extract` method from the `extract` module. 
         Allows selection of an output option, which is set to "dict" by default. Returns a list of 
-        extractions, where each extraction is a tuple containing 8 values.
+        extractions, where each extraction is a tuple containing 8 values. The list is extracted
+        BULK_SIZE files at a time with `extract_bulk`.
 
         get_extraction method not necessary to call after use of this method, a list of extractions is
         returned. get_extraction in this case would return the last extraction preformed.
@@ -438,13 +470,111 @@ class Extractor:
                 If the `file_list` parameter is not a list of strings or if the `opt` parameter
                 is not a string corresponding to the supported options.
         """
-        _extractions = []
         if isinstance(file_list, list) and isinstance(opt, str):
-            for _file in file_list:
-                self.complex_extract(_file)
-                _extractions.append(self.get_extraction(opt.strip().lower()))
-            return _extractions
+            extractions = []
+            for start in range(0, len(file_list), BULK_SIZE):
+                extractions.extend(self.extract_bulk(file_list[start:start + BULK_SIZE], opt))
+            return extractions
 
         raise TypeError(
             "File_list must be a list of strings. Opt should be a string corresponding to output options"
         )
+
+    # extracts a chunk of files at once, the simple formats are matched by running each
+    # pattern once over all names joined by newlines instead of once per file
+    def extract_bulk(self, files: List[str], opt: str = "dict") -> List[Any]:
+        """
+        Extracts data from a chunk of files with the same results, in the same order, as calling
+        `complex_extract` on each of them. The names are joined by newlines and each pattern of
+        SIMPLE_FORMATS scans the joined names once with `finditer`, so the well formed majority
+        of a chunk is matched inside the regex engine. Names no simple format matches, and names
+        with an unsupported extension, go through `complex_extract` one at a time.
+
+        The rule counts and the last extraction are left as `complex_extract` would leave them.
+
+        Parameters:
+            files (List[str]): File paths from which data is to be extracted.
+            opt (str, optional): An output option, see `get_extraction`. Defaults to "dict".
+
+        Returns:
+            List: One extraction per file.
+
+        Raises:
+            TypeError: If a file or `opt` is not a string.
+        """
+        if not isinstance(opt, str):
+            raise TypeError("Opt should be a string corresponding to output options")
+
+        opt = opt.strip().lower()
+        names = []
+        for _file in files:
+            if not isinstance(_file, str):
+                raise TypeError("file must be a str literal")
+            names.append(os.path.basename(_file))
+
+        # (rule, values) of each name a simple format matched, "unmatched" once none can
+        matched: List[Optional[tuple]] = [None] * len(names)
+        # a name containing a newline would be split in two, leave it to complex_extract
+        pending = [index for index, name in enumerate(names) if name.endswith(self.exts) and "\n" not in name]
+        for index in pending:
+            matched[index] = "unmatched"
+
+        for rule, literal, _, pattern, groups in _SIMPLE_PATTERNS:
+            rows = [index for index in pending if literal in names[index]]
+            if not rows:
+                continue
+            text = "\n".join([names[index] for index in rows])
+            found = set()
+            line = position = 0
+            # at most one match per line as every pattern ends at $, and matches come in order
+            for match in pattern.finditer(text):
+                line += text.count("\n", position, match.start())
+                position = match.start()
+                index = rows[line]
+                matched[index] = (rule, [names[index], *_simple_values(match, groups), True])
+                found.add(index)
+            if found:
+                self.rules[rule] += len(found)
+                pending = [index for index in pending if index not in found]
+
+        extractions = []
+        for _file, match in zip(files, matched):
+            if match is None:
+                self.complex_extract(_file)
+            elif match == "unmatched":
+                # what `complex_extract` does once `simple_extract` found nothing
+                name = os.path.basename(_file)
+                self.rule = "unmatched"
+                self.false_extract(name)
+                self._heuristic_extract(name)
+            else:
+                self.rule = match[0]
+                self.true_extract(match[1])
+            extractions.append(self.get_extraction(opt))
+        return extractions
+
+    # lazily extracts data from any iterable of files, one extraction is produced
+    # per file as it is consumed, so nothing is accumulated
+    def iter_extract(self, files: Iterable[str], opt: str = "dict") -> Iterator[Any]:
+        """
+        Extracts data from any iterable of files using the `complex_extract` method, yielding each
+        extraction in the chosen output option as soon as it is made. Files are only read from
+        `files` as extractions are consumed, so generators of any size can be passed.
+
+        Parameters:
+            files (Iterable[str]): File paths from which data is to be extracted.
+            opt (str, optional): An output option, see `get_extraction`. Defaults to "dict".
+
+        Returns:
+            Iterator: One extraction per file.
+
+        Raises:
+            TypeError: If `opt` is not a string.
+        """
+        if not isinstance(opt, str):
+            raise TypeError("Opt should be a string corresponding to output options")
+
+        opt = opt.strip().lower()
+        for _file in files:
+            self.complex_extract(_file)
+            yield self.get_extraction(opt)
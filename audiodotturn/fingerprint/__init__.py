@@ -0,0 +1 @@
+from audiodotturn.fingerprint.fingerprint import fingerprint, fingerprint_files, FINGERPRINT_KIB
\ No newline at end of file
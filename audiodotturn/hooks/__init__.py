@@ -0,0 +1 @@
+from audiodotturn.hooks.hooks import Hooks, Tracer, EVENTS
\ No newline at end of file
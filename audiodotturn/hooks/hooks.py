@@ -0,0 +1,236 @@
+import os
+import json
+import time
+import threading
+import contextlib
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# events of the AudioDotTurn pipeline, every event has a start and an end phase
+EVENTS = ("on_extract", "on_construct", "on_db_batch")
+
+# callback(phase, attributes), phase is "start" or "end"
+Hook = Callable[[str, Dict[str, Any]], None]
+
+
+class Hooks:
+    """
+    Registry of pipeline hooks, one per AudioDotTurn instance.
+
+    on_extract
+        Per file. start has 'file', end adds 'status' and 'rule'.
+    on_construct
+        Per record. start has 'file' and 'constructor', end adds 'status'.
+    on_db_batch
+        Per database transaction. start has 'rows', end adds 'new_artists', 'new_songs',
+        'updated' and 'failure'. Ingest transactions are written by the writer thread and
+        their hooks are called from it.
+
+    An empty registry is false. The pipeline checks that once per call and only takes
+    the instrumented path when a hook is registered, so unused hooks cost nothing per file.
+
+        @adt.hooks.register("on_db_batch")
+        def slow_batches(phase, attributes):
+            ...
+    """
+    def __init__(self) -> None:
+        self._hooks: Dict[str, List[Hook]] = {event: [] for event in EVENTS}
+
+    def __bool__(self) -> bool:
+        return any(self._hooks.values())
+
+    def register(self, event: str, hook: Optional[Hook] = None) -> Hook:
+        """
+        Adds `hook` to `event` and returns it. Without `hook` a decorator is returned.
+
+        Raises:
+            KeyError: If `event` is not one of EVENTS.
+        """
+        if event not in self._hooks:
+            raise KeyError(f"unknown event {event}, expected one of {', '.join(EVENTS)}")
+        if hook is None:
+            return lambda hook: self.register(event, hook)
+        self._hooks[event].append(hook)
+        return hook
+
+    def unregister(self, event: str, hook: Hook) -> None:
+        """
+        Removes `hook` from `event`.
+        """
+        self._hooks[event].remove(hook)
+
+    def emit(self, event: str, phase: str, attributes: Dict[str, Any]) -> None:
+        """
+        Calls the hooks of `event` in registration order.
+        """
+        for hook in self._hooks[event]:
+            hook(phase, attributes)
+
+    @contextlib.contextmanager
+    def span(self, event: str, **attributes) -> Iterator[Dict[str, Any]]:
+        """
+        Emits start on entry and end on exit. The yielded dict is sent with the end
+        phase, so results can be added to it inside the block.
+        """
+        self.emit(event, "start", attributes)
+        end = dict(attributes)
+        try:
+            yield end
+        finally:
+            self.emit(event, "end", end)
+
+
+class Tracer:
+    """
+    Writes the pipeline events as nested spans with timestamps and attributes.
+
+    A file ending in .json is written in the Chrome trace event format, open it in
+    chrome://tracing or ui.perfetto.dev. Any other file gets one JSON object per span and
+    line. Spans are written as they end and nest per thread, so hook spans inside a
+    `span` of the embedding service show up under it.
+
+        tracer = Tracer("adt.trace.json")
+        tracer.attach(adt.hooks)
+        with tracer.span("request", id=request_id):
+            adt.ingest(paths)
+        tracer.close()
+
+    Attributes:
+        path : str
+            The trace file.
+        chrome : bool
+            Whether the Chrome trace event format is written.
+    """
+    def __init__(self, path: str, chrome: Optional[bool] = None) -> None:
+        self.path = path
+        self.chrome = path.endswith(".json") if chrome is None else chrome
+        self._file = open(path, "wt", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._ids = iter(range(1, 1 << 62))
+        self._first = True
+        self._attached = []
+        if self.chrome:
+            self._file.write("[\n")
+
+    def __enter__(self) -> "Tracer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def attach(self, hooks: Hooks) -> None:
+        """
+        Traces every event of `hooks`.
+        """
+        for event in EVENTS:
+            hook = self._hook(event)
+            hooks.register(event, hook)
+            self._attached.append((hooks, event, hook))
+
+    def detach(self) -> None:
+        """
+        Stops tracing the registries passed to `attach`.
+        """
+        for hooks, event, hook in self._attached:
+            hooks.unregister(event, hook)
+        self._attached = []
+
+    def _hook(self, event: str) -> Hook:
+        def hook(phase: str, attributes: Dict[str, Any]) -> None:
+            if phase == "start":
+                self.start(event, attributes)
+            else:
+                self.end(attributes)
+        return hook
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Dict[str, Any]]:
+        """
+        Traces the block as a span, the yielded attributes can still be added to.
+        """
+        self.start(name, attributes)
+        end = {}
+        try:
+            yield end
+        finally:
+            self.end(end)
+
+    def start(self, name: str, attributes: Dict[str, Any]) -> None:
+        """
+        Opens a span on the current thread.
+        """
+        stack = self._stack()
+        parent = stack[-1]["id"] if stack else None
+        with self._lock:
+            span_id = next(self._ids)
+        stack.append({
+            "id": span_id,
+            "parent": parent,
+            "name": name,
+            "start": time.time_ns(),
+            "attributes": dict(attributes)
+        })
+
+    def end(self, attributes: Dict[str, Any]) -> None:
+        """
+        Closes the innermost span of the current thread and writes it.
+        """
+        stack = self._stack()
+        if not stack:
+            return
+        span = stack.pop()
+        span["attributes"].update(attributes)
+        self._write(span, time.time_ns() - span["start"])
+
+    def _stack(self) -> List[Dict[str, Any]]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _write(self, span: Dict[str, Any], duration_ns: int) -> None:
+        if self.chrome:
+            record = {
+                "name": span["name"],
+                "cat": "audiodotturn",
+                "ph": "X",
+                "ts": span["start"] / 1000,
+                "dur": duration_ns / 1000,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": span["attributes"]
+            }
+        else:
+            record = {
+                "name": span["name"],
+                "span_id": span["id"],
+                "parent_id": span["parent"],
+                "thread": threading.get_ident(),
+                "start_ns": span["start"],
+                "duration_ns": duration_ns,
+                "attributes": span["attributes"]
+            }
+        line = json.dumps(record, default=str)
+
+        with self._lock:
+            if self._file is None:
+                return
+            if self.chrome:
+                line = ("" if self._first else ",\n") + line
+                self._first = False
+            else:
+                line += "\n"
+            self._file.write(line)
+
+    def close(self) -> None:
+        """
+        Detaches and finishes the trace file.
+        """
+        self.detach()
+        with self._lock:
+            if self._file is None:
+                return
+            if self.chrome:
+                self._file.write("\n]\n")
+            self._file.close()
+            self._file = None
@@ -0,0 +1 @@
+from audiodotturn.ingest.ingestion import Ingestor, IngestStats, walk, read_paths, stat_paths
\ No newline at end of file
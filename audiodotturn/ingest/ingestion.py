@@ -0,0 +1,682 @@
+import os
+import glob
+import mmap
+import queue
+import tempfile
+import threading
+import time
+from collections import deque, Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Dict, Callable, Optional, Union, BinaryIO
+from audiodotturn.extract import Extractor
+from audiodotturn.database import Database, FileEntry
+from audiodotturn.hooks import Hooks
+
+# bytes read from a stream of paths at a time
+READ_SIZE = 1 << 20
+
+# marks the end of the extraction stream for the writer thread
+_DONE = object()
+
+# extractor owned by each extraction worker process, set by `_init_worker`
+_worker_extractor = None
+
+# shard database and connection owned by each sharded ingest worker, set by `_init_shard_worker`
+_worker_shard = None
+
+# whether the worker fills extractions from embedded tags, see `_timed_extract`
+_worker_probe = False
+
+
+def _init_worker(exts: List[str], output_opts: List[str], probe_tags: bool = False) -> None:
+    """
+    Process pool initializer, builds one Extractor per worker process.
+    """
+    global _worker_extractor, _worker_probe
+    _worker_extractor = Extractor(exts, output_opts)
+    _worker_probe = probe_tags
+
+
+def _extract_chunk(paths: List[str]) -> tuple:
+    """
+    Extracts a chunk of paths inside a worker process.
+
+    Returns:
+        tuple : (extractions, rules, seconds)
+            The extractions, the count of each extraction rule and the time they took.
+    """
+    return _timed_extract(_worker_extractor, paths, _worker_probe)
+
+
+def _timed_extract(extractor: Extractor, paths: List[str], probe_tags: bool = False) -> tuple:
+    """
+    Extracts `paths` and hands over the extractor's rule counts, see `_extract_chunk`.
+    With `probe_tags` the fields the names lack are filled from embedded tags, extractions
+    that only succeed thanks to the tags are counted under the "tags" rule.
+    """
+    start = time.perf_counter()
+    data = extractor.extract_complex_list(paths, "dict")
+    rules = extractor.rules
+    extractor.rules = Counter()
+    if probe_tags:
+        from audiodotturn.probe import fill_extractions
+        rescued = fill_extractions(paths, data, extractor.exts)
+        if rescued:
+            rules -= Counter(unmatched=rescued)
+            rules["tags"] += rescued
+    return data, rules, time.perf_counter() - start
+
+
+def _init_shard_worker(exts: List[str], output_opts: List[str], shard_dir: str, probe_tags: bool = False) -> None:
+    """
+    Process pool initializer for sharded ingests, builds the worker's Extractor and
+    its own shard database inside `shard_dir`.
+    """
+    global _worker_extractor, _worker_shard, _worker_probe
+    _worker_extractor = Extractor(exts, output_opts)
+    _worker_probe = probe_tags
+    shard = Database(os.path.join(shard_dir, f"shard-{os.getpid()}.db"))
+    shard.create_tables()
+    conn = shard.connect()
+    # shards are thrown away after the merge, durability is not needed
+    conn.execute('PRAGMA synchronous = OFF')
+    _worker_shard = (shard, conn)
+
+
+def _ingest_shard_chunk(chunk: List[Union[str, FileEntry]]) -> tuple:
+    """
+    Extracts a chunk inside a worker process and commits it to the worker's shard.
+
+    Returns:
+        tuple : (extracted, failure, rules, extract_seconds, write_seconds)
+    """
+    shard, conn = _worker_shard
+    data, rules, extract_seconds = _timed_extract(_worker_extractor, _paths(chunk), _worker_probe)
+    start = time.perf_counter()
+    files = [entry if isinstance(entry, FileEntry) else None for entry in chunk]
+    failure = shard.update_rows(conn.cursor(), data, files)[3]
+    conn.commit()
+    return len(data), failure, rules, extract_seconds, time.perf_counter() - start
+
+
+def walk(directory: str, exts: Iterable[str], onerror: Optional[Callable[[OSError], None]] = None) -> Iterator[FileEntry]:
+    """
+    Recursively yields the files under `directory` ending with one of `exts`. Directories
+    and files that cannot be read, or vanish during the walk, are skipped.
+
+    Parameters:
+        directory (str): The directory to walk.
+        exts (Iterable[str]): The extensions to match.
+        onerror (Callable[[OSError], None], optional): Called with the error of every skipped
+            directory or file, its `filename` is the path, like the onerror of os.walk.
+
+    Returns:
+        Iterator[FileEntry]: Absolute path and stat values of each matching file, in directory order.
+    """
+    exts = tuple(exts)
+    stack = [os.path.abspath(directory)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError as error:
+            if onerror is not None:
+                onerror(error)
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        continue
+                    if not (entry.name.endswith(exts) and entry.is_file()):
+                        continue
+                    stat = entry.stat()
+                except OSError as error:
+                    if onerror is not None:
+                        onerror(error)
+                    continue
+                yield FileEntry(entry.path, stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+def read_paths(source: Union[str, BinaryIO], delimiter: bytes = None) -> Iterator[str]:
+    """
+    Lazily yields the paths listed in a manifest file or a binary stream such as stdin,
+    so lists of any length are read in constant memory. Manifest files are memory-mapped,
+    streams are read in blocks of READ_SIZE. Empty entries are skipped, paths are decoded
+    with the filesystem encoding so undecodable names survive the round trip.
+
+    Parameters:
+        source (Union[str, BinaryIO]): A manifest path or a binary stream.
+        delimiter (bytes, optional): b"\\n" for one path per line or b"\\0" for NUL-separated
+            paths as written by `find -print0`. Manifests are NUL-separated if their first
+            block contains a NUL, streams default to lines.
+
+    Returns:
+        Iterator[str]: The paths, in order.
+    """
+    if not isinstance(source, str):
+        yield from _read_stream_paths(source, delimiter or b"\n")
+        return
+
+    with open(source, "rb") as manifest:
+        size = os.fstat(manifest.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(manifest.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if delimiter is None:
+                delimiter = b"\0" if data.find(b"\0", 0, READ_SIZE) != -1 else b"\n"
+            start = 0
+            while start < size:
+                end = data.find(delimiter, start)
+                if end == -1:
+                    end = size
+                entry = data[start:end]
+                start = end + 1
+                if delimiter == b"\n":
+                    entry = entry.rstrip(b"\r")
+                if entry:
+                    yield os.fsdecode(entry)
+
+
+def _read_stream_paths(stream: BinaryIO, delimiter: bytes) -> Iterator[str]:
+    """
+    Splits a binary stream into paths block by block, see `read_paths`.
+    """
+    rest = b""
+    while True:
+        block = stream.read(READ_SIZE)
+        if not block:
+            break
+        entries = (rest + block).split(delimiter)
+        rest = entries.pop()
+        for entry in entries:
+            if delimiter == b"\n":
+                entry = entry.rstrip(b"\r")
+            if entry:
+                yield os.fsdecode(entry)
+
+    if delimiter == b"\n":
+        rest = rest.rstrip(b"\r")
+    if rest:
+        yield os.fsdecode(rest)
+
+
+def stat_paths(paths: Iterable[str], onerror: Optional[Callable[[OSError], None]] = None) -> Iterator[FileEntry]:
+    """
+    Lazily stats paths into FileEntry records, so files listed on stdin or in a manifest are
+    recorded in the file index like walked ones. Paths that cannot be stat'ed are skipped,
+    `onerror` is called with their errors, see `walk`.
+    """
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError as error:
+            if onerror is not None:
+                onerror(error)
+            continue
+        yield FileEntry(os.path.abspath(path), stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+def _paths(chunk: List[Union[str, FileEntry]]) -> List[str]:
+    """
+    The plain paths of a chunk, only these are sent to the extraction workers.
+    """
+    return [entry.path if isinstance(entry, FileEntry) else entry for entry in chunk]
+
+
+class IngestStats:
+    """
+    Progress counters of an ingest run. Each counter is only ever written by one
+    stage, so they can be read from any thread without locking.
+
+    Attributes:
+        walked : int
+            Paths handed to the extraction stage.
+        extracted : int
+            Paths extracted by the workers.
+        written : int
+            Extractions committed to the database.
+        batches : int
+            Transactions committed by the writer.
+        skipped : int
+            Files a sync found unchanged since they were last indexed.
+        removed : int
+            Files a sync removed from the index because they no longer exist.
+        unreadable : int
+            Directories and files that could not be read while walking or statting the
+            inputs, skipped and counted in `failure` as well once the run is done.
+        new_artists, new_songs, updated, failure : int
+            The same stats returned by `Database.update_database`.
+        rules : Counter
+            Extractions per extraction rule, see `Extractor.rules`.
+        extract_seconds : List[float]
+            Time each chunk took to extract, one entry per chunk.
+        write_seconds : List[float]
+            Time each transaction took to write and commit, one entry per transaction.
+    """
+    def __init__(self) -> None:
+        self.walked = 0
+        self.extracted = 0
+        self.written = 0
+        self.batches = 0
+        self.skipped = 0
+        self.removed = 0
+        self.unreadable = 0
+        self.new_artists = 0
+        self.new_songs = 0
+        self.updated = 0
+        self.failure = 0
+        self.rules = Counter()
+        self.extract_seconds = []
+        self.write_seconds = []
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        """
+        Seconds since the run started.
+        """
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self) -> float:
+        """
+        Extractions written per second.
+        """
+        elapsed = self.elapsed
+        return self.written / elapsed if elapsed else 0.0
+
+    def totals(self) -> tuple:
+        """
+        Returns:
+            tuple : (new_artists, new_songs, updated, failure)
+                Same shape as the return value of `Database.update_database`.
+        """
+        return self.new_artists, self.new_songs, self.updated, self.failure
+
+
+class Ingestor:
+    """
+    Pipelined ingestion of audio files into the database.
+
+    Paths are extracted in chunks by a pool of worker processes while a single writer
+    thread commits the results in batches, so extraction and database I/O overlap.
+    The queue between the two stages is bounded, when the writer falls behind the
+    extraction stage blocks instead of piling results up in memory.
+
+    Inputs are plain paths or FileEntry tuples, files given as a FileEntry are recorded
+    in the `files` table so a later `sync` can skip them while they are unchanged.
+
+    Attributes:
+        database : Database
+            The database to write to.
+        exts : List[str]
+            Extensions passed on to each worker's Extractor, also used when walking directories.
+        output_opts : List[str]
+            Output options passed on to each worker's Extractor.
+        workers : int
+            Number of extraction processes, 0 extracts in the calling thread.
+        chunk_size : int
+            Paths per extraction task.
+        queue_size : int
+            Maximum number of extracted chunks waiting for the writer.
+        batch_size : int
+            Extractions per transaction.
+        flush_interval : float
+            Maximum seconds between commits while rows are pending.
+        progress : Callable[[IngestStats], None]
+            Optional callback, called by the writer thread after every commit.
+        hooks : Hooks
+            Optional registry, on_db_batch is emitted around every transaction.
+        probe_tags : bool
+            Whether artists and titles the file names lack are read from embedded tags,
+            see `audiodotturn.probe`.
+        stats : IngestStats
+            Counters of the current or last run.
+    """
+    def __init__(
+        self,
+        database: Database,
+        exts: List[str],
+        output_opts: List[str],
+        workers: Optional[int] = None,
+        chunk_size: int = 256,
+        queue_size: int = 16,
+        batch_size: int = 1000,
+        flush_interval: float = 2.0,
+        progress: Optional[Callable[[IngestStats], None]] = None,
+        hooks: Optional[Hooks] = None,
+        probe_tags: bool = False
+    ) -> None:
+        self.database = database
+        self.exts = tuple(exts)
+        self.output_opts = output_opts
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.chunk_size = max(1, chunk_size)
+        self.queue_size = max(1, queue_size)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.progress = progress
+        self.hooks = hooks
+        self.probe_tags = probe_tags
+        self.stats = IngestStats()
+        self._queue = None
+        self._writer_error = None
+
+    def walk(self, directory: str) -> Iterator[FileEntry]:
+        """
+        Recursively yields the files under `directory` with one of the configured extensions.
+
+        Parameters:
+            directory (str): The directory to walk.
+
+        Returns:
+            Iterator[FileEntry]: Absolute path and stat values of each matching file, in directory order.
+        """
+        return walk(directory, self.exts, self.skip_unreadable)
+
+    def stat_paths(self, paths: Iterable[str]) -> Iterator[FileEntry]:
+        """
+        Lazily stats paths into FileEntry records, see `stat_paths`. Paths that cannot be
+        stat'ed are counted as unreadable.
+        """
+        return stat_paths(paths, self.skip_unreadable)
+
+    def skip_unreadable(self, error: OSError) -> None:
+        """
+        Counts a directory or file the inputs of the current run could not read, pass it
+        as the onerror of `walk` or `stat_paths` when the run consumes their entries.
+        """
+        self.stats.unreadable += 1
+
+    def sync(self, directory: str) -> IngestStats:
+        """
+        Incrementally rescans a directory against the `files` table. Only files that are
+        new, or whose size, mtime or inode changed, are extracted and written. Files that
+        are indexed but no longer exist are removed along with songs no other file points to.
+
+        Parameters:
+            directory (str): The directory to sync.
+
+        Returns:
+            IngestStats: The counters of the run, `skipped` and `removed` included.
+        """
+        directory = os.path.abspath(directory)
+        self.database.create_database()
+        self.database.create_tables()
+        index = self.database.get_file_index(directory)
+
+        def unreadable(error: OSError) -> None:
+            self.skip_unreadable(error)
+            if isinstance(error, FileNotFoundError) or error.filename is None:
+                return
+            # files below a directory that could not be read are kept, not removed
+            path = os.fsdecode(error.filename)
+            index.pop(path, None)
+            for known in [known for known in index if known.startswith(path + os.sep)]:
+                del index[known]
+
+        def changed() -> Iterator[FileEntry]:
+            # consumed by `run`, so the counters are the ones of this run
+            for entry in walk(directory, self.exts, unreadable):
+                # whatever is left in the index after the walk is gone from disk
+                known = index.pop(entry.path, None)
+                if known == (entry.size, entry.mtime_ns, entry.inode):
+                    self.stats.skipped += 1
+                    continue
+                yield entry
+
+        stats = self.run(changed())
+        stats.removed = self.database.remove_files(index)
+        return stats
+
+    def run(self, paths: Iterable[Union[str, FileEntry]]) -> IngestStats:
+        """
+        Extracts and writes all paths, returns once every extraction has been committed.
+
+        If the run is interrupted (KeyboardInterrupt or an error in either stage), pending
+        extraction tasks are cancelled and the rows that already reached the writer are
+        committed before the error is raised again.
+
+        Parameters:
+            paths (Iterable[Union[str, FileEntry]]): Any iterable of file paths or FileEntry
+                tuples, it is consumed lazily.
+
+        Returns:
+            IngestStats: The counters of the run.
+        """
+        self.stats = IngestStats()
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._writer_error = None
+
+        self.database.create_database()
+        self.database.create_tables()
+
+        writer = threading.Thread(target=self._write, name="adt-ingest-writer", daemon=True)
+        writer.start()
+
+        try:
+            if self.workers > 0:
+                self._extract_parallel(paths)
+            else:
+                self._extract_inline(paths)
+        finally:
+            # the writer always gets the end marker so pending rows are flushed
+            self._queue.put(_DONE)
+            writer.join()
+
+        if self._writer_error is not None:
+            raise self._writer_error
+
+        self.stats.failure += self.stats.unreadable
+        return self.stats
+
+    def run_sharded(self, paths: Iterable[Union[str, FileEntry]]) -> IngestStats:
+        """
+        Extracts and writes all paths with every worker process writing into its own
+        temporary shard database, the shards are then merged into the database with
+        `Database.merge_database`. There is no single writer to wait on, so this scales
+        with the number of workers and suits first-time imports of large libraries.
+
+        Shards are created next to the database and removed afterwards. If the run is
+        interrupted nothing is merged and the database is left untouched. Shards are merged
+        by exact artist name, the fuzzy threshold of the database does not apply.
+
+        Parameters:
+            paths (Iterable[Union[str, FileEntry]]): Any iterable of file paths or FileEntry
+                tuples, it is consumed lazily.
+
+        Returns:
+            IngestStats: The counters of the run, `batches` counts merged shards.
+        """
+        self.stats = IngestStats()
+
+        self.database.create_database()
+        self.database.create_tables()
+
+        workers = max(1, self.workers)
+        in_flight = deque()
+        database_dir = os.path.dirname(os.path.abspath(self.database.path))
+
+        with tempfile.TemporaryDirectory(prefix="adt-shards-", dir=database_dir) as shard_dir:
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_shard_worker,
+                initargs=(list(self.exts), self.output_opts, shard_dir, self.probe_tags)
+            )
+            try:
+                for chunk in self._chunks(paths):
+                    in_flight.append(executor.submit(_ingest_shard_chunk, chunk))
+                    if len(in_flight) >= workers * 2:
+                        self._count_shard_chunk(in_flight.popleft().result())
+                while in_flight:
+                    self._count_shard_chunk(in_flight.popleft().result())
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+            for shard_path in sorted(glob.glob(os.path.join(shard_dir, "shard-*.db"))):
+                if self.hooks:
+                    with self.hooks.span("on_db_batch", shard=shard_path) as end:
+                        new_artists, new_songs, updated, _ = self.database.merge_database(shard_path)
+                        end.update(new_artists=new_artists, new_songs=new_songs, updated=updated)
+                else:
+                    new_artists, new_songs, updated, _ = self.database.merge_database(shard_path)
+                self.stats.new_artists += new_artists
+                self.stats.new_songs += new_songs
+                self.stats.updated += updated
+                self.stats.batches += 1
+                if self.progress is not None:
+                    self.progress(self.stats)
+
+        self.stats.failure += self.stats.unreadable
+        return self.stats
+
+    def _count_shard_chunk(self, result: tuple) -> None:
+        """
+        Updates the counters with the result of one sharded chunk.
+        """
+        extracted, failure, rules, extract_seconds, write_seconds = result
+        self.stats.extracted += extracted
+        self.stats.written += extracted
+        self.stats.failure += failure
+        self.stats.rules.update(rules)
+        self.stats.extract_seconds.append(extract_seconds)
+        self.stats.write_seconds.append(write_seconds)
+        if self.progress is not None:
+            self.progress(self.stats)
+
+    def _chunks(self, paths: Iterable[Union[str, FileEntry]]) -> Iterator[List[Union[str, FileEntry]]]:
+        """
+        Groups the incoming paths into lists of `chunk_size`.
+        """
+        chunk = []
+        for path in paths:
+            chunk.append(path)
+            if len(chunk) >= self.chunk_size:
+                self.stats.walked += len(chunk)
+                yield chunk
+                chunk = []
+        if chunk:
+            self.stats.walked += len(chunk)
+            yield chunk
+
+    def _put(self, chunk: List[Union[str, FileEntry]], extractions: List[Dict], rules: Counter, seconds: float) -> None:
+        """
+        Hands a chunk and its extractions to the writer, blocking while the queue is full.
+        """
+        self.stats.extracted += len(extractions)
+        self.stats.rules.update(rules)
+        self.stats.extract_seconds.append(seconds)
+        while True:
+            if self._writer_error is not None:
+                raise self._writer_error
+            try:
+                self._queue.put((chunk, extractions), timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _extract_inline(self, paths: Iterable[str]) -> None:
+        """
+        Extraction stage without worker processes.
+        """
+        extractor = Extractor(self.exts, self.output_opts)
+        for chunk in self._chunks(paths):
+            self._put(chunk, *_timed_extract(extractor, _paths(chunk), self.probe_tags))
+
+    def _extract_parallel(self, paths: Iterable[str]) -> None:
+        """
+        Extraction stage using a process pool. At most two tasks per worker are in flight,
+        results are handed to the writer in submission order.
+        """
+        in_flight = deque()
+        max_in_flight = self.workers * 2
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(list(self.exts), self.output_opts, self.probe_tags)
+        )
+        try:
+            for chunk in self._chunks(paths):
+                in_flight.append((chunk, executor.submit(_extract_chunk, _paths(chunk))))
+                if len(in_flight) >= max_in_flight:
+                    chunk, future = in_flight.popleft()
+                    self._put(chunk, *future.result())
+            while in_flight:
+                chunk, future = in_flight.popleft()
+                self._put(chunk, *future.result())
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _write(self) -> None:
+        """
+        Writer stage, owns the only connection of the run. Commits once `batch_size`
+        rows are pending or `flush_interval` seconds have passed since the last commit.
+        """
+        conn = None
+        pending = []
+        done = False
+        try:
+            conn = self.database.connect()
+            cursor = conn.cursor()
+            deadline = time.monotonic() + self.flush_interval
+
+            while not done:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    item = None
+
+                if item is _DONE:
+                    done = True
+                elif item:
+                    pending.extend(zip(*item))
+
+                if pending and (done or len(pending) >= self.batch_size or time.monotonic() >= deadline):
+                    self._flush(conn, cursor, pending)
+                    pending = []
+
+                if time.monotonic() >= deadline:
+                    deadline = time.monotonic() + self.flush_interval
+
+        except BaseException as error:
+            self._writer_error = error
+            # keep draining so the extraction stage never blocks on a dead writer
+            while not done:
+                done = self._queue.get() is _DONE
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _flush(self, conn, cursor, pending: List[tuple]) -> None:
+        """
+        Commits one batch of (input, extraction) pairs and updates the counters.
+        """
+        if self.hooks:
+            with self.hooks.span("on_db_batch", rows=len(pending)) as end:
+                new_artists, new_songs, updated, failure = self._commit(conn, cursor, pending)
+                end.update(new_artists=new_artists, new_songs=new_songs, updated=updated, failure=failure)
+        else:
+            new_artists, new_songs, updated, failure = self._commit(conn, cursor, pending)
+
+        self.stats.new_artists += new_artists
+        self.stats.new_songs += new_songs
+        self.stats.updated += updated
+        self.stats.failure += failure
+        self.stats.written += len(pending)
+        self.stats.batches += 1
+
+        if self.progress is not None:
+            self.progress(self.stats)
+
+    def _commit(self, conn, cursor, pending: List[tuple]) -> tuple:
+        """
+        Writes and commits one batch, see `_flush`.
+        """
+        start = time.perf_counter()
+        files = [entry if isinstance(entry, FileEntry) else None for entry, _ in pending]
+        data = [extraction for _, extraction in pending]
+        result = self.database.update_rows(cursor, data, files)
+        conn.commit()
+        self.stats.write_seconds.append(time.perf_counter() - start)
+        return result
@@ -0,0 +1 @@
+from audiodotturn.metrics.metrics import RunMetrics, Histogram, BUCKETS, CACHES
\ No newline at end of file
@@ -0,0 +1,320 @@
+import os
+import sys
+import json
+import time
+import bisect
+import importlib
+from collections import Counter
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+from audiodotturn import VERSION
+from audiodotturn.extract import FAILURE_RULES
+
+# upper bounds in seconds of the latency histogram buckets, +Inf is implied
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+# functools caches whose hit rates are reported, by module and function name. A cache is only
+# read if its module was imported by the run, metrics never import anything themselves.
+CACHES = {
+    "constructor_templates": ("audiodotturn.construct.templates", "compile_option"),
+}
+
+
+class Histogram:
+    """
+    Latency histogram with fixed buckets, cumulative like a Prometheus histogram.
+
+    Attributes:
+        buckets : tuple
+            Upper bounds in seconds.
+        count : int
+            Observations.
+        sum : float
+            Total of the observations in seconds.
+    """
+    def __init__(self, buckets: tuple = BUCKETS) -> None:
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self._counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def cumulative(self) -> List[tuple]:
+        """
+        Returns:
+            List[tuple]: (upper bound, observations up to it) per bucket, ending with ('+Inf', count).
+        """
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets, self._counts):
+            total += count
+            result.append((format(bound, "g"), total))
+        result.append(("+Inf", self.count))
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"count": self.count, "sum": round(self.sum, 6), "buckets": dict(self.cumulative())}
+
+
+class RunMetrics:
+    """
+    Metrics of one adt run, written as a JSON summary and as a Prometheus textfile for the
+    node_exporter textfile collector.
+
+        metrics = RunMetrics("extract")
+        for extraction in metrics.timed(adt.iter_extract(paths), "extract"):
+            ...
+        metrics.add_rules(adt.extractor.rules)
+        metrics.finish()
+        metrics.write_prometheus("/var/lib/node_exporter/textfile/adt_extract.prom")
+
+    Attributes:
+        command : str
+            The command that was run, the 'command' label of every series.
+        status : str
+            success, or failure if the command raised.
+        files : int
+            Files processed.
+        rules : Counter
+            Extractions per extraction rule, see `Extractor.rules`.
+        stages : Dict[str, Histogram]
+            Latency per stage. Streamed stages are timed per file, an ingest is timed per
+            extraction chunk and per transaction.
+        rows_written : int
+            Artist and song rows inserted or updated.
+        transactions : int
+            Transactions committed.
+    """
+    def __init__(self, command: str) -> None:
+        self.command = command
+        self.status = "success"
+        self.files = 0
+        self.rules = Counter()
+        self.stages: Dict[str, Histogram] = {}
+        self.rows_written = 0
+        self.transactions = 0
+        self.started_at = time.time()
+        self.finished_at = None
+        self._started = time.perf_counter()
+        self.duration = None
+        # time spent in nested timed iterables, subtracted from the stage that pulls them
+        self._nested: List[float] = []
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """
+        Records one latency of `stage`.
+        """
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram()
+        histogram.observe(seconds)
+
+    def timed(self, iterable: Iterable[Any], stage: str) -> Iterator[Any]:
+        """
+        Yields the items of `iterable`, recording the time each one took to produce to
+        `stage`. Timed iterables can be stacked, extract feeding construct, each stage
+        only records its own time. Every item of a stage other than walk counts as a file.
+        """
+        iterator = iter(iterable)
+        while True:
+            self._nested.append(0.0)
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self._nested.pop()
+                return
+            elapsed = time.perf_counter() - start
+            inner = self._nested.pop()
+            if self._nested:
+                self._nested[-1] += elapsed
+            self.observe(stage, elapsed - inner)
+            if stage != "walk":
+                self.files = max(self.files, self.stages[stage].count)
+            yield item
+
+    def add_rules(self, rules: Counter) -> None:
+        self.rules.update(rules)
+
+    def add_ingest(self, stats) -> None:
+        """
+        Adds the counters and timings of an ingest or sync, takes an IngestStats.
+        """
+        self.files += stats.walked + stats.skipped
+        self.rules.update(stats.rules)
+        self.rows_written += stats.new_artists + stats.new_songs + stats.updated
+        self.transactions += stats.batches
+        for seconds in stats.extract_seconds:
+            self.observe("extract_chunk", seconds)
+        for seconds in stats.write_seconds:
+            self.observe("write_transaction", seconds)
+
+    def finish(self) -> None:
+        """
+        Stops the clock of the run.
+        """
+        self.finished_at = time.time()
+        self.duration = time.perf_counter() - self._started
+
+    @property
+    def extractions(self) -> Dict[str, int]:
+        failure = sum(count for rule, count in self.rules.items() if rule in FAILURE_RULES)
+        return {"success": sum(self.rules.values()) - failure, "failure": failure}
+
+    @staticmethod
+    def cache_stats() -> Dict[str, Dict[str, Any]]:
+        """
+        Hits, misses and hit rate of every cache in CACHES that the run used.
+        """
+        stats = {}
+        for name, (module_name, function) in CACHES.items():
+            if module_name not in sys.modules:
+                continue
+            info = getattr(importlib.import_module(module_name), function).cache_info()
+            lookups = info.hits + info.misses
+            stats[name] = {
+                "hits": info.hits,
+                "misses": info.misses,
+                "hit_rate": round(info.hits / lookups, 4) if lookups else None
+            }
+        return stats
+
+    @staticmethod
+    def peak_rss() -> Dict[str, Optional[int]]:
+        """
+        Peak resident set size in bytes of this process and of its waited for children,
+        the extraction workers. None where the platform does not report it.
+        """
+        try:
+            import resource
+        except ImportError:
+            return {"self": None, "children": None}
+        # kilobytes on Linux, bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        return {
+            "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+            "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        The JSON run summary.
+        """
+        if self.duration is None:
+            self.finish()
+        return {
+            "command": self.command,
+            "version": VERSION,
+            "status": self.status,
+            "started": datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(timespec="seconds"),
+            "finished": datetime.fromtimestamp(self.finished_at, timezone.utc).isoformat(timespec="seconds"),
+            "duration_seconds": round(self.duration, 6),
+            "files": self.files,
+            "files_per_second": round(self.files / self.duration, 2) if self.duration else None,
+            "extractions": dict(self.extractions, rules=dict(self.rules)),
+            "stages": {stage: histogram.to_dict() for stage, histogram in self.stages.items()},
+            "database": {"rows_written": self.rows_written, "transactions": self.transactions},
+            "caches": self.cache_stats(),
+            "peak_rss_bytes": self.peak_rss()
+        }
+
+    def write_json(self, path: str) -> None:
+        """
+        Writes the JSON run summary to `path`.
+        """
+        _write_atomic(path, json.dumps(self.to_dict(), indent=4) + "\n")
+
+    def prometheus(self) -> str:
+        """
+        The run in the Prometheus text exposition format. Every series is a gauge of the
+        last run, labelled with the command, except the stage latency histograms.
+        """
+        summary = self.to_dict()
+        command = _label(self.command)
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples: List[tuple]) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                if value is None:
+                    continue
+                label_text = ",".join([f'command="{command}"'] + [f'{key}="{_label(val)}"' for key, val in labels])
+                lines.append(f"{name}{suffix}{{{label_text}}} {value}")
+
+        metric("adt_run_info", "gauge", "Version and status of the last run.", [
+            ("", [("version", VERSION), ("status", self.status)], 1)
+        ])
+        metric("adt_run_timestamp_seconds", "gauge", "Unix time the last run finished.", [
+            ("", [], round(self.finished_at, 3))
+        ])
+        metric("adt_run_duration_seconds", "gauge", "Wall time of the last run.", [
+            ("", [], summary["duration_seconds"])
+        ])
+        metric("adt_files_processed", "gauge", "Files processed by the last run.", [
+            ("", [], self.files)
+        ])
+        metric("adt_files_per_second", "gauge", "Throughput of the last run.", [
+            ("", [], summary["files_per_second"])
+        ])
+        metric("adt_extractions", "gauge", "Extractions of the last run by rule and outcome.", [
+            ("", [("rule", rule), ("status", "failure" if rule in FAILURE_RULES else "success")], count)
+            for rule, count in sorted(self.rules.items())
+        ])
+        metric("adt_db_rows_written", "gauge", "Artist and song rows inserted or updated by the last run.", [
+            ("", [], self.rows_written)
+        ])
+        metric("adt_db_transactions", "gauge", "Transactions committed by the last run.", [
+            ("", [], self.transactions)
+        ])
+
+        samples = []
+        for stage, histogram in sorted(self.stages.items()):
+            for bound, count in histogram.cumulative():
+                samples.append(("_bucket", [("stage", stage), ("le", bound)], count))
+            samples.append(("_sum", [("stage", stage)], round(histogram.sum, 6)))
+            samples.append(("_count", [("stage", stage)], histogram.count))
+        metric("adt_stage_duration_seconds", "histogram", "Latency of each stage of the last run.", samples)
+
+        caches = summary["caches"]
+        metric("adt_cache_hits", "gauge", "Cache hits of the last run.", [
+            ("", [("cache", name)], stats["hits"]) for name, stats in caches.items()
+        ])
+        metric("adt_cache_misses", "gauge", "Cache misses of the last run.", [
+            ("", [("cache", name)], stats["misses"]) for name, stats in caches.items()
+        ])
+        metric("adt_cache_hit_ratio", "gauge", "Cache hit rate of the last run.", [
+            ("", [("cache", name)], stats["hit_rate"]) for name, stats in caches.items()
+        ])
+        metric("adt_peak_rss_bytes", "gauge", "Peak resident memory of the last run.", [
+            ("", [("process", process)], value) for process, value in summary["peak_rss_bytes"].items()
+        ])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """
+        Writes the textfile to `path`. The file is replaced in one step so the collector
+        never reads half of it, give it a .prom extension inside the collector directory.
+        """
+        _write_atomic(path, self.prometheus())
+
+
+def _label(value: Any) -> str:
+    """
+    Escapes a Prometheus label value.
+    """
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _write_atomic(path: str, text: str) -> None:
+    """
+    Writes `text` next to `path` and renames it into place.
+    """
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wt", encoding="utf-8") as output:
+        output.write(text)
+    os.replace(temp_path, path)
@@ -15,6 +15,17 @@ class Parser:
         self.parser.add_argument('-p', '--cfgpath', help='Path to a specific configuration file to use for the session.')
         self.parser.add_argument('-d', '--dbpath', help='Path to .db file for library database')
         self.parser.add_argument('-s', '--settings', action='store_true', help='Show current settings')
+        self.parser.add_argument('--readonly', action='store_true', help='Open the database read-only, reads never wait on a running ingest.')
+        self.parser.add_argument('--immutable', action='store_true', help='Open the database read-only without any locking, only for snapshots.')
+        self.parser.add_argument('--no-daemon', dest='no_daemon', action='store_true', help='Never forward to a running adt serve daemon.')
+        self.parser.add_argument('--progress', action='store_true', help='Show files/s, ETA and per-stage counts on stderr while the command runs.')
+        self.parser.add_argument('--profile', dest='cprofile', metavar='PSTATS', help='Profile the command with cProfile, write the stats to PSTATS and print the top functions.')
+        self.parser.add_argument('--memprofile', action='store_true', help='Trace allocations with tracemalloc and print the top allocation sites and the peak.')
+        self.parser.add_argument('--profile-top', dest='profile_top', type=int, default=20, help='Entries printed by --profile and --memprofile, default is 20.')
+        self.parser.add_argument('--metrics-json', dest='metrics_json', metavar='PATH', help='Write a JSON summary of the run, default is json in the METRICS section of the config.')
+        self.parser.add_argument('--trace', metavar='PATH', help='Trace the extract, construct and database batch spans to PATH, Chrome trace events for .json, JSON lines otherwise.')
+        self.parser.add_argument('--metrics-prom', dest='metrics_prom', metavar='PATH', help='Write the run metrics as a Prometheus textfile, default is prometheus in the METRICS section of the config.')
+        self.add_batch_arguments(self.parser)
         
         # Add subparsers
         self.subparsers = self.parser.add_subparsers(dest='command')
@@ -25,29 +36,140 @@ class Parser:
         self.extract_parser.add_argument('-f', '--file', type=str, help='Extract info from single file.')
         self.extract_parser.add_argument('-m', '--multi', nargs="+", type=str, help='Extract info from multiple files.')
         self.extract_parser.add_argument('-l', '--dir', type=str, help='Extract info from files in a directory.')
+        self.add_input_arguments(self.extract_parser)
+        self.add_batch_arguments(self.extract_parser, argparse.SUPPRESS)
         
         # Create parser for the "construct" command
         self.construct_parser = self.subparsers.add_parser('construct', help='Construction commands')
         self.construct_parser.add_argument('-a', '--auto', action="store_true", help='Set auto-choice')
         self.construct_parser.add_argument('-c', '--constructor', default="simple", help='Constructor to use')
+        self.construct_parser.add_argument('-i', '--option', type=int, help='Only construct the option with this index, 0 is the least detailed')
         self.construct_parser.add_argument('-f', '--file', help='Construct from a single file')
         self.construct_parser.add_argument('-m', '--multi', nargs="+", help='Construct from multiple files')
+        self.construct_parser.add_argument('--from-db', dest='from_db', action="store_true", help='Construct from the catalogued metadata instead of extracting, -f/-m look the files up in the database.')
+        self.construct_parser.add_argument('--artist', help='With --from-db, only songs by this artist.')
+        self.construct_parser.add_argument('-Ai', '--artistid', type=int, help='With --from-db, only songs by this artist id.')
+        self.construct_parser.add_argument('-Si', '--songid', type=int, help='With --from-db, only this song.')
+        self.construct_parser.add_argument('-l', '--dir', help='With --from-db, only files recorded below this directory.')
+        self.construct_parser.add_argument('--apply', action="store_true", help='Rename the files to their constructed names, needs --auto or --option.')
+        self.construct_parser.add_argument('--dry', action="store_true", help='Only print the rename plan of --apply, also the default when dry is set in the config.')
+        self.construct_parser.add_argument('--journal', help='Journal path for --apply, default is rename_journal_[timestamp].jsonl.')
+        self.construct_parser.add_argument('-w', '--workers', type=int, help='Rename threads for --apply, one directory per thread.')
+        self.add_input_arguments(self.construct_parser)
+        self.add_batch_arguments(self.construct_parser, argparse.SUPPRESS)
 
         # Create parser for the "database" commands
         self.database_parser = self.subparsers.add_parser('database', help='Database commands')
         self.database_parser.add_argument('-f', '--updatefile', help="Update database via file.")
         self.database_parser.add_argument('-m', '--updatemulti', nargs="+", help="Update database via multiple files.")
+        self.database_parser.add_argument('-l', '--updatedir', help="Update database via all files in a directory and its subdirectories, always pipelined.")
+        self.database_parser.add_argument('-P', '--pipeline', action="store_true", help="Update via --updatemulti in a pipeline, extraction and database writes overlap.")
+        self.database_parser.add_argument('--sharded', action="store_true", help="Pipelined updates write one temporary database per worker and merge them at the end, fastest for first-time imports.")
+        self.database_parser.add_argument('-w', '--workers', type=int, help="Extraction processes for pipelined updates, default is the cpu count.")
+        self.database_parser.add_argument('-b', '--batchsize', type=int, default=1000, help="Extractions per database transaction for pipelined updates, default is 1000.")
+        self.database_parser.add_argument('--profile', action="store_true", help="Time every database statement, log slow ones with their query plan and print a summary.")
+        self.database_parser.add_argument('--slow', type=float, help="Slow query threshold in ms for --profile, default is slow_query_ms from the config.")
+        self.database_parser.add_argument('--fuzzy', type=float, metavar='THRESHOLD', help="File new artist names under an existing artist at least this similar, 0 to 1. Default is fuzzy_artists from the config, 0 matches names exactly.")
+        self.database_parser.add_argument('--tags', action="store_true", default=None, help="Read the artist and title a file name lacks from the file's ID3v2, FLAC or Ogg tags. Default is probe_tags from the config.")
+        self.database_parser.add_argument('--fingerprint', action="store_true", help="After --updatedir or sync, fingerprint the files of the directory that have no fingerprint yet, see the fingerprint command.")
         self.database_parser.add_argument('-A', '--artists', action="store_true", help='View all artists within the database')
         self.database_parser.add_argument('-S', '--songs', action="store_true", help='View all songs by each artist within the database')
         self.database_parser.add_argument('-Ai', '--artistid', type=int, help='View songs by artist id')
         self.database_parser.add_argument('-Si', '--songid', type=int, help='View song by song id')
+        self.add_input_arguments(self.database_parser)
+        self.add_batch_arguments(self.database_parser, argparse.SUPPRESS)
+
+        # Add database subcommands
+        self.database_subparsers = self.database_parser.add_subparsers(dest='dbcommand')
+
+        self.snapshot_parser = self.database_subparsers.add_parser('snapshot', help='Write a consistent copy of the database, safe during an ingest')
+        self.snapshot_parser.add_argument('dest', help='Path of the copy, a .db file that does not exist yet.')
+
+        self.export_parser = self.database_subparsers.add_parser('export', help='Stream the catalogue to a .csv or .ndjson file, add .gz to compress')
+        self.export_parser.add_argument('path', help='File to write, .csv, .ndjson or .jsonl, optionally followed by .gz.')
+        self.export_parser.add_argument('-b', '--batchsize', type=int, default=argparse.SUPPRESS, help="Rows per fetch, default is 1000.")
+
+        self.import_parser = self.database_subparsers.add_parser('import', help='Upsert a catalogue written by export')
+        self.import_parser.add_argument('path', help='File to read, .csv, .ndjson or .jsonl, optionally followed by .gz.')
+        self.import_parser.add_argument('-b', '--batchsize', type=int, default=argparse.SUPPRESS, help="Rows per transaction, default is 1000.")
+
+        self.artists_parser = self.database_subparsers.add_parser('artists', help='List artists or find artists that are likely the same')
+        self.artists_parser.add_argument('--duplicates', action="store_true", help='Group artists with similar names, such as "artist", "the artist" and "artíst".')
+        self.artists_parser.add_argument('--threshold', type=float, help="Similarity from which names are grouped, 0 to 1, default is 0.7.")
+        self.artists_parser.add_argument('--merge', action="store_true", help='Merge every group into its artist with the most songs, asks first unless --yes.')
+        self.artists_parser.add_argument('-y', '--yes', action='store_true', default=argparse.SUPPRESS, help='Merge without asking.')
+
+        self.fingerprint_parser = self.database_subparsers.add_parser('fingerprint', help='Hash the start and end of recorded files to find the same audio under different names')
+        self.fingerprint_parser.add_argument('dir', nargs='?', help='Only files below this directory, default is every recorded file.')
+        self.fingerprint_parser.add_argument('-t', '--threads', type=int, help="Reader threads, default is the cpu count plus 4, at most 32.")
+        self.fingerprint_parser.add_argument('--kib', type=int, help="KiB hashed from each end of a file, default is 64.")
+        self.fingerprint_parser.add_argument('--rehash', action="store_true", help="Fingerprint files that already have a fingerprint again, needed after changing --kib.")
+
+        self.duplicates_parser = self.database_subparsers.add_parser('duplicates', help='List recorded files with the same fingerprint')
+
+        self.sync_parser = self.database_subparsers.add_parser('sync', help='Incrementally rescan a directory, only new or changed files are extracted')
+        self.sync_parser.add_argument('dir', help='Directory to sync, subdirectories included.')
+        # suppressed defaults keep the values given to the database command
+        self.sync_parser.add_argument('-w', '--workers', type=int, default=argparse.SUPPRESS, help="Extraction processes, default is the cpu count.")
+        self.sync_parser.add_argument('-b', '--batchsize', type=int, default=argparse.SUPPRESS, help="Extractions per database transaction, default is 1000.")
+        self.sync_parser.add_argument('--fingerprint', action="store_true", default=argparse.SUPPRESS, help="Fingerprint the files that have no fingerprint yet after the sync.")
+
+        # Create parser for the "scan" commands
+        self.scan_parser = self.subparsers.add_parser('scan', help='Multi-node scan commands')
+        self.scan_subparsers = self.scan_parser.add_subparsers(dest='scancommand')
+
+        self.scan_plan_parser = self.scan_subparsers.add_parser('plan', help='Write a manifest partitioning files into shards')
+        self.scan_plan_parser.add_argument('roots', nargs="+", help='Directories to scan, subdirectories included.')
+        self.scan_plan_parser.add_argument('-n', '--shards', type=int, required=True, help='Number of shards.')
+        self.scan_plan_parser.add_argument('-o', '--out', default="scan_manifest.ndjson", help='Manifest path, default is scan_manifest.ndjson.')
+
+        self.scan_run_parser = self.scan_subparsers.add_parser('run', help='Extract one shard into a bundle')
+        self.scan_run_parser.add_argument('manifest', nargs="?", help='Manifest written by scan plan.')
+        self.scan_run_parser.add_argument('--shard', required=True, help='Shard to extract, as i/N.')
+        self.scan_run_parser.add_argument('-l', '--dir', action="append", help='Walk this directory instead of reading a manifest, can be repeated.')
+        self.scan_run_parser.add_argument('-o', '--out', help='Bundle path, .db or .ndjson. Default is scan_bundle_i_of_N.db.')
+        self.scan_run_parser.add_argument('-w', '--workers', type=int, help="Extraction processes for .db bundles, default is the cpu count.")
+
+        self.scan_merge_parser = self.scan_subparsers.add_parser('merge', help='Merge bundles into the database')
+        self.scan_merge_parser.add_argument('bundles', nargs="+", help='Bundles written by scan run.')
+
+        # Create parser for the "serve" command
+        self.serve_parser = self.subparsers.add_parser('serve', help='Run a daemon answering requests on a Unix socket')
+        self.serve_parser.add_argument('--socket', help='Socket path, default is the DAEMON socket of the config.')
+        self.serve_parser.add_argument('--status', action="store_true", help='Check whether a daemon is running.')
+        self.serve_parser.add_argument('--stop', action="store_true", help='Stop the running daemon.')
+        self.serve_parser.add_argument('--reload', action="store_true", help='Pick up changes of the config file without restarting.')
+
+        # Create parser for the "undo" command
+        self.undo_parser = self.subparsers.add_parser('undo', help='Restore the names recorded in a rename journal')
+        self.undo_parser.add_argument('journal', help='Journal written by construct --apply.')
+        self.undo_parser.add_argument('-w', '--workers', type=int, help='Rename threads, one directory per thread.')
+
+    @staticmethod
+    def add_input_arguments(parser: argparse.ArgumentParser) -> None:
+        """
+        Adds the options that stream paths into a command instead of listing them as arguments.
+        """
+        parser.add_argument('--stdin', action='store_true', help='Read paths from stdin, one per line. Implies --yes.')
+        parser.add_argument('--stdin0', action='store_true', help='Read NUL-separated paths from stdin, as written by find -print0. Implies --yes.')
+        parser.add_argument('--from-file', dest='from_file', metavar='MANIFEST', help='Read paths from a file, one per line or NUL-separated.')
+
+    @staticmethod
+    def add_batch_arguments(parser: argparse.ArgumentParser, default=None) -> None:
+        """
+        Adds the options that make a command run without prompts. They are accepted before
+        and after the command, commands pass argparse.SUPPRESS so they keep the top-level values.
+        """
+        parser.add_argument('-y', '--yes', action='store_true', default=False if default is None else default, help='Answer yes to every confirmation, also the default when yes is set in the config.')
+        parser.add_argument('--report', choices=['none', 'console', 'html', 'text', 'csv', 'ndjson'], default=default, help='Report type instead of asking, default is report from the config.')
+        parser.add_argument('--report-file', dest='report_file', default=default, help='Path of a file report, default is [command]_report.[ext].')
 
     def get_parsers(self):
         """
         Return a list of parsers that can be used to parse command-line arguments.
             parser, create_parser, view_parser, set_parser
         """
-        parsers = [self.parser, self.extract_parser, self.construct_parser, self.database_parser]
+        parsers = [self.parser, self.extract_parser, self.construct_parser, self.database_parser, self.scan_parser, self.serve_parser, self.undo_parser]
         return parsers
     
     def parse_args(self, args=None):
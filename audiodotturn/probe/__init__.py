@@ -0,0 +1 @@
+from audiodotturn.probe.probe import probe_tags, probe_files, merge_tags, needs_tags, fill_extractions, TAG_FIELDS
\ No newline at end of file
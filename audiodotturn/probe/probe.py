@@ -0,0 +1,348 @@
+import os
+import mmap
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# record fields tags can fill, with the ID3v2.3/2.4, ID3v2.2 and Vorbis comment names they are read from
+TAG_FIELDS = {
+    "artist": ("TPE1", "TP1", "ARTIST"),
+    "title": ("TIT2", "TT2", "TITLE"),
+}
+
+# bytes of a file mapped at most, tags are at the start and only their pages are ever read
+TAG_LIMIT = 16 * 1024 * 1024
+
+# bytes of an Ogg comment packet read at most, cover art in it is cut off
+OGG_COMMENT_LIMIT = 1024 * 1024
+
+_ID3_FRAMES = {name: field for field, names in TAG_FIELDS.items() for name in names[:2]}
+_VORBIS_KEYS = {names[2]: field for field, names in TAG_FIELDS.items()}
+_ID3_ENCODINGS = ("latin-1", "utf-16", "utf-16-be", "utf-8")
+
+
+def probe_tags(path: str) -> Dict[str, str]:
+    """
+    Reads the artist and title an audio file is tagged with. ID3v2 tags, at the start of
+    mp3 and some other files, FLAC Vorbis comments and Ogg Vorbis and Opus comments are
+    understood, without any tagging library.
+
+    The start of the file is memory mapped and parsed in place, frames and blocks that are
+    not needed, cover art above all, are skipped by their size without being read, and
+    only the values of the wanted fields are copied out.
+
+    Parameters:
+        path : str
+            The file to probe.
+
+    Returns:
+        Dict[str, str] : the fields of TAG_FIELDS the file has a non-empty tag for.
+
+    Raises:
+        OSError: If the file cannot be read.
+    """
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size < 4:
+            return {}
+        with mmap.mmap(file.fileno(), min(size, TAG_LIMIT), access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                return _parse(view)
+
+
+def _parse(view: memoryview) -> Dict[str, str]:
+    tags = {}
+    offset = 0
+    if view[:3] == b"ID3":
+        offset = _parse_id3(view, tags)
+    if len(tags) < len(TAG_FIELDS):
+        # FLAC files are sometimes written with an ID3v2 tag in front
+        if view[offset:offset + 4] == b"fLaC":
+            _fill(tags, _parse_flac(view, offset + 4))
+        elif view[offset:offset + 4] == b"OggS":
+            _fill(tags, _parse_ogg(view, offset))
+    return tags
+
+
+def _fill(tags: Dict[str, str], found: Dict[str, str]) -> None:
+    for field, value in found.items():
+        tags.setdefault(field, value)
+
+
+def _syncsafe(data: memoryview) -> int:
+    value = 0
+    for byte in data:
+        value = (value << 7) | (byte & 0x7F)
+    return value
+
+
+def _parse_id3(view: memoryview, tags: Dict[str, str]) -> int:
+    """
+    Reads the wanted text frames of an ID3v2 tag into `tags`, returns the offset right
+    after the tag.
+    """
+    if len(view) < 10:
+        return 0
+    version, flags = view[3], view[5]
+    size = _syncsafe(view[6:10])
+    # a 2.4 footer repeats the header after the frames
+    tag_end = 10 + size + (10 if version == 4 and flags & 0x10 else 0)
+    # a tag unsynchronised as a whole, which nothing writes anymore, is not read
+    if version not in (2, 3, 4) or (flags & 0x80 and version < 4):
+        return tag_end
+
+    end = min(len(view), 10 + size)
+    offset = 10
+    if flags & 0x40 and version > 2:
+        # the extended header counts its size field in 2.4, not in 2.3
+        offset += _syncsafe(view[10:14]) if version == 4 else int.from_bytes(view[10:14], "big") + 4
+
+    header, id_size = (6, 3) if version == 2 else (10, 4)
+    while offset + header <= end and len(tags) < len(TAG_FIELDS):
+        if view[offset] == 0:
+            # padding
+            break
+        frame_id = view[offset:offset + id_size].tobytes().decode("latin-1")
+        frame_flags = 0
+        if version == 2:
+            frame_size = int.from_bytes(view[offset + 3:offset + 6], "big")
+        elif version == 3:
+            frame_size = int.from_bytes(view[offset + 4:offset + 8], "big")
+            frame_flags = view[offset + 9]
+        else:
+            frame_size = _syncsafe(view[offset + 4:offset + 8])
+            frame_flags = view[offset + 9]
+        start = offset + header
+        offset = start + frame_size
+        if offset > end:
+            break
+
+        field = _ID3_FRAMES.get(frame_id)
+        if field is None or field in tags:
+            continue
+        # compressed, encrypted and grouped frames in 2.3, the same and unsynchronised ones in 2.4
+        if frame_flags & (0xE0 if version == 3 else 0x4E):
+            continue
+        if version == 4 and frame_flags & 0x01:
+            # a data length indicator in front of the text
+            start += 4
+        if offset - start < 2:
+            continue
+        value = _id3_text(view[start:offset])
+        if value:
+            tags[field] = value
+    return tag_end
+
+
+def _id3_text(data: memoryview) -> Optional[str]:
+    """
+    The first value of an ID3v2 text frame.
+    """
+    encoding = data[0]
+    if encoding >= len(_ID3_ENCODINGS):
+        return None
+    text = data[1:].tobytes()
+    try:
+        text = text.decode(_ID3_ENCODINGS[encoding])
+    except UnicodeDecodeError:
+        return None
+    # 2.4 separates several values with nulls, the first one is the main artist
+    return text.split("\x00", 1)[0].strip() or None
+
+
+def _parse_flac(view: memoryview, offset: int) -> Dict[str, str]:
+    """
+    Reads the Vorbis comment block of a FLAC stream, skipping every other metadata block.
+    """
+    while offset + 4 <= len(view):
+        block_type = view[offset] & 0x7F
+        last = view[offset] & 0x80
+        size = int.from_bytes(view[offset + 1:offset + 4], "big")
+        start = offset + 4
+        if block_type == 4:
+            return _parse_vorbis_comment(view[start:start + size])
+        if last:
+            break
+        offset = start + size
+    return {}
+
+
+def _parse_ogg(view: memoryview, offset: int) -> Dict[str, str]:
+    """
+    Reads the comment header of the first Ogg stream, the second packet of a Vorbis or
+    Opus stream. Packets can span pages, only the comment packet is copied together.
+    """
+    serial = None
+    packet = 0
+    pieces: List[memoryview] = []
+    length = 0
+    while offset + 27 <= len(view) and view[offset:offset + 4] == b"OggS":
+        segments = view[offset + 26]
+        page_serial = view[offset + 14:offset + 18].tobytes()
+        lacing = view[offset + 27:offset + 27 + segments]
+        data = offset + 27 + segments
+        offset = data + sum(lacing)
+        if serial is None:
+            serial = page_serial
+        elif page_serial != serial:
+            # pages of another stream multiplexed in
+            continue
+
+        start = data
+        for lace in lacing:
+            if packet == 1 and length < OGG_COMMENT_LIMIT:
+                pieces.append(view[start:start + lace])
+                length += lace
+            start += lace
+            if lace < 255:
+                packet += 1
+                if packet == 2:
+                    return _ogg_comment(b"".join(pieces))
+    return _ogg_comment(b"".join(pieces)) if pieces else {}
+
+
+def _ogg_comment(packet: bytes) -> Dict[str, str]:
+    if packet.startswith(b"\x03vorbis"):
+        return _parse_vorbis_comment(memoryview(packet)[7:])
+    if packet.startswith(b"OpusTags"):
+        return _parse_vorbis_comment(memoryview(packet)[8:])
+    return {}
+
+
+def _parse_vorbis_comment(data: memoryview) -> Dict[str, str]:
+    """
+    Reads the wanted fields of a Vorbis comment, a cut off comment is read as far as it goes.
+    """
+    tags = {}
+    if len(data) < 8:
+        return tags
+    offset = 4 + int.from_bytes(data[:4], "little")
+    if offset + 4 > len(data):
+        return tags
+    count = int.from_bytes(data[offset:offset + 4], "little")
+    offset += 4
+    for _ in range(count):
+        if offset + 4 > len(data) or len(tags) == len(TAG_FIELDS):
+            break
+        size = int.from_bytes(data[offset:offset + 4], "little")
+        start = offset + 4
+        offset = start + size
+        # the key is all that is looked at before a value is wanted
+        equals = data[start:min(offset, start + 16)].tobytes().find(b"=")
+        if equals < 0:
+            continue
+        field = _VORBIS_KEYS.get(data[start:start + equals].tobytes().decode("ascii", "replace").upper())
+        if field is None or field in tags:
+            continue
+        value = data[start + equals + 1:offset].tobytes().decode("utf-8", "replace").strip()
+        if value:
+            tags[field] = value
+    return tags
+
+
+def probe_files(paths: Iterable[str], workers: int = None) -> Iterator[Tuple[str, Dict[str, str]]]:
+    """
+    Probes files on a thread pool, results come back in the order of `paths`.
+
+    Parameters:
+        paths : Iterable[str]
+            The files to probe.
+        workers : int, optional
+            Threads, by default the cpu count plus 4, at most 32.
+
+    Returns:
+        Iterator[Tuple[str, Dict[str, str]]] : (path, tags), the tags are empty for files
+            that have none or could not be read.
+    """
+    workers = workers or min(32, (os.cpu_count() or 1) + 4)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="adt-probe") as executor:
+        limit = workers * 4
+        in_flight = deque()
+        for path in paths:
+            in_flight.append((path, executor.submit(_try_probe, path)))
+            if len(in_flight) >= limit:
+                path, future = in_flight.popleft()
+                yield path, future.result()
+        while in_flight:
+            path, future = in_flight.popleft()
+            yield path, future.result()
+
+
+def _try_probe(path: str) -> Dict[str, str]:
+    try:
+        return probe_tags(path)
+    except (OSError, ValueError):
+        return {}
+
+
+def merge_tags(record: Dict, tags: Dict[str, str]) -> bool:
+    """
+    Fills the fields of an extraction record that the file name did not give with `tags`.
+
+      1. A value extracted from the file name is never replaced, renames are built from
+         the file name and have to stay reproducible from it.
+      2. Tags only fill the fields of TAG_FIELDS that are None.
+      3. A failed extraction only becomes a successful one when the tags give every field
+         of TAG_FIELDS, its filetype is then taken from the extension.
+
+    Parameters:
+        record : Dict
+            A dict extraction, changed in place.
+        tags : Dict[str, str]
+            Tags from `probe_tags`.
+
+    Returns:
+        bool : whether a failed extraction became successful.
+    """
+    if not tags:
+        return False
+    if not record["status"]:
+        if len(tags) < len(TAG_FIELDS):
+            return False
+        record.update(tags)
+        record["filetype"] = os.path.splitext(record["original_file"])[1].lstrip(".") or None
+        record["status"] = True
+        return True
+    for field, value in tags.items():
+        if record.get(field) is None:
+            record[field] = value
+    return False
+
+
+def needs_tags(record: Dict) -> bool:
+    """
+    Whether an extraction record lacks a field that tags can fill.
+    """
+    return not record["status"] or any(record.get(field) is None for field in TAG_FIELDS)
+
+
+def fill_extractions(paths: List[str], extractions: List[Dict], exts: Iterable[str], workers: int = None) -> int:
+    """
+    Probes the files whose dict extraction lacks a field of TAG_FIELDS and merges their tags,
+    see `merge_tags`. Files without one of `exts` are left alone, like the extractor does.
+
+    Parameters:
+        paths : List[str]
+            The extracted files.
+        extractions : List[Dict]
+            Their extractions in the same order, changed in place.
+        exts : Iterable[str]
+            The supported extensions.
+        workers : int, optional
+            Threads, see `probe_files`.
+
+    Returns:
+        int : failed extractions that became successful.
+    """
+    exts = tuple(exts)
+    wanted = [
+        (path, record) for path, record in zip(paths, extractions)
+        if isinstance(record, dict) and path.endswith(exts) and needs_tags(record)
+    ]
+    if not wanted:
+        return 0
+    rescued = 0
+    probed = probe_files([path for path, _ in wanted], workers)
+    for (_, record), (_, tags) in zip(wanted, probed):
+        rescued += merge_tags(record, tags)
+    return rescued
@@ -0,0 +1 @@
+from audiodotturn.progress.progress import Progress, RunProfiler, STAGES
\ No newline at end of file
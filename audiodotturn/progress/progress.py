@@ -0,0 +1,240 @@
+import sys
+import time
+import threading
+from datetime import timedelta
+from typing import Any, Dict, Iterable, Iterator, Optional, TextIO
+
+# pipeline stages in order, the last stage with a count is the one a run is measured by
+STAGES = ("walk", "extract", "construct", "write")
+
+
+class Progress:
+    """
+    Live progress line on stderr, so it never mixes with reports or piped output.
+
+    Counts items per stage, files/sec of the furthest stage and, when the total is known,
+    the time left. On a terminal the line is redrawn in place at most every `interval`
+    seconds, otherwise a new line is written every `log_interval` seconds so a log shows
+    a slow run still moving.
+
+        with Progress(total=len(paths)) as progress:
+            for extraction in progress.track(adt.iter_extract(paths), "extract"):
+                ...
+
+    Attributes:
+        counts : Dict[str, int]
+            Items per stage, see STAGES.
+        total : int
+            Items the run will process, None if unknown.
+        stream : TextIO
+            Where the line goes, stderr by default.
+    """
+    def __init__(
+        self,
+        total: Optional[int] = None,
+        stream: Optional[TextIO] = None,
+        interval: float = 0.2,
+        log_interval: float = 5.0
+    ) -> None:
+        self.counts: Dict[str, int] = dict.fromkeys(STAGES, 0)
+        self.total = total
+        self.stream = stream or sys.stderr
+        self.tty = self.stream.isatty()
+        self.interval = interval if self.tty else log_interval
+        self.started = time.monotonic()
+        self._drawn = 0.0
+        # ingest progress comes from the writer thread
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "Progress":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def add(self, stage: str, count: int = 1) -> None:
+        """
+        Adds `count` items to `stage`.
+        """
+        self.counts[stage] += count
+        self.refresh()
+
+    def set(self, stage: str, count: int) -> None:
+        """
+        Sets the count of `stage`, for stages that keep their own counter.
+        """
+        self.counts[stage] = count
+        self.refresh()
+
+    def track(self, iterable: Iterable[Any], stage: str) -> Iterator[Any]:
+        """
+        Yields the items of `iterable`, counting each one to `stage` as it comes out.
+        """
+        for item in iterable:
+            self.counts[stage] += 1
+            self.refresh()
+            yield item
+
+    def ingest(self, stats) -> None:
+        """
+        Progress callback of an ingest or sync, takes the counters of an IngestStats.
+        """
+        self.counts["walk"] = stats.walked + stats.skipped
+        self.counts["extract"] = stats.extracted
+        self.counts["write"] = stats.written + stats.skipped
+        self.refresh()
+
+    @property
+    def done(self) -> int:
+        """
+        Items through the furthest stage that has seen any.
+        """
+        for stage in reversed(STAGES):
+            if self.counts[stage]:
+                return self.counts[stage]
+        return 0
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self) -> float:
+        """
+        Items per second through the furthest stage.
+        """
+        elapsed = self.elapsed
+        return self.done / elapsed if elapsed else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        """
+        Seconds left, None while the total or the rate is unknown.
+        """
+        rate = self.rate
+        if not self.total or not rate:
+            return None
+        return max(self.total - self.done, 0) / rate
+
+    def line(self) -> str:
+        """
+        The progress line, without a line ending.
+        """
+        done = f"{self.done}/{self.total}" if self.total else str(self.done)
+        eta = self.eta
+        parts = [
+            f"{done} files",
+            f"{self.rate:.0f} files/s",
+            f"elapsed {timedelta(seconds=int(self.elapsed))}",
+            f"eta {timedelta(seconds=int(eta)) if eta is not None else '?'}"
+        ]
+        stages = " ".join(f"{stage} {count}" for stage, count in self.counts.items() if count)
+        return " | ".join(parts) + (f" | {stages}" if stages else "")
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        Redraws the line if `interval` has passed since the last draw.
+        """
+        now = time.monotonic()
+        if not force and now - self._drawn < self.interval:
+            return
+        with self._lock:
+            self._drawn = now
+            if self.tty:
+                self.stream.write(f"\r{self.line()}\x1b[K")
+            else:
+                self.stream.write(self.line() + "\n")
+            self.stream.flush()
+
+    def close(self) -> None:
+        """
+        Draws the final line.
+        """
+        self.refresh(force=True)
+        if self.tty:
+            self.stream.write("\n")
+            self.stream.flush()
+
+
+class RunProfiler:
+    """
+    Profiles a whole command. With `pstats_path` the run is profiled with cProfile, the
+    stats are dumped for snakeviz or `python -m pstats` and the `top` most expensive
+    functions by cumulative time are printed. With `memory` allocations are traced with
+    tracemalloc and the `top` allocation sites and the peak are printed.
+
+    cProfile only sees the thread that starts it, work done in extraction processes or
+    rename threads shows up as the time spent waiting for them.
+
+    Attributes:
+        pstats_path : str
+            Where the cProfile stats are dumped, None to skip cProfile.
+        memory : bool
+            Whether allocations are traced.
+        top : int
+            Entries printed of each profile.
+        stream : TextIO
+            Where the summaries go, stderr by default.
+    """
+    def __init__(
+        self,
+        pstats_path: Optional[str] = None,
+        memory: bool = False,
+        top: int = 20,
+        stream: Optional[TextIO] = None
+    ) -> None:
+        self.pstats_path = pstats_path
+        self.memory = memory
+        self.top = top
+        self.stream = stream or sys.stderr
+        self._profiler = None
+
+    def __enter__(self) -> "RunProfiler":
+        if self.memory:
+            import tracemalloc
+            tracemalloc.start()
+        if self.pstats_path:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._profiler is not None:
+            self._profiler.disable()
+        # memory first, so the allocations of the cProfile report are not in it
+        if self.memory:
+            self.report_memory()
+        if self._profiler is not None:
+            self.report_cprofile()
+
+    def report_cprofile(self) -> None:
+        """
+        Dumps the cProfile stats and prints the top functions.
+        """
+        import pstats
+
+        self._profiler.dump_stats(self.pstats_path)
+        self.stream.write(f"\ncProfile stats written to {self.pstats_path}\n")
+        pstats.Stats(self._profiler, stream=self.stream).sort_stats("cumulative").print_stats(self.top)
+
+    def report_memory(self) -> None:
+        """
+        Prints the top allocation sites and the peak of traced memory.
+        """
+        import tracemalloc
+
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        # leave out the profilers themselves and the import machinery
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "*/cProfile.py"),
+            tracemalloc.Filter(False, "<frozen *>"),
+        ))
+        self.stream.write(f"\nTop {self.top} allocations still held at exit:\n")
+        for stat in snapshot.statistics("lineno")[:self.top]:
+            self.stream.write(f"  {stat}\n")
+        self.stream.write(f"Traced memory: current {current / 1024 / 1024:.1f} MiB, peak {peak / 1024 / 1024:.1f} MiB\n")
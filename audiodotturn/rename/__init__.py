@@ -0,0 +1 @@
+from audiodotturn.rename.renaming import Renamer, RenamePlan, RenameOp
\ No newline at end of file
@@ -0,0 +1,313 @@
+import os
+import json
+import itertools
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Dict, NamedTuple, Optional, TextIO
+
+# version of the journal format, 1 only recorded completed renames
+JOURNAL_VERSION = 2
+
+
+class RenameOp(NamedTuple):
+    """
+    One planned rename, `source` and `target` are names inside `directory`.
+    """
+    directory: str
+    source: str
+    target: str
+
+
+class RenamePlan:
+    """
+    The renames `Renamer.plan` accepted and the ones it refused.
+
+    Attributes:
+        ops : List[RenameOp]
+            Renames that can be applied, in the order they were planned.
+        skipped : List[tuple]
+            (path, target, reason) of every refused rename.
+        unchanged : int
+            Files that already have their new name.
+    """
+    def __init__(self) -> None:
+        self.ops = []
+        self.skipped = []
+        self.unchanged = 0
+
+    def __len__(self) -> int:
+        return len(self.ops)
+
+    def by_directory(self) -> Dict[str, List[RenameOp]]:
+        """
+        Returns the renames grouped by directory, each group in planned order.
+        """
+        groups = {}
+        for op in self.ops:
+            groups.setdefault(op.directory, []).append(op)
+        return groups
+
+
+class Renamer:
+    """
+    Applies construction results to the filesystem.
+
+    A plan is built first, every target is checked against an index of the names in its
+    directory (existing files plus the targets planned so far), compared case-insensitively
+    so a plan behaves the same on case-insensitive filesystems. Planning reads each
+    directory once, every check afterwards is a dict lookup.
+
+    Plans are applied by a thread pool, one directory per task, with every rename relative to
+    an open descriptor of its directory. Every rename is written to a JSONL journal before it is
+    attempted and marked done or failed afterwards, so a run that is killed halfway still leaves
+    a journal `undo` can read back in reverse to restore the original names.
+
+    Attributes:
+        workers : int
+            Threads applying renames, None for the ThreadPoolExecutor default.
+    """
+    def __init__(self, workers: Optional[int] = None) -> None:
+        self.workers = workers
+
+    @staticmethod
+    def default_journal() -> str:
+        """
+        Returns a timestamped journal name in the working directory.
+        """
+        return f"rename_journal_{datetime.now().strftime('%Y%m%d-%H%M%S')}.jsonl"
+
+    def plan(self, pairs: Iterable[tuple]) -> RenamePlan:
+        """
+        Builds a plan from (path, new_name) pairs, a new_name of None marks a file that could
+        not be constructed and a path of None a catalogued song without a file. A rename is
+        refused if its target already exists or was planned for another file of the same
+        directory, ignoring case, if its source is missing or was planned already, or if the
+        new name is not a plain filename.
+
+        Parameters:
+            pairs (Iterable[tuple]): (path, new_name) of every file to rename.
+
+        Returns:
+            RenamePlan: The accepted and refused renames.
+        """
+        plan = RenamePlan()
+        # directory -> (names in the directory, casefolded name -> name)
+        indexes = {}
+        # directory -> sources planned so far
+        planned = {}
+
+        for path, target in pairs:
+            if path is None:
+                plan.skipped.append((path, target, "no file"))
+                continue
+            if target is None:
+                plan.skipped.append((path, target, "not constructed"))
+                continue
+
+            directory, source = os.path.split(os.path.abspath(path))
+            if not target or target in (".", "..") or os.sep in target or (os.altsep and os.altsep in target):
+                plan.skipped.append((path, target, "invalid name"))
+                continue
+
+            if directory not in indexes:
+                try:
+                    names = set(os.listdir(directory))
+                except FileNotFoundError:
+                    names = set()
+                indexes[directory] = (names, {name.casefold(): name for name in names})
+                planned[directory] = set()
+            names, index = indexes[directory]
+
+            if source not in names:
+                plan.skipped.append((path, target, "missing"))
+                continue
+            if source in planned[directory]:
+                plan.skipped.append((path, target, "duplicate"))
+                continue
+            if target == source:
+                plan.unchanged += 1
+                continue
+
+            existing = index.get(target.casefold())
+            # a name that only differs by case from its own source is not a collision
+            if existing is not None and existing != source:
+                plan.skipped.append((path, target, f"collides with {existing}"))
+                continue
+
+            index[target.casefold()] = target
+            names.add(target)
+            planned[directory].add(source)
+            plan.ops.append(RenameOp(directory, source, target))
+
+        return plan
+
+    def apply(self, plan: RenamePlan, journal_path: str = None) -> tuple:
+        """
+        Applies a plan and journals every rename. The intent is written and flushed before
+        the rename and its outcome after it, and the journal is synced to disk before this returns.
+
+        A target that appeared after planning is not overwritten, the check and the rename
+        are two calls so a file created in between by another process can still be replaced.
+
+        Parameters:
+            plan (RenamePlan): A plan from `plan`.
+            journal_path (str, optional): Where to write the journal. Defaults to `default_journal`.
+
+        Returns:
+            tuple: (renamed, failures) where failures is a list of (path, target, reason).
+        """
+        journal_path = journal_path or self.default_journal()
+
+        with open(journal_path, "xt", encoding="utf-8") as file:
+            journal = _Journal(file)
+            journal.write({"journal": JOURNAL_VERSION, "created": datetime.now().isoformat(), "renames": len(plan)})
+            try:
+                return self._run(plan.by_directory().values(), lambda ops: self._rename_directory(ops, journal))
+            finally:
+                os.fsync(file.fileno())
+
+    def undo(self, journal_path: str) -> tuple:
+        """
+        Restores the original names recorded in a journal, most recent rename first.
+        Renames whose target is gone or whose original name is taken again are reported
+        as failures and left alone. A rename the journal has no outcome for, because the
+        run was killed during it, is only restored if it happened.
+
+        Parameters:
+            journal_path (str): A journal written by `apply`.
+
+        Returns:
+            tuple: (restored, failures) where failures is a list of (path, original, reason).
+        """
+        groups = {}
+        for op in reversed(list(self.iter_journal(journal_path))):
+            groups.setdefault(op.directory, []).append(RenameOp(op.directory, op.target, op.source))
+
+        return self._run(groups.values(), lambda ops: self._rename_directory(ops))
+
+    @staticmethod
+    def iter_journal(journal_path: str) -> Iterator[RenameOp]:
+        """
+        Yields the renames recorded in a journal that were done, in the order they were
+        attempted. A rename without an outcome is yielded if its target exists and its
+        source does not, the state it leaves behind once it happened.
+
+        Raises:
+            ValueError: If the file is not a rename journal.
+        """
+        with open(journal_path, "rt", encoding="utf-8") as journal:
+            header = json.loads(journal.readline() or "{}")
+            if "journal" not in header:
+                raise ValueError(f"{journal_path} is not a rename journal")
+
+            ops = {}
+            outcomes = {}
+            for number, line in enumerate(journal):
+                # a line cut off by a crash ends the journal
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    break
+                if "directory" in item:
+                    # version 1 journals only hold completed renames, without ids
+                    op_id = item.get("id", f"line-{number}")
+                    ops[op_id] = RenameOp(item["directory"], item["source"], item["target"])
+                    if "id" not in item:
+                        outcomes[op_id] = True
+                else:
+                    outcomes[item["id"]] = item["done"]
+
+        for op_id, op in ops.items():
+            done = outcomes.get(op_id)
+            if done is None:
+                done = (os.path.lexists(os.path.join(op.directory, op.target))
+                        and not os.path.lexists(os.path.join(op.directory, op.source)))
+            if done:
+                yield op
+
+    def _run(self, groups: Iterable[List[RenameOp]], rename_directory) -> tuple:
+        """
+        Runs `rename_directory` over every group in the thread pool and adds up the results.
+        """
+        done = 0
+        failures = []
+        with ThreadPoolExecutor(self.workers) as pool:
+            for renamed, failed in pool.map(rename_directory, groups):
+                done += renamed
+                failures.extend(failed)
+        return done, failures
+
+    @staticmethod
+    def _rename_directory(ops: List[RenameOp], journal: Optional["_Journal"] = None) -> tuple:
+        """
+        Renames inside a single directory relative to one descriptor of it. With a journal
+        every rename is recorded before it is attempted and its outcome after it.
+        """
+        renamed = 0
+        failures = []
+        directory = ops[0].directory
+
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+        except OSError as error:
+            return 0, [(os.path.join(directory, op.source), op.target, str(error)) for op in ops]
+
+        try:
+            for op in ops:
+                op_id = None
+                try:
+                    source = os.stat(op.source, dir_fd=dir_fd, follow_symlinks=False)
+                    try:
+                        target = os.stat(op.target, dir_fd=dir_fd, follow_symlinks=False)
+                    except FileNotFoundError:
+                        target = None
+                    # on case-insensitive filesystems a case-only rename finds its own source
+                    if target is not None and (target.st_ino, target.st_dev) != (source.st_ino, source.st_dev):
+                        failures.append((os.path.join(directory, op.source), op.target, "target exists"))
+                        continue
+                    if journal is not None:
+                        op_id = journal.intent(op)
+                    os.rename(op.source, op.target, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+                except OSError as error:
+                    failures.append((os.path.join(directory, op.source), op.target, error.strerror or str(error)))
+                    if op_id is not None:
+                        journal.outcome(op_id, False)
+                    continue
+
+                renamed += 1
+                if journal is not None:
+                    journal.outcome(op_id, True)
+
+        finally:
+            os.close(dir_fd)
+
+        return renamed, failures
+
+
+class _Journal:
+    """
+    The journal of one `Renamer.apply`, shared by its worker threads. Every record is
+    one line, written and flushed on its own.
+    """
+    def __init__(self, file: TextIO) -> None:
+        self.file = file
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def write(self, record: Dict) -> None:
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def intent(self, op: RenameOp) -> int:
+        """
+        Records a rename about to be attempted, returns its id.
+        """
+        op_id = next(self._ids)
+        self.write(dict(op._asdict(), id=op_id))
+        return op_id
+
+    def outcome(self, op_id: int, done: bool) -> None:
+        self.write({"id": op_id, "done": done})
@@ -0,0 +1 @@
+from audiodotturn.report.reporting import ReportWriter, TextReport, HtmlReport, CsvReport, NdjsonReport, REPORT_WRITERS, EXTRACT_FIELDS, CONSTRUCT_FIELDS, open_report
\ No newline at end of file
@@ -0,0 +1,244 @@
+import csv
+import json
+import html
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import List, Dict, Any, Optional, TextIO
+
+EXTRACT_FIELDS = ["original_file", "artist", "title", "features", "misc", "youtube_id", "filetype", "status"]
+CONSTRUCT_FIELDS = ["original_file", "constructed", "status"]
+
+
+class ReportWriter(ABC):
+    """
+    Base of the file reports. A report is a fixed header, one entry per record written as
+    soon as the record arrives, and a footer with a summary of the run. Nothing but the
+    counters is kept, so a report of a million files costs no more memory than one of ten.
+
+    Subclasses implement `header`, `record` and `footer`, a writer missing one of them
+    cannot be created.
+
+    Use as a context manager, the header is written on entry and the footer on a clean exit.
+    A run that fails part way leaves the records written so far without a footer.
+
+        with open_report("html", "extract_report.html", "Extracted Info", EXTRACT_FIELDS) as report:
+            for extracted in extractions:
+                report.write(extracted)
+
+    Attributes:
+        extension : str
+            Extension of the report file.
+        path : str
+            Path of the report file.
+        title : str
+            Title of the report.
+        fields : List[str]
+            Keys of the records, in column order.
+        success : int
+            Records written with a true 'status'.
+        failure : int
+            Records written with a false 'status'.
+    """
+    extension = ""
+
+    def __init__(self, path: str, title: str, fields: List[str]) -> None:
+        self.path = path
+        self.title = title
+        self.fields = fields
+        self.success = 0
+        self.failure = 0
+        self.started = None
+        self._file: Optional[TextIO] = None
+
+    def __enter__(self) -> "ReportWriter":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.close(complete=exc_type is None)
+
+    def open(self) -> None:
+        """
+        Opens the report file and writes the header.
+        """
+        self.started = datetime.now()
+        self._file = open(self.path, "wt", encoding="utf-8", newline="")
+        self.header()
+
+    def close(self, complete: bool = True) -> None:
+        """
+        Writes the footer, unless the run did not complete, and closes the report file.
+        """
+        if self._file is None:
+            return
+        try:
+            if complete:
+                self.footer(self.summary())
+        finally:
+            self._file.close()
+            self._file = None
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """
+        Writes one record to the report.
+        """
+        if record.get("status"):
+            self.success += 1
+        else:
+            self.failure += 1
+        self.record(record)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Summary of the run written in the footer.
+        """
+        finished = datetime.now()
+        return {
+            "total": self.success + self.failure,
+            "success": self.success,
+            "failure": self.failure,
+            "started": self.started.isoformat(timespec="seconds"),
+            "finished": finished.isoformat(timespec="seconds"),
+            "seconds": round((finished - self.started).total_seconds(), 3)
+        }
+
+    @staticmethod
+    def text(value: Any, separator: str = " | ") -> str:
+        """
+        A record value as text, lists are joined by `separator` and None is empty.
+        """
+        if value is None:
+            return ""
+        if isinstance(value, (list, tuple)):
+            return separator.join(str(item) for item in value)
+        return str(value)
+
+    @abstractmethod
+    def header(self) -> None:
+        """
+        Writes the start of the report.
+        """
+
+    @abstractmethod
+    def record(self, record: Dict[str, Any]) -> None:
+        """
+        Writes one record, the counters are already updated.
+        """
+
+    @abstractmethod
+    def footer(self, summary: Dict[str, Any]) -> None:
+        """
+        Writes the end of the report, see `summary`.
+        """
+
+
+class TextReport(ReportWriter):
+    """
+    Plain text report, one block of 'key : value' lines per record.
+    """
+    extension = "txt"
+
+    def header(self) -> None:
+        self._file.write(f"{self.title}\n{'=' * len(self.title)}\n\n")
+
+    def record(self, record: Dict[str, Any]) -> None:
+        width = max(len(field) for field in self.fields)
+        self._file.write("".join(f"{field:<{width}} : {self.text(record.get(field))}\n" for field in self.fields) + "\n")
+
+    def footer(self, summary: Dict[str, Any]) -> None:
+        self._file.write("Summary\n-------\n")
+        self._file.write("".join(f"{key:<8} : {value}\n" for key, value in summary.items()))
+
+
+class HtmlReport(ReportWriter):
+    """
+    HTML report, a table with one row per record. Rows are written as they come, so the
+    table is not closed until the footer.
+    """
+    extension = "html"
+
+    STYLE = (
+        "body{font-family:monospace;margin:2em}"
+        "table{border-collapse:collapse}"
+        "th,td{border:1px solid #ccc;padding:2px 8px;text-align:left;vertical-align:top}"
+        "tr.failure td{color:#a0006e}"
+    )
+
+    def header(self) -> None:
+        title = html.escape(self.title)
+        columns = "".join(f"<th>{html.escape(field)}</th>" for field in self.fields)
+        self._file.write(
+            "<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n"
+            f"<title>{title}</title>\n<style>{self.STYLE}</style>\n</head>\n<body>\n"
+            f"<h1>{title}</h1>\n<table>\n<thead><tr>{columns}</tr></thead>\n<tbody>\n"
+        )
+
+    def record(self, record: Dict[str, Any]) -> None:
+        # list values, the options of a construction, get a line each
+        cells = "".join(
+            "<td>" + "<br>".join(html.escape(line) for line in self.text(record.get(field), "\n").split("\n")) + "</td>"
+            for field in self.fields
+        )
+        self._file.write(f"<tr class=\"{'success' if record.get('status') else 'failure'}\">{cells}</tr>\n")
+
+    def footer(self, summary: Dict[str, Any]) -> None:
+        rows = "".join(f"<tr><th>{key}</th><td>{value}</td></tr>" for key, value in summary.items())
+        self._file.write(f"</tbody>\n</table>\n<h2>Summary</h2>\n<table>{rows}</table>\n</body>\n</html>\n")
+
+
+class CsvReport(ReportWriter):
+    """
+    CSV report, a header row of the fields and one row per record. There is no footer
+    so the file stays loadable by any csv reader, the summary goes to the console.
+    """
+    extension = "csv"
+
+    def header(self) -> None:
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.fields)
+
+    def record(self, record: Dict[str, Any]) -> None:
+        self._writer.writerow([self.text(record.get(field)) for field in self.fields])
+
+    def footer(self, summary: Dict[str, Any]) -> None:
+        pass
+
+
+class NdjsonReport(ReportWriter):
+    """
+    Newline delimited JSON report. The first line describes the report, every record is
+    one line, and the last line is {"summary": {...}}.
+    """
+    extension = "ndjson"
+
+    def header(self) -> None:
+        self._file.write(json.dumps({"report": self.title, "fields": self.fields}) + "\n")
+
+    def record(self, record: Dict[str, Any]) -> None:
+        self._file.write(json.dumps({field: record.get(field) for field in self.fields}, default=str) + "\n")
+
+    def footer(self, summary: Dict[str, Any]) -> None:
+        self._file.write(json.dumps({"summary": summary}) + "\n")
+
+
+# file report types of --report and the config
+REPORT_WRITERS = {
+    "html": HtmlReport,
+    "text": TextReport,
+    "csv": CsvReport,
+    "ndjson": NdjsonReport,
+}
+
+
+def open_report(report_type: str, path: str, title: str, fields: List[str]) -> ReportWriter:
+    """
+    Returns a report writer of `report_type` for `path`, to be used as a context manager.
+
+    Raises:
+        TypeError: If there is no file report of `report_type`.
+    """
+    try:
+        writer = REPORT_WRITERS[report_type]
+    except KeyError:
+        raise TypeError(f"no file report of type {report_type}")
+    return writer(path, title, fields)
@@ -1,37 +1,56 @@
 """
 Basically used for all print handling
 """
+from __future__ import annotations
+
 import os
-from typing import List, Dict
-from io import StringIO
-from datetime import datetime
-from rich.console import Console
-from rich.theme import Theme
-from rich.progress import track
+import sys
+import contextlib
+from typing import List, Dict, Iterable, Iterator, TYPE_CHECKING
 from audiodotturn import VERSION
-from audiodotturn import AudioDotTurn
 from audiodotturn.parser import Parser
 
+# rich and the AudioDotTurn stack are imported on first use, see `init` and `rich_inits`,
+# so `adt -v` and `adt -h` stay fast when called from shell pipelines
+if TYPE_CHECKING:
+    from audiodotturn.adt import AudioDotTurn
+
 
-def init():
+def init(args=None):
     """
     Initialize AudioDotTurn.
 
+    Args:
+        args (Namespace, optional): Parsed command line arguments, parsed here if not given.
+
     Returns:
         tuple:
             args (parser.parse_args()),
             adt (AudioDotTurn)
     """
-    parser = Parser()
-    args = parser.parse_args()
+    from audiodotturn.adt import AudioDotTurn
+
+    if args is None:
+        args = Parser().parse_args()
     config_path = args.cfgpath or None
     db_path = args.dbpath or None
-    adt = AudioDotTurn(config_path=config_path, db_path=db_path)
+    adt = AudioDotTurn(
+        config_path=config_path,
+        db_path=db_path,
+        readonly=args.readonly,
+        immutable=args.immutable,
+        profile=getattr(args, "profile", False),
+        fuzzy_artists=getattr(args, "fuzzy", None),
+        probe_tags=getattr(args, "tags", None)
+    )
 
     return args, adt
 
 def rich_inits():
     #rich initialisations
+    from rich.console import Console
+    from rich.theme import Theme
+
     theme = Theme(
         {
             "success": "bold green",
@@ -44,6 +63,77 @@ def rich_inits():
 
     return console
 
+# report types of --report, the report prompts and the config, besides console every type
+# is a file report, see `audiodotturn.report`
+REPORT_TYPES = ["console", "html", "text", "csv", "ndjson"]
+
+def confirm(args, prompt: str) -> bool:
+    """
+    Asks a yes/no question, --yes (or yes = True in the config) answers yes without asking.
+    """
+    if args.yes:
+        return True
+    return input(prompt).lower() in ['yes', 'y', 'yy']
+
+
+def choose_report(args, kind: str, noun: str):
+    """
+    Returns the type of the extract or construct report, None for no report. --report (or
+    report in the config) decides without asking, --yes alone means no report.
+
+    ONLY FOR USE WITH CLI CLIENT
+    """
+    report_type = args.report
+    if report_type is None:
+        if args.yes:
+            return None
+        report_type = input(
+            f"\nHow would you like to process the {noun}?\nOutput will be sent to working directory named '{kind}_report.[ext]' if a file.\nOptions: html, text, csv, ndjson, console\nFor none press enter. "
+        )
+    report_type = report_type.lower().strip()
+    if report_type in REPORT_TYPES:
+        return report_type
+    if report_type not in ("", "none"):
+        print(f"Unknown report type {report_type}, no report is made.")
+    return None
+
+
+def report_path(args, kind: str, report_type: str) -> str:
+    """
+    Path of a file report, --report-file names the report of the command that was run.
+    None for console reports.
+    """
+    from audiodotturn.report import REPORT_WRITERS
+
+    if report_type not in REPORT_WRITERS:
+        return None
+    if args.report_file and args.command == kind:
+        return args.report_file
+    return f"{kind}_report.{REPORT_WRITERS[report_type].extension}"
+
+
+def print_report_summary(console, report) -> None:
+    """
+    Tells where a file report was written.
+    """
+    console.print(f"Report written to {report.path} ({report.success} success, {report.failure} failure)", style="info")
+
+
+def input_paths(args):
+    """
+    Returns the paths given through --stdin, --stdin0 or --from-file as a lazy iterator,
+    None when the command lists its files as arguments.
+    """
+    if not (args.stdin or args.stdin0 or args.from_file):
+        return None
+
+    from audiodotturn.ingest import read_paths
+
+    if args.from_file:
+        return read_paths(args.from_file)
+    return read_paths(sys.stdin.buffer, b"\0" if args.stdin0 else b"\n")
+
+
 def extract_commands(args, adt: AudioDotTurn):
     """
     Extracts information from a given file or multiple files.
@@ -57,34 +147,30 @@ def extract_commands(args, adt: AudioDotTurn):
     success = 0
     failure = 0
 
-    if args.file:
-        extraction = adt.extract_file(args.file, opt)[0]
-        console.print(extraction, '\n', style="info")
+    paths = input_paths(args)
+
+    if paths is not None:
+        extractions = adt.iter_extract(track(args, paths, "walk"), opt)
+        success, failure = produce_extract_report(track(args, extractions, "extract"), console, args)
+        console.print(f"\nsuccess: {success}\nfailure: {failure}")
+
+    elif args.file:
+        print_extraction(console, adt.extract_file(args.file, opt)[0])
 
     elif args.multi:
-        extractions = adt.extract_files(args.multi, opt)
-        produce_extract_report(extractions, console)
-        for extracted in extractions:
-            if extracted["status"]:
-                success += 1
-            else:
-                failure += 1
+        extractions = track(args, adt.iter_extract(args.multi, opt), "extract", len(args.multi))
+        success, failure = produce_extract_report(extractions, console, args)
         console.print(f"\nsuccess: {success}\nfailure: {failure}")
 
     elif args.dir:
         try:
-            files = [file for file in os.listdir(args.dir) if os.path.isfile(os.path.join(args.dir, file)) and file.endswith(tuple(adt.config.exts))]
+            files = [file for file in os.listdir(args.dir) if os.path.isfile(os.path.join(args.dir, file)) and file.endswith(adt.settings.exts)]
         except NotADirectoryError as error:
             console.print(error)
             return
 
-        extractions = adt.extract_files(files, opt)
-        produce_extract_report(extractions, console)
-        for extracted in extractions:
-            if extracted["status"]:
-                success += 1
-            else:
-                failure += 1
+        extractions = track(args, adt.iter_extract(files, opt), "extract", len(files))
+        success, failure = produce_extract_report(extractions, console, args)
         console.print(f"\nsuccess: {success}\nfailure: {failure}")
 
 
@@ -101,20 +187,43 @@ def construct_commands(args, adt: AudioDotTurn):
     success = 0
     failure = 0
 
-    if args.file:
-        extraction = adt.extract_file(args.file)
-    elif args.multi:
-        extraction = adt.extract_files(args.multi)
-        produce_extract_report(extraction, console)
-    elif args.dir:
-        extraction = adt.extract_file([file for file in os.listdir(args.dir) if os.path.isfile(os.path.join(args.dir, file)) and file.endswith(tuple(adt.config.exts))])
-        produce_extract_report(extraction, console)
+    paths = input_paths(args)
 
-    if not any((args.file, args.multi)):
+    if args.apply or args.dry:
+        rename_commands(args, adt, console, paths)
         return
 
-    results = adt.construct(constructor_type, extraction, args.auto)
+    if args.from_db:
+        results = adt.construct_from_db(db_query(args, paths), constructor_type, args.auto, args.option)
+    else:
+        if paths is not None:
+            extractions = adt.iter_extract(track(args, paths, "walk"))
+            extractions = stream_extract_report(track(args, extractions, "extract"), console, args)
+        elif args.file:
+            extractions = adt.extract_file(args.file)
+        elif args.multi:
+            # extractions are reported as they pass through on their way to the constructor
+            extractions = track(args, adt.iter_extract(args.multi), "extract", len(args.multi))
+            extractions = stream_extract_report(extractions, console, args)
+        else:
+            return
+
+        results = adt.iter_construct(constructor_type, extractions, args.auto, args.option)
+
+    report_constructions(track(args, results, "construct"), console, args)
+
 
+def print_extraction(console, extraction) -> None:
+    """
+    Prints the extraction of a single file command.
+    """
+    console.print(extraction, '\n', style="info")
+
+
+def report_constructions(results, console, args) -> None:
+    """
+    Reports the results of a construct command and its success and failure counts.
+    """
     success, failure = produce_construct_report(results, console, args)
 
     if success == 0 and failure == 0:
@@ -123,6 +232,209 @@ def construct_commands(args, adt: AudioDotTurn):
         console.print(f"\nsuccess: {success}\nfailure: {failure}")
 
 
+def db_query(args, paths: Iterable[str] = None) -> Dict:
+    """
+    Builds the query of a construct --from-db command, -f/-m or streamed paths select files by path.
+
+    Args:
+        args (Namespace): Command line arguments.
+        paths (Iterable[str], optional): Paths from `input_paths`.
+    """
+    query = {
+        "artist": args.artist,
+        "artist_id": args.artistid,
+        "song_id": args.songid,
+        "path_prefix": args.dir
+    }
+    if paths is not None:
+        query["paths"] = paths
+    elif args.file or args.multi:
+        query["paths"] = [args.file] if args.file else args.multi
+    return query
+
+
+def rename_commands(args, adt: AudioDotTurn, console, stream: Iterable[str] = None):
+    """
+    Renames the files of a construct command to their constructed names, or prints the plan for a dry run.
+
+    Args:
+        args (Namespace): Command line arguments.
+        adt (AudioDotTurn): AudioDotTurn instance.
+        console (Console): Rich console.
+        stream (Iterable[str], optional): Paths from `input_paths`, used instead of -f/-m.
+    """
+    paths = stream if stream is not None else ([args.file] if args.file else args.multi)
+    if not paths and not args.from_db:
+        return
+    if not args.auto and args.option is None:
+        console.print("--apply needs a single name per file, use --auto or --option.", style="failure")
+        return
+
+    dry = args.dry or adt.settings.dry
+    query = db_query(args, paths) if args.from_db else None
+    results = adt.rename(paths, args.constructor, args.auto, args.option, dry, args.journal, args.workers, query)
+    plan = results["plan"]
+
+    if dry:
+        console.print("Rename plan (dry run):", style="cyan")
+        for directory, ops in plan.by_directory().items():
+            console.print(f"\n[cyan]{directory}")
+            for op in ops:
+                console.print(f'[magenta]"{op.source}" => [success]"{op.target}"')
+
+    for path, target, reason in plan.skipped:
+        console.print(f'Skipped "{path}" => "{target}": {reason}', style="yellow")
+    for path, target, reason in results["failures"]:
+        console.print(f'Failed "{path}" => "{target}": {reason}', style="failure")
+
+    console.print(f"\nplanned: {len(plan)}\nunchanged: {plan.unchanged}\nskipped: {len(plan.skipped)}")
+    if not dry:
+        console.print(f"renamed: {results['renamed']}\nfailure: {len(results['failures'])}")
+        if results["journal"]:
+            console.print(f"journal: {results['journal']}", style="info")
+
+
+def serve_commands(args, adt: AudioDotTurn):
+    """
+    Runs the daemon, or checks on or stops a running one.
+
+    Args:
+        args (Namespace): Command line arguments.
+        adt (AudioDotTurn): AudioDotTurn instance.
+    """
+    from audiodotturn.serve import Client
+
+    console = rich_inits()
+    socket_path = args.socket or adt.settings.daemon_socket
+
+    if args.status or args.stop:
+        client = Client.connect(socket_path)
+        if client is None:
+            console.print(f"No daemon is listening on {socket_path}", style="info")
+            return
+
+        with client:
+            if args.stop:
+                client.request("shutdown")
+                console.print("Daemon stopped.", style="success")
+            else:
+                status = client.request("ping")
+                console.print(f"Daemon {status['version']} running, pid {status['pid']}, socket {status['socket']}", style="success")
+        return
+
+    console.print(f"Serving on {socket_path}, stop with adt serve --stop", style="info")
+    adt.reload_config = args.reload
+    adt.serve(socket_path)
+
+
+def forward(args) -> bool:
+    """
+    Forwards single file extract and construct commands to a running daemon, the
+    AudioDotTurn stack is not imported and the answer is printed by the same functions as
+    a local run. Commands that name their own config or database, ask for a report type
+    or file, or read their paths from stdin or a manifest always run locally.
+
+    Args:
+        args (Namespace): Command line arguments.
+
+    Returns:
+        bool: True if the daemon handled the command.
+    """
+    if args.no_daemon or args.cfgpath or args.dbpath or args.readonly or args.immutable:
+        return False
+    if args.progress or args.cprofile or args.memprofile or args.metrics_json or args.metrics_prom or args.trace:
+        return False
+    if args.command == "extract" and args.file:
+        op = "extract"
+    elif args.command == "construct" and args.file and not (args.multi or args.apply or args.dry or args.from_db):
+        op = "construct"
+    else:
+        return False
+    if args.report or args.report_file or args.stdin or args.stdin0 or args.from_file:
+        return False
+
+    from audiodotturn.config import load_settings
+    from audiodotturn.serve.client import Client
+
+    settings = load_settings()
+    # run metrics are written by the local run
+    if settings.metrics_json or settings.metrics_prometheus:
+        return False
+
+    client = Client.connect(settings.daemon_socket)
+    if client is None:
+        return False
+
+    with client:
+        if op == "extract":
+            result = client.request("extract", files=[args.file], output_format=args.out, probe_tags=settings.probe_tags)[0]
+        else:
+            result = client.request(
+                "construct",
+                files=[args.file],
+                constructor=args.constructor,
+                auto=args.auto,
+                option=args.option,
+                probe_tags=settings.probe_tags
+            )
+
+    console = rich_inits()
+    if op == "extract":
+        print_extraction(console, result)
+        return True
+
+    # the config defaults of a local run, see `run_command`
+    args.yes = args.yes or settings.assume_yes
+    args.report = settings.report
+    report_constructions([tuple(item) for item in result], console, args)
+    return True
+
+
+def undo_commands(args, adt: AudioDotTurn):
+    """
+    Restores the names recorded in a rename journal.
+
+    Args:
+        args (Namespace): Command line arguments.
+        adt (AudioDotTurn): AudioDotTurn instance.
+    """
+    console = rich_inits()
+    restored, failures = adt.undo_rename(args.journal, args.workers)
+
+    for path, original, reason in failures:
+        console.print(f'Failed "{path}" => "{original}": {reason}', style="failure")
+    console.print(f"\nrestored: {restored}\nfailure: {len(failures)}")
+
+
+class Status:
+    """
+    Progress of a long database command, the rich status spinner on the console or,
+    with --progress, the progress line on stderr.
+    """
+    def __init__(self, console, args, message: str):
+        self.display = args.progress_display
+        self.spinner = console.status(message) if self.display is None else None
+
+    def __enter__(self):
+        if self.spinner is not None:
+            self.spinner.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        if self.spinner is not None:
+            self.spinner.__exit__(*exc)
+
+    def update(self, message: str, rows: int = None):
+        if self.spinner is not None:
+            self.spinner.update(message)
+        elif rows is not None:
+            self.display.set("write", rows)
+
+    def ingest(self, stats):
+        if self.display is not None:
+            self.display.ingest(stats)
+
+
 def database_commands(args, adt: AudioDotTurn):
     """
     Manipulates the database.
@@ -131,13 +443,75 @@ def database_commands(args, adt: AudioDotTurn):
         args (Namespace): Command line arguments.
         adt (AudioDotTurn): AudioDotTurn instance.
     """
+    from rich.progress import track
+
     console = rich_inits()
+    paths = input_paths(args)
+
+    if args.dbcommand == "snapshot":
+        adt.snapshot(args.dest)
+        console.print(f"Snapshot written to {args.dest}", style="success")
 
-    if args.updatefile:
+    elif args.dbcommand == "artists":
+        artist_commands(args, adt, console)
+
+    elif args.dbcommand == "fingerprint":
+        fingerprint_commands(args, adt, console, args.dir, args.threads, args.kib, args.rehash)
+
+    elif args.dbcommand == "duplicates":
+        duplicate_commands(adt, console)
+
+    elif args.dbcommand == "export":
+        with Status(console, args, "Exporting...") as current:
+            count = adt.export_catalogue(args.path, args.batchsize, lambda count: current.update(f"Exporting... {count} rows", count))
+        console.print(f"{count} rows exported to {args.path}", style="success")
+
+    elif args.dbcommand == "import":
+        with Status(console, args, "Importing...") as current:
+            new_artists, new_songs, updated, failure = adt.import_catalogue(
+                args.path, args.batchsize, lambda count: current.update(f"Importing... {count} rows", count)
+            )
+        if args.metrics is not None:
+            args.metrics.rows_written += new_artists + new_songs + updated
+        console.print(
+            f"New artists: {new_artists}",
+            f"New songs: {new_songs}\n",
+            f"Updated: {updated}",
+            f"Failure: {failure}\n"
+        )
+
+    elif args.dbcommand == "sync":
+
+        with Status(console, args, "Syncing...") as current:
+
+            def progress(stats):
+                current.ingest(stats)
+                current.update(
+                    f"Syncing... changed: {stats.walked} unchanged: {stats.skipped} written: {stats.written} "
+                    f"({stats.rate:.0f} files/s)"
+                )
+
+            stats = adt.sync(args.dir, args.workers, args.batchsize, progress)
+
+        if args.metrics is not None:
+            args.metrics.add_ingest(stats)
+
+        console.print(
+            f"New artists: {stats.new_artists}",
+            f"New songs: {stats.new_songs}\n",
+            f"Updated: {stats.updated}",
+            f"Failure: {stats.failure}\n",
+            f"Unchanged: {stats.skipped}",
+            f"Removed: {stats.removed}\n",
+            f"Files: {stats.written} in {stats.elapsed:.2f}s, {stats.batches} transactions\n"
+        )
+        if args.fingerprint:
+            fingerprint_commands(args, adt, console, args.dir)
 
-        console.print(f"Current database in use or to be created is {os.path.abspath(adt.config.db_path)}\n")
-        confirm = input("continue? [y/N]")
-        if confirm.lower() not in ['yes', 'y', 'yy']:
+    elif args.updatefile:
+
+        console.print(f"Current database in use or to be created is {os.path.abspath(adt.settings.db_path)}\n")
+        if not confirm(args, "continue? [y/N]"):
             console.print("Exiting\n", style="error")
             return
 
@@ -148,8 +522,7 @@ def database_commands(args, adt: AudioDotTurn):
             console.print(key, ':', value, style="success")
         console.print('\n')
 
-        confirm = input("update database [y/N]: ")
-        if confirm.lower() not in ['yes', 'y', 'yy']:
+        if not confirm(args, "update database [y/N]: "):
             console.print("Exiting\n", style="error")
             return
 
@@ -163,25 +536,61 @@ def database_commands(args, adt: AudioDotTurn):
         if failure:
             console.print("Update failed\n")
     
-    elif args.updatemulti:
+    elif args.updatedir or paths is not None or (args.updatemulti and (args.pipeline or args.sharded)):
 
-        console.print(f"Current database in use or to be created is {os.path.abspath(adt.config.db_path)}\n", style="cyan")
-        confirm = input("continue? [y/N]")
-        if confirm.lower() not in ['yes', 'y', 'yy']:
+        console.print(f"Current database in use or to be created is {os.path.abspath(adt.database.path)}\n", style="cyan")
+        if not confirm(args, "continue? [y/N]"):
             console.print("Exiting\n", style="error")
             return
 
-        confirm_print = input("\nExamine extraction results before updating? [y/N]")
-        if confirm_print.lower() not in ['yes', 'y', 'yy']:
+        with Status(console, args, "Ingesting...") as current:
+
+            def progress(stats):
+                current.ingest(stats)
+                current.update(
+                    f"Ingesting... walked: {stats.walked} written: {stats.written} "
+                    f"({stats.rate:.0f} files/s)"
+                )
+
+            if args.updatedir:
+                stats = adt.ingest_directory(args.updatedir, args.workers, args.batchsize, progress, args.sharded)
+            elif paths is not None:
+                stats = adt.ingest(paths, args.workers, args.batchsize, progress, args.sharded, stat=True)
+            else:
+                stats = adt.ingest(args.updatemulti, args.workers, args.batchsize, progress, args.sharded)
+
+        if args.metrics is not None:
+            args.metrics.add_ingest(stats)
+
+        console.print(
+            f"New artists: {stats.new_artists}",
+            f"New songs: {stats.new_songs}\n",
+            f"Updated: {stats.updated}",
+            f"Failure: {stats.failure}\n",
+            f"Files: {stats.written} in {stats.elapsed:.2f}s, {stats.batches} transactions\n"
+        )
+        if args.fingerprint and args.updatedir:
+            fingerprint_commands(args, adt, console, args.updatedir)
+
+    elif args.updatemulti:
+
+        console.print(f"Current database in use or to be created is {os.path.abspath(adt.settings.db_path)}\n", style="cyan")
+        if not confirm(args, "continue? [y/N]"):
             console.print("Exiting\n", style="error")
             return
 
+        # --report decides whether the extractions are examined, --yes alone skips them
+        if args.report is not None:
+            examine = args.report != "none"
+        else:
+            examine = not args.yes and input("\nExamine extraction results before updating? [y/N]").lower() in ['yes', 'y', 'yy']
+
         extractions = adt.extract_files(args.updatemulti)
 
-        adt.produce_report(extractions, console)
+        if examine:
+            produce_extract_report(extractions, console, args)
                 
-        confirm = input("update database [y/N]: ")
-        if confirm.lower() not in ['yes', 'y', 'yy']:
+        if not confirm(args, "update database [y/N]: "):
             console.print("Exiting\n", style="error")
             return
 
@@ -226,214 +635,467 @@ def database_commands(args, adt: AudioDotTurn):
         else:
             console.print("None found.\n", style="info")
 
+    if adt.database.fuzzy_matched:
+        console.print(f"Artist names matched by similarity: {adt.database.fuzzy_matched}\n", style="info")
+
+
+def fingerprint_commands(args, adt: AudioDotTurn, console, directory: str = None, workers: int = None, kib: int = None, rehash: bool = False):
+    """
+    Fingerprints the recorded files below `directory` that have no fingerprint yet.
+
+    Args:
+        args (Namespace): Command line arguments.
+        adt (AudioDotTurn): AudioDotTurn instance.
+    """
+    with Status(console, args, "Fingerprinting...") as current:
+        hashed, failed = adt.fingerprint(
+            directory,
+            workers,
+            kib,
+            rehash,
+            progress=lambda hashed, failed: current.update(f"Fingerprinting... {hashed} files", hashed)
+        )
+    console.print(f"Fingerprinted: {hashed}", f"Unreadable: {failed}\n")
+
+
+def duplicate_commands(adt: AudioDotTurn, console):
+    """
+    Lists the recorded files with the same fingerprint.
+
+    Args:
+        adt (AudioDotTurn): AudioDotTurn instance.
+    """
+    from rich.markup import escape
+
+    groups = adt.find_duplicate_files()
+    if not groups:
+        console.print("No duplicate files among the fingerprinted files.\n", style="info")
+        return
+
+    from rich.table import Table
+
+    table = Table(title="Duplicate files")
+    for column, justify in (("group", "right"), ("size", "right"), ("path", "left"), ("song", "left")):
+        table.add_column(column, justify=justify, overflow="fold")
+    for number, group in enumerate(groups, start=1):
+        for position, file in enumerate(group):
+            song = f'{file["artist"]} - {file["title"]}' if file["title"] is not None else ""
+            table.add_row(
+                str(number) if position == 0 else "",
+                str(file["size"]) if position == 0 else "",
+                escape(file["path"]),
+                escape(song),
+                end_section=position == len(group) - 1
+            )
+    console.print(table)
+    console.print(f"{len(groups)} groups, {sum(len(group) for group in groups)} files\n")
+
+
+def artist_commands(args, adt: AudioDotTurn, console):
+    """
+    Lists artists, or finds and merges artists with similar names.
+
+    Args:
+        args (Namespace): Command line arguments.
+        adt (AudioDotTurn): AudioDotTurn instance.
+    """
+    from rich.markup import escape
+
+    if not args.duplicates:
+        for artist in adt.get_all_artists() or []:
+            console.print(f'id: {artist["artist_id"]}, name: {escape(artist["name"])}')
+        return
+
+    with Status(console, args, "Comparing artists..."):
+        groups = adt.find_duplicate_artists(args.threshold)
+
+    if not groups:
+        console.print("No similar artists found.\n", style="info")
+        return
+
+    from rich.table import Table
+
+    table = Table(title="Similar artists")
+    for column, justify in (("group", "right"), ("id", "right"), ("name", "left"), ("songs", "right"), ("similarity", "right")):
+        table.add_column(column, justify=justify)
+    for number, group in enumerate(groups, start=1):
+        for position, artist in enumerate(group):
+            table.add_row(
+                str(number) if position == 0 else "",
+                str(artist["artist_id"]),
+                escape(artist["name"]),
+                str(artist["songs"]),
+                "keep" if position == 0 else f'{artist["similarity"]:.2f}',
+                end_section=position == len(group) - 1
+            )
+    console.print(table)
+    console.print(f"{len(groups)} groups, {sum(len(group) for group in groups)} artists\n")
+
+    if not args.merge:
+        return
+    if not confirm(args, "merge every group into its first artist? [y/N]: "):
+        console.print("Exiting\n", style="error")
+        return
+
+    artists = moved = merged = 0
+    for group in groups:
+        removed, songs_moved, songs_merged = adt.merge_artists(group[0]["artist_id"], [artist["artist_id"] for artist in group[1:]])
+        artists += removed
+        moved += songs_moved
+        merged += songs_merged
+    console.print(
+        f"Artists merged: {artists}",
+        f"Songs moved: {moved}",
+        f"Songs merged: {merged}\n",
+        style="success"
+    )
+
+def scan_commands(args, adt: AudioDotTurn):
+    """
+    Plans, runs and merges multi-node scans.
+
+    Args:
+        args (Namespace): Command line arguments.
+        adt (AudioDotTurn): AudioDotTurn instance.
+    """
+    console = rich_inits()
+
+    if args.scancommand == "plan":
+        counts = adt.plan_scan(args.roots, args.shards, args.out)
+        for shard, count in enumerate(counts):
+            console.print(f"shard {shard}/{args.shards}: {count} files")
+        console.print(f"\nManifest written to {args.out}", style="success")
+
+    elif args.scancommand == "run":
+        from audiodotturn.scan import Scanner
+        shard, shards = Scanner.parse_shard(args.shard)
+        bundle = args.out or f"scan_bundle_{shard}_of_{shards}.db"
+        with console.status(f"Scanning shard {shard}/{shards}..."):
+            stats = adt.run_scan(shard, shards, bundle, args.manifest, args.dir, args.workers)
+        console.print(
+            f"Files: {stats.written} in {stats.elapsed:.2f}s",
+            f"Failure: {stats.failure}\n"
+        )
+        console.print(f"Bundle written to {bundle}", style="success")
+
+    elif args.scancommand == "merge":
+        for bundle in args.bundles:
+            result = adt.merge_scan(bundle)
+            if result is None:
+                console.print(f"{bundle}: already merged", style="info")
+                continue
+            new_artists, new_songs, updated, files = result
+            console.print(
+                f"{bundle}: New artists: {new_artists}",
+                f"New songs: {new_songs}",
+                f"Updated: {updated}",
+                f"Files: {files}",
+                style="success"
+            )
+
+
+def produce_query_profile(adt: AudioDotTurn, console, limit: int = 20):
+    """
+    Print the statements recorded by the query profiler, most expensive first.
+
+    ONLY FOR USE WITH CLI CLIENT
+    """
+    from rich.table import Table
+
+    table = Table(title="Query profile")
+    for column in ("calls", "total ms", "max ms", "mean ms", "rows"):
+        table.add_column(column, justify="right")
+    table.add_column("statement", overflow="fold")
+
+    for item in adt.query_profile(limit):
+        table.add_row(
+            str(item["count"]),
+            f"{item['total'] * 1000:.2f}",
+            f"{item['max'] * 1000:.2f}",
+            f"{item['mean'] * 1000:.3f}",
+            str(item["rows"]),
+            item["sql"]
+        )
+
+    console.print(table)
+
+
 def produce_construct_report(results, console, args):
     """
-    Produce report of constructions. Options are html, svg, txt, or console.
+    Produce report of constructions. Options are html, text, csv, ndjson or console.
+
+    Results are consumed one at a time as the constructor yields them, see
+    `AudioDotTurn.iter_construct`, and file reports are written as they come.
 
     ONLY FOR USE WITH CLI CLIENT        
     """
+    from rich.markup import escape
+
     success = 0
     failure = 0
 
-    report_type = input(
-        "\nHow would you like to process the constructions(s)?\nOutput will be sent to working directory named 'construct_report.[ext]' if a file.\nOptions: html, text, svg, console\nFor none press enter. "
-    )
-    match report_type.lower().strip():
-        case "html":
-            report_type = "html"
-        case "svg":
-            report_type = "svg"
-        case "text":
-            report_type = "text"
-        case "console":
-            report_type = "console"
-        case _:
-            report_type = None
-
-    if report_type is not None:
-        if report_type == "console":
-            if not args.auto:
-                if results["success"]:
-                    if args.multi:
-                        for result in results["success"]:
-                            console.print(f"\n[cyan]Original File: [magenta]{result[0]}\n")
-                            console.print("Options created:", style="cyan")
-                            for option in result[1]:
-                                console.print(option, style="success")
-                            success += 1
-                    else:
-                        console.print(f"\nOriginal File: {results['success'][0][0]}\n")
-                        console.print("Options created:", style="cyan")
-                        for option in results["success"][0][1]:
-                            console.print(option, style="success")
-                        success += 1
-                    console.print('\n')
-            else:
-                if results["success"]:
-                    if args.multi:
-                        for result in results["success"]:
-                            console.print(f'[magenta]"{result[0]}" => [success]"{result[1]}"\n')
-                        success += 1
-                    else:
-                        console.print(f'[magenta]{results["success"][0][0]} => [success]{results["success"][0][1]}', style="success")
-                        success += 1
-
-                    console.print('\n')
-
-            if results["failure"]:
-                for result in results["failure"]:
-                    failure += 1
-                    console.print(f"\nFailed to construct: {result}\n", style="failure")
+    report_type = choose_report(args, "construct", "constructions(s)")
+
+    if report_type is None:
+        return success, failure
+
+    if report_type != "console":
+        from audiodotturn.report import open_report, CONSTRUCT_FIELDS
+
+        with open_report(report_type, report_path(args, "construct", report_type), "Construction Report", CONSTRUCT_FIELDS) as report:
+            for status, result in results:
+                if status:
+                    report.write({"original_file": result[0], "constructed": result[1], "status": True})
+                else:
+                    report.write({"original_file": result, "constructed": None, "status": False})
+        print_report_summary(console, report)
+        return report.success, report.failure
+
+    for status, result in results:
+        if not status:
+            failure += 1
+            console.print(f"\nFailed to construct: {escape(str(result))}\n", style="failure")
+            continue
+
+        success += 1
+        if not args.auto and args.option is None:
+            console.print(f"\n[cyan]Original File: [magenta]{escape(result[0])}\n")
+            console.print("Options created:", style="cyan")
+            for option in result[1]:
+                console.print(option, style="success", markup=False)
         else:
-            record_console = Console(record=True, stderr=True, file=StringIO())
-            if not args.auto:
-                if results["success"]:
-                    if args.multi:
-                        for result in results["success"]:
-                            record_console.print(f"\n[cyan]Original File: [magenta]{result[0]}\n")
-                            record_console.print("Options created:", style="cyan")
-                            for option in result[1]:
-                                record_console.print(option, style="green")
-                            success += 1
-                    else:
-                        record_console.print(f"\nOriginal File: {results['success'][0][0]}\n")
-                        record_console.print("Options created:", style="cyan")
-                        for option in results["success"][0][1]:
-                            record_console.print(option, style="green")
-                        success += 1
-                    record_console.print('\n')
-            else:
-                if results["success"]:
-                    if args.multi:
-                        for result in results["success"]:
-                            record_console.print(f'[magenta]"{result[0]}" => [green]"{result[1]}"\n')
-                            success += 1
-                    else:
-                        record_console.print(f'[magenta]{results["success"][0][0]} => [success]{results["success"][0][1]}', style="success")
-                        success += 1
-
-                    record_console.print('\n')
-
-            if results["failure"]:
-                for result in results["failure"]:
-                    failure += 1
-                    record_console.print(f"\nFailed to construct: {result}\n", style="red")
-
-            match report_type:
-                case "html":
-                    record = record_console.export_html()
-                case "svg":
-                    record = record_console.export_svg()
-                case "txt":
-                    record = record_console.export_text()
-                case _:
-                    record = False
-
-            if record:
-                with open(f"construct_report.{report_type}", "wt") as report:
-                    report.write(record)
+            console.print(f'[magenta]"{escape(result[0])}" => [success]"{escape(result[1])}"\n')
 
     return success, failure
 
-
-def produce_extract_report(extractions: List[Dict], console):
+def produce_extract_report(extractions: Iterable[Dict], console, args) -> tuple:
     """
-    Produce report of extractions list. Options are html, svg, txt, or console.
+    Produce report of extractions. Options are html, text, csv, ndjson or console.
 
     ONLY FOR USE WITH CLI CLIENT
+
+    Returns:
+        tuple: (success, failure) counts of the extractions.
     """
+    success = 0
+    failure = 0
 
-    report_type = input(
-        "\nHow would you like to process the extraction(s)?\nOutput will be sent to working directory named 'extract_report.[ext]' if a file.\nOptions: html, text, svg, console\nFor none press enter. "
-    )
-    match report_type.lower().strip():
-        case "html":
-            report_type = "html"
-        case "svg":
-            report_type = "svg"
-        case "text":
-            report_type = "text"
-        case "console":
-            report_type = "console"
-        case _:
-            report_type = None
-
-
-    if report_type is not None:
-        if report_type == "console":
-            console.print('Extracted Info:', style="cyan")
-
-
-            for extracted in extractions:
-                for key, value in extracted.items():
-                    console.print(key, ':', value, style="success")
-                
-                console.print('\n')
+    for extracted in stream_extract_report(extractions, console, args):
+        if extracted["status"]:
+            success += 1
         else:
-            record_console = Console(record=True, stderr=True, file=StringIO())
-            record_console.rule('Extracted Info:', style="cyan")
+            failure += 1
 
-            for extracted in extractions:
-                for key, value in extracted.items():
-                    record_console.print(key, ':', value, style="bold green")
-                
-                record_console.print('\n')
-            record_console.rule(f"Report Generated {datetime.now().ctime()}")
-
-
-            match report_type:
-                case "html":
-                    record = record_console.export_html()
-                case "svg":
-                    record = record_console.export_svg()
-                case "txt":
-                    record = record_console.export_text()
-                case _:
-                    record = False
-
-            if record:
-                with open(f"extract_report.{report_type}", "wt") as report:
-                    report.write(record)
-    
-    else:
+    return success, failure
+
+
+def stream_extract_report(extractions: Iterable[Dict], console, args) -> Iterator[Dict]:
+    """
+    Asks for the report type right away and returns a generator that reports each extraction
+    as it passes through, so extractions can be reported on their way to the constructor
+    without being collected first. File reports are written as the extractions pass.
+
+    ONLY FOR USE WITH CLI CLIENT
+    """
+
+    report_type = choose_report(args, "extract", "extraction(s)")
+
+    if report_type is None:
         console.print("No report generated.", style="yellow")
+        return iter(extractions)
+
+    return _report_extractions(extractions, console, report_type, report_path(args, "extract", report_type))
+
+
+def _report_extractions(extractions: Iterable[Dict], console, report_type: str, path: str) -> Iterator[Dict]:
+    """
+    Generator behind `stream_extract_report`.
+    """
+    if report_type == "console":
+        console.print('Extracted Info:', style="cyan")
+
+        for extracted in extractions:
+            for key, value in extracted.items():
+                console.print(key, ':', value, style="success", markup=False)
+
+            console.print('\n')
+            yield extracted
+        return
+
+    from audiodotturn.report import open_report, EXTRACT_FIELDS
+
+    with open_report(report_type, path, "Extracted Info", EXTRACT_FIELDS) as report:
+        for extracted in extractions:
+            report.write(extracted)
+            yield extracted
+    print_report_summary(console, report)
 
 def main():
     """
     Main function.
     """
     try:
-        args, adt = init()
-        console = rich_inits()
-
-        if args.version:
-            console.print(adt.config.app_name, VERSION, style="cyan")
-
-        if args.settings:
-            settings = {
-                "audiodoturn": VERSION,
-                "config path": adt.config.config_path,
-                "db path": adt.config.db_path,
-                "constructors": adt.config.constructors,
-                "exts": adt.config.exts,
-                "output options": adt.config.output_opts,
-                "dry run": adt.config.dry
-            }
-
-            for key, value in settings.items():
-                console.print(key, ':', value)
-        
-        if args.command == "extract":
-            extract_commands(args, adt)
-
-        elif args.command == "construct":
-            construct_commands(args, adt)
-
-        elif args.command == "database":
-            database_commands(args, adt)
+        args = Parser().parse_args()
+
+        # version checks skip the AudioDotTurn stack and rich entirely
+        if args.version and not args.settings and args.command is None:
+            from audiodotturn.config.config import ConfigBase
+            print(ConfigBase().app_name, VERSION)
+            return
+
+        if forward(args):
+            return
+
+        with observe(args):
+            run_command(args)
 
     except Exception as error:
         print(error)
 
+
+def observe(args) -> contextlib.ExitStack:
+    """
+    Sets up --progress, --profile and --memprofile around a command. The progress display
+    is kept on args as `progress_display`, None without --progress.
+    """
+    stack = contextlib.ExitStack()
+    if args.cprofile or args.memprofile:
+        from audiodotturn.progress import RunProfiler
+        stack.enter_context(RunProfiler(args.cprofile, args.memprofile, args.profile_top))
+
+    args.progress_display = None
+    if args.progress:
+        from audiodotturn.progress import Progress
+        args.progress_display = stack.enter_context(Progress())
+    return stack
+
+
+def track(args, iterable: Iterable, stage: str, total: int = None) -> Iterable:
+    """
+    Counts the items of `iterable` to `stage` of the --progress display and times them for
+    the run metrics, `total` is the number of files when known up front.
+    """
+    if args.metrics is not None:
+        iterable = args.metrics.timed(iterable, stage)
+    display = args.progress_display
+    if display is None:
+        return iterable
+    if total is not None:
+        display.total = total
+    return display.track(iterable, stage)
+
+
+def start_metrics(args, adt: AudioDotTurn):
+    """
+    Returns the RunMetrics of the command, None unless a JSON summary or a Prometheus
+    textfile is asked for by --metrics-json/--metrics-prom or the config.
+    """
+    args.metrics_json = args.metrics_json or adt.settings.metrics_json
+    args.metrics_prom = args.metrics_prom or adt.settings.metrics_prometheus
+    if not (args.metrics_json or args.metrics_prom) or args.command is None:
+        return None
+
+    from audiodotturn.metrics import RunMetrics
+    return RunMetrics(args.command)
+
+
+def finish_metrics(args, adt: AudioDotTurn, metrics) -> None:
+    """
+    Writes the JSON summary and the Prometheus textfile of the command.
+    """
+    metrics.add_rules(adt.extractor.rules)
+    metrics.finish()
+    if args.metrics_json:
+        metrics.write_json(args.metrics_json.replace("{command}", args.command))
+    if args.metrics_prom:
+        metrics.write_prometheus(args.metrics_prom.replace("{command}", args.command))
+
+
+def run_command(args):
+    """
+    Runs the parsed command.
+    """
+    args, adt = init(args)
+    console = rich_inits()
+
+    # the config supplies defaults for scripted runs
+    # stdin carries the paths, so it cannot answer prompts as well
+    args.yes = args.yes or adt.settings.assume_yes or getattr(args, "stdin", False) or getattr(args, "stdin0", False)
+    args.report = args.report or adt.settings.report
+
+    if args.version:
+        console.print(adt.settings.app_name, VERSION, style="cyan")
+
+    if args.settings:
+        settings = {
+            "audiodoturn": VERSION,
+            "config path": adt.settings.config_path,
+            "db path": adt.settings.db_path,
+            "constructors": list(adt.settings.constructors),
+            "exts": list(adt.settings.exts),
+            "output options": list(adt.settings.output_opts),
+            "dry run": adt.settings.dry,
+            "probe tags": adt.settings.probe_tags
+        }
+
+        for key, value in settings.items():
+            console.print(key, ':', value)
+
+    args.metrics = start_metrics(args, adt)
+    with trace(args, adt) if args.trace else contextlib.nullcontext():
+        try:
+            dispatch(args, adt, console)
+        except BaseException:
+            if args.metrics is not None:
+                args.metrics.status = "failure"
+            raise
+        finally:
+            if args.metrics is not None:
+                finish_metrics(args, adt, args.metrics)
+
+
+@contextlib.contextmanager
+def trace(args, adt: AudioDotTurn):
+    """
+    Traces the pipeline hooks of the command to --trace, inside one span of the whole command.
+    """
+    from audiodotturn.hooks import Tracer
+
+    with Tracer(args.trace) as tracer:
+        tracer.attach(adt.hooks)
+        with tracer.span(f"adt {args.command}"):
+            yield
+
+
+def dispatch(args, adt: AudioDotTurn, console):
+    """
+    Runs the command handler.
+    """
+    if args.command == "extract":
+        extract_commands(args, adt)
+
+    elif args.command == "construct":
+        construct_commands(args, adt)
+
+    elif args.command == "database":
+        if args.profile:
+            # slow statements are logged to stderr while the command runs
+            import logging
+            logging.basicConfig(format="%(levelname)s %(name)s: %(message)s")
+            if args.slow is not None:
+                adt.database.profiler.threshold = args.slow / 1000
+        database_commands(args, adt)
+        if args.profile:
+            produce_query_profile(adt, console)
+
+    elif args.command == "scan":
+        scan_commands(args, adt)
+
+    elif args.command == "serve":
+        serve_commands(args, adt)
+
+    elif args.command == "undo":
+        undo_commands(args, adt)
+
 if __name__ == "__main__":
     main()
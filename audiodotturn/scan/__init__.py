@@ -0,0 +1 @@
+from audiodotturn.scan.scanning import Scanner
\ No newline at end of file
@@ -0,0 +1,301 @@
+import os
+import json
+import socket
+import hashlib
+import uuid
+from datetime import datetime
+from typing import Iterable, Iterator, List, Dict, Optional
+from audiodotturn.extract import Extractor
+from audiodotturn.database import Database, FileEntry
+from audiodotturn.ingest import Ingestor, IngestStats, walk
+
+
+class Scanner:
+    """
+    Multi-node scans. A manifest partitions the paths of a library into shards by a stable
+    hash of each path, every node extracts one shard into a portable bundle and the bundles
+    are merged into the main database afterwards.
+
+    Bundles are either SQLite databases (`.db`), written through the ingest pipeline and
+    merged with `Database.merge_database`, or NDJSON files (`.ndjson`, `.jsonl`) with one
+    extraction per line. Every bundle carries a unique id, merging a bundle twice is a no-op.
+
+    Attributes:
+        exts : Tuple of strings
+            The file extensions that are scanned.
+        output_opts : List of strings
+            Output options passed on to the Extractor.
+        workers : int
+            Extraction processes used for SQLite bundles, see Ingestor.
+        batch_size : int
+            Extractions per transaction when writing and merging bundles.
+    """
+    def __init__(self, exts: List[str], output_opts: List[str], workers: Optional[int] = None, batch_size: int = 1000) -> None:
+        self.exts = tuple(exts)
+        self.output_opts = output_opts
+        self.workers = workers
+        self.batch_size = max(1, batch_size)
+
+    @staticmethod
+    def shard_of(path: str, shards: int) -> int:
+        """
+        Returns the shard a path belongs to. The hash does not depend on the interpreter,
+        platform or run, so every node computes the same partitioning.
+
+        Parameters:
+            path (str): The file path.
+            shards (int): The number of shards.
+
+        Returns:
+            int: The shard index, 0 <= index < shards.
+        """
+        digest = hashlib.blake2b(path.encode("utf-8", "surrogateescape"), digest_size=8).digest()
+        return int.from_bytes(digest, "big") % shards
+
+    @staticmethod
+    def parse_shard(shard: str) -> tuple:
+        """
+        Parses a shard given as 'i/N'.
+
+        Returns:
+            tuple: (i, N)
+
+        Raises:
+            ValueError: If the value is not of the form 'i/N' with 0 <= i < N.
+        """
+        try:
+            index, shards = (int(value) for value in shard.split("/"))
+        except ValueError:
+            raise ValueError(f"shard must be given as i/N, got {shard}")
+        if shards < 1 or not 0 <= index < shards:
+            raise ValueError(f"shard index must be between 0 and {shards - 1}, got {shard}")
+        return index, shards
+
+    def plan(self, roots: List[str], shards: int, manifest_path: str) -> List[int]:
+        """
+        Walks the roots and writes a manifest assigning every matching file to a shard.
+
+        The manifest is NDJSON, a header line with the shard count and roots followed
+        by one {"path", "shard"} line per file.
+
+        Parameters:
+            roots (List[str]): Directories to walk, subdirectories included.
+            shards (int): The number of shards.
+            manifest_path (str): Where to write the manifest.
+
+        Returns:
+            List[int]: The number of files in each shard.
+        """
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+
+        counts = [0] * shards
+        roots = [os.path.abspath(root) for root in roots]
+
+        with open(manifest_path, "wt", encoding="utf-8") as manifest:
+            manifest.write(json.dumps({
+                "manifest": 1,
+                "shards": shards,
+                "roots": roots,
+                "exts": list(self.exts),
+                "created": datetime.now().isoformat()
+            }) + "\n")
+
+            for root in roots:
+                for entry in walk(root, self.exts):
+                    shard = self.shard_of(entry.path, shards)
+                    counts[shard] += 1
+                    manifest.write(json.dumps({"path": entry.path, "shard": shard}) + "\n")
+
+        return counts
+
+    def iter_manifest(self, manifest_path: str, shard: int, shards: int) -> Iterator[FileEntry]:
+        """
+        Yields the files of one shard of a manifest, stat values are read on this node.
+        Files that no longer exist are skipped.
+
+        Raises:
+            ValueError: If the manifest was planned for a different number of shards.
+        """
+        with open(manifest_path, "rt", encoding="utf-8") as manifest:
+            header = json.loads(manifest.readline())
+            if header.get("shards") != shards:
+                raise ValueError(f"manifest was planned for {header.get('shards')} shards, not {shards}")
+
+            for line in manifest:
+                item = json.loads(line)
+                if item["shard"] != shard:
+                    continue
+                try:
+                    stat = os.stat(item["path"])
+                except FileNotFoundError:
+                    continue
+                yield FileEntry(item["path"], stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+    def iter_roots(self, roots: List[str], shard: int, shards: int) -> Iterator[FileEntry]:
+        """
+        Yields the files of one shard by walking the roots directly, no manifest needed.
+        """
+        for root in roots:
+            for entry in walk(root, self.exts):
+                if self.shard_of(entry.path, shards) == shard:
+                    yield entry
+
+    def run(
+        self,
+        shard: int,
+        shards: int,
+        bundle_path: str,
+        manifest_path: str = None,
+        roots: List[str] = None
+    ) -> IngestStats:
+        """
+        Extracts one shard, from a manifest or by walking roots, and writes it into a bundle.
+
+        Parameters:
+            shard (int): The shard to extract.
+            shards (int): The number of shards.
+            bundle_path (str): Where to write the bundle, the format follows the extension.
+            manifest_path (str, optional): A manifest written by `plan`.
+            roots (List[str], optional): Directories to walk instead of a manifest.
+
+        Returns:
+            IngestStats: The counters of the run.
+        """
+        if manifest_path is not None:
+            entries = self.iter_manifest(manifest_path, shard, shards)
+        elif roots:
+            entries = self.iter_roots(roots, shard, shards)
+        else:
+            raise TypeError("a manifest or at least one root is required")
+
+        header = {
+            "bundle_id": uuid.uuid4().hex,
+            "shard": shard,
+            "shards": shards,
+            "host": socket.gethostname(),
+            "created": datetime.now().isoformat()
+        }
+
+        if self.bundle_format(bundle_path) == "ndjson":
+            return self._run_ndjson(entries, bundle_path, header)
+
+        if os.path.exists(bundle_path):
+            raise FileExistsError(f"bundle {bundle_path} already exists")
+
+        bundle = Database(bundle_path)
+        ingestor = Ingestor(bundle, self.exts, self.output_opts, workers=self.workers, batch_size=self.batch_size)
+        stats = ingestor.run(entries)
+
+        conn = bundle.connect()
+        conn.execute('CREATE TABLE bundle (bundle_id TEXT, shard INTEGER, shards INTEGER, host TEXT, created TEXT)')
+        conn.execute('INSERT INTO bundle VALUES (:bundle_id, :shard, :shards, :host, :created)', header)
+        conn.commit()
+        conn.close()
+        return stats
+
+    def _run_ndjson(self, entries: Iterable[FileEntry], bundle_path: str, header: Dict) -> IngestStats:
+        """
+        Writes one shard as NDJSON, a header line followed by one extraction per line
+        with the path and stat values of its file.
+        """
+        stats = IngestStats()
+        extractor = Extractor(self.exts, self.output_opts)
+
+        with open(bundle_path, "xt", encoding="utf-8") as bundle:
+            bundle.write(json.dumps(header) + "\n")
+            for entry in entries:
+                stats.walked += 1
+                extractor.complex_extract(entry.path)
+                record = dict(extractor.get_extraction("dict"), **entry._asdict())
+                bundle.write(json.dumps(record) + "\n")
+                stats.extracted += 1
+                stats.written += 1
+                if not record["status"]:
+                    stats.failure += 1
+
+        return stats
+
+    def merge(self, database: Database, bundle_path: str) -> Optional[tuple]:
+        """
+        Merges a bundle into the database.
+
+        Parameters:
+            database (Database): The main database.
+            bundle_path (str): A bundle written by `run`.
+
+        Returns:
+            tuple: (new_artists, new_songs, updated, files), or None if the bundle was merged before.
+        """
+        database.create_database()
+        database.create_tables()
+
+        if self.bundle_format(bundle_path) == "ndjson":
+            with open(bundle_path, "rt", encoding="utf-8") as bundle:
+                header = json.loads(bundle.readline())
+                if database.is_merged(header["bundle_id"]):
+                    return None
+                return self._merge_ndjson(database, bundle, header)
+
+        conn = Database(bundle_path).connect()
+        row = conn.execute('SELECT bundle_id, shard, shards FROM bundle').fetchone()
+        conn.close()
+        header = {"bundle_id": row[0], "shard": row[1], "shards": row[2]}
+
+        if database.is_merged(header["bundle_id"]):
+            return None
+        return database.merge_database(bundle_path, header)
+
+    def _merge_ndjson(self, database: Database, lines: Iterable[str], header: Dict) -> tuple:
+        """
+        Upserts the extractions of an NDJSON bundle in batches, all in one transaction
+        together with the bundle record.
+        """
+        new_artists = new_songs = updated = files = 0
+        conn = database.connect()
+        cursor = conn.cursor()
+
+        try:
+            data = []
+            entries = []
+            for line in lines:
+                record = json.loads(line)
+                entries.append(FileEntry(record.pop("path"), record.pop("size"), record.pop("mtime_ns"), record.pop("inode")))
+                data.append(record)
+                if len(data) >= self.batch_size:
+                    stats = database.update_rows(cursor, data, entries)
+                    new_artists, new_songs, updated = new_artists + stats[0], new_songs + stats[1], updated + stats[2]
+                    files += len(entries)
+                    data = []
+                    entries = []
+
+            if data:
+                stats = database.update_rows(cursor, data, entries)
+                new_artists, new_songs, updated = new_artists + stats[0], new_songs + stats[1], updated + stats[2]
+                files += len(entries)
+
+            database.record_bundle(cursor, header)
+            conn.commit()
+
+        except:
+            conn.rollback()
+            raise
+
+        finally:
+            conn.close()
+
+        return new_artists, new_songs, updated, files
+
+    @staticmethod
+    def bundle_format(bundle_path: str) -> str:
+        """
+        Returns 'ndjson' for `.ndjson` and `.jsonl` bundles and 'sqlite' for `.db` bundles.
+
+        Raises:
+            TypeError: For any other extension.
+        """
+        if bundle_path.endswith((".ndjson", ".jsonl")):
+            return "ndjson"
+        if bundle_path.endswith(".db"):
+            return "sqlite"
+        raise TypeError("bundle must be a .db, .ndjson or .jsonl file")
@@ -0,0 +1,2 @@
+from audiodotturn.serve.server import Server
+from audiodotturn.serve.client import Client
\ No newline at end of file
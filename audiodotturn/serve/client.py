@@ -0,0 +1,70 @@
+import json
+import socket
+from typing import Any, Optional
+
+
+class Client:
+    """
+    Thin client of the `adt serve` daemon, only needs the standard library so forwarding
+    a request costs far less than starting the full program.
+
+    One connection is kept open for the lifetime of the client, requests on it are
+    answered in order.
+
+    Attributes:
+        socket_path : str
+            The socket of the daemon.
+    """
+    def __init__(self, socket_path: str, timeout: Optional[float] = None) -> None:
+        """
+        Connects to the daemon.
+
+        Raises:
+            OSError: If no daemon is listening on `socket_path`.
+        """
+        self.socket_path = socket_path
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        try:
+            self._sock.connect(socket_path)
+        except OSError:
+            self._sock.close()
+            raise
+        self._file = self._sock.makefile("rwb")
+
+    @classmethod
+    def connect(cls, socket_path: str, timeout: Optional[float] = None) -> Optional["Client"]:
+        """
+        Returns a connected client, or None if no daemon is running.
+        """
+        try:
+            return cls(socket_path, timeout)
+        except (FileNotFoundError, ConnectionRefusedError):
+            return None
+
+    def request(self, op: str, **params) -> Any:
+        """
+        Sends one request and waits for its result, see `Server` for the operations.
+
+        Raises:
+            RuntimeError: If the daemon reports an error or closes the connection.
+        """
+        self._file.write(json.dumps(dict(params, op=op)).encode("utf-8") + b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise RuntimeError("daemon closed the connection")
+        response = json.loads(line)
+        if not response["ok"]:
+            raise RuntimeError(f"{response['type']}: {response['error']}")
+        return response["result"]
+
+    def close(self) -> None:
+        self._file.close()
+        self._sock.close()
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import os
+import json
+import queue
+import socket
+import threading
+import itertools
+import contextlib
+import socketserver
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple, TYPE_CHECKING
+from audiodotturn import VERSION
+from audiodotturn.extract import Extractor
+from audiodotturn.construct import Constructor
+
+if TYPE_CHECKING:
+    from audiodotturn.adt import AudioDotTurn
+
+# extractions a construct request probes the embedded tags of at once
+PROBE_CHUNK = 1000
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """
+    Serves one client connection, one JSON request per line and one JSON response per line.
+    """
+    def handle(self) -> None:
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                response = {"ok": True, "result": self.server.app.handle_request(request)}
+            except Exception as error:
+                response = {"ok": False, "error": str(error), "type": type(error).__name__}
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+            if self.server.app.stopping:
+                # only once the response is out, the process exits as soon as serving stops,
+                # and shutdown waits for serve_forever to return so it needs its own thread
+                threading.Thread(target=self.server.app.shutdown).start()
+                return
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, app: Server) -> None:
+        self.app = app
+        super().__init__(socket_path, _Handler)
+
+
+class Server:
+    """
+    The `adt serve` daemon. Listens on a Unix domain socket and answers JSON-lines
+    requests, every connection is served by its own thread so clients run concurrently.
+
+    A request is an object with an 'op' and its parameters, the response is
+    {"ok": true, "result": ...} or {"ok": false, "error": "...", "type": "..."}.
+
+        {"op": "ping"}
+        {"op": "extract", "files": [...], "output_format": "dict", "probe_tags": false}
+        {"op": "construct", "files": [...] | "records": [...] | "query": {...},
+            "constructor": "simple", "auto": false, "option": null, "probe_tags": false}
+        {"op": "query", "query": "artists" | "artist" | "songs" | "artist_songs" | "song" | "extractions",
+            "id": 1, "filters": {...}}
+        {"op": "ingest", "paths": [...], "batch_size": 1000}
+        {"op": "shutdown"}
+
+    The config, compiled constructor templates and database schema are set up once.
+    Extractors keep per-extraction state, so warm ones are kept in a pool and lent to one
+    request at a time. Ingests are serialized, SQLite only has one writer anyway. With
+    `reload_config` set on the AudioDotTurn instance a changed config is picked up by the
+    next request, the pool is then refilled with extractors of the new settings.
+
+    Attributes:
+        adt : AudioDotTurn
+            The instance requests are run against.
+        socket_path : str
+            The socket the daemon listens on.
+        stopping : bool
+            Set by a shutdown request, the daemon stops after answering it.
+    """
+    def __init__(self, adt: AudioDotTurn, socket_path: str) -> None:
+        self.adt = adt
+        self.socket_path = socket_path
+        self._extractors = queue.SimpleQueue()
+        self._pool_settings = None
+        self._write_lock = threading.Lock()
+        self._server = None
+        self.stopping = False
+
+    def serve_forever(self) -> None:
+        """
+        Binds the socket and serves until `shutdown` or a shutdown request.
+
+        Raises:
+            RuntimeError: If another daemon is already listening on the socket.
+        """
+        # warm everything a first request would otherwise pay for
+        self.adt.templates
+        if not self.adt.database.readonly:
+            self.adt.database.create_database()
+            self.adt.database.create_tables()
+
+        self._remove_stale_socket()
+        # the socket is created owner-only, there is no window where others can connect
+        umask = os.umask(0o077)
+        try:
+            self._server = _UnixServer(self.socket_path, self)
+        finally:
+            os.umask(umask)
+        os.chmod(self.socket_path, 0o600)
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self.socket_path)
+
+    def shutdown(self) -> None:
+        """
+        Stops `serve_forever` from another thread.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+
+    def _remove_stale_socket(self) -> None:
+        """
+        Removes a socket left behind by a daemon that did not exit cleanly.
+        """
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(self.socket_path)
+        else:
+            raise RuntimeError(f"a daemon is already listening on {self.socket_path}")
+        finally:
+            probe.close()
+
+    def handle_request(self, request: Dict) -> Any:
+        """
+        Runs one request and returns its result.
+
+        Raises:
+            TypeError: For unknown operations.
+        """
+        params = dict(request)
+        op = params.pop("op", None)
+        handler = getattr(self, f"op_{op}", None)
+        if handler is None:
+            raise TypeError(f"unknown op {op}")
+        return handler(**params)
+
+    @contextlib.contextmanager
+    def _extractor(self) -> Iterator[Extractor]:
+        """
+        Lends a warm Extractor from the pool, a new one is built when all are in use.
+        """
+        settings = self.adt.settings
+        if settings is not self._pool_settings:
+            self._extractors = queue.SimpleQueue()
+            self._pool_settings = settings
+        pool = self._extractors
+
+        try:
+            extractor = pool.get_nowait()
+        except queue.Empty:
+            extractor = Extractor(settings.exts, settings.output_opts)
+        try:
+            yield extractor
+        finally:
+            # extractors of replaced settings are dropped with their pool
+            pool.put(extractor)
+
+    def op_ping(self) -> Dict:
+        return {"version": VERSION, "pid": os.getpid(), "socket": self.socket_path}
+
+    def op_extract(self, files: List[str], output_format: str = "dict", probe_tags: bool = False) -> List[Any]:
+        # the client's probe_tags is used, the daemon may run with another config
+        with self._extractor() as extractor:
+            if not probe_tags:
+                return extractor.extract_complex_list(files, output_format)
+            extractions = extractor.extract_complex_list(files)
+            from audiodotturn.probe import fill_extractions
+            fill_extractions(files, extractions, self.adt.settings.exts)
+            return [extractor.format_extraction(data, output_format) for data in extractions]
+
+    def op_construct(
+        self,
+        files: List[str] = None,
+        records: List[Dict] = None,
+        query: Dict = None,
+        constructor: str = "simple",
+        auto: bool = False,
+        option: int = None,
+        probe_tags: bool = False
+    ) -> List[list]:
+        if constructor not in self.adt.settings.constructors:
+            raise TypeError(f"constructor {constructor} does not exist")
+        builder = Constructor(None, constructor, auto, self.adt.templates, option)
+
+        if files is not None and query is None:
+            with self._extractor() as extractor:
+                extractions = extractor.iter_extract(files)
+                if probe_tags:
+                    extractions = self._fill_tags(zip(files, extractions))
+                return [list(result) for result in builder.iter_construct(extractions)]
+
+        # catalogued records and records sent by the client carry their file as 'path'
+        extractions = self.adt.database.iter_extractions(query) if query is not None else records or []
+        if probe_tags:
+            extractions = self._fill_tags((record.get("path"), record) for record in extractions)
+        return [list(result) for result in builder.iter_construct(extractions)]
+
+    def _fill_tags(self, pairs: Iterable[Tuple[Optional[str], Dict]]) -> Iterator[Dict]:
+        """
+        Fills (path, extraction) pairs from the embedded tags of their files PROBE_CHUNK at a
+        time, see `audiodotturn.probe.fill_extractions`. Extractions without a path pass through.
+        """
+        from audiodotturn.probe import fill_extractions
+
+        pairs = iter(pairs)
+        while chunk := list(itertools.islice(pairs, PROBE_CHUNK)):
+            extractions = [extraction for _, extraction in chunk]
+            fill_extractions([path or "" for path, _ in chunk], extractions, self.adt.settings.exts)
+            yield from extractions
+
+    def op_query(self, query: str, id: int = None, filters: Dict = None) -> Any:
+        match query:
+            case "artists":
+                return self.adt.get_all_artists()
+            case "artist":
+                return self.adt.get_artist_by_id(id)
+            case "songs":
+                return self.adt.get_all_artists_and_songs()
+            case "artist_songs":
+                return self.adt.get_songs_by_artist(id)
+            case "song":
+                return self.adt.get_song_by_id(id)
+            case "extractions":
+                return list(self.adt.database.iter_extractions(filters))
+        raise TypeError(f"unknown query {query}")
+
+    def op_ingest(self, paths: List[str], batch_size: int = 1000) -> Dict:
+        with self._write_lock:
+            # requests are small, extraction runs inline instead of starting a process pool
+            stats = self.adt.ingest(paths, workers=0, batch_size=batch_size)
+        new_artists, new_songs, updated, failure = stats.totals()
+        return {"new_artists": new_artists, "new_songs": new_songs, "updated": updated, "failure": failure}
+
+    def op_shutdown(self) -> bool:
+        self.stopping = True
+        return True
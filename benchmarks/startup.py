@@ -0,0 +1,87 @@
+"""
+Startup time benchmark for the adt command.
+
+Every command is started RUNS times in a fresh interpreter and the median wall time is
+compared with its budget, the script exits with status 1 if any command is over budget
+or if a version check imports one of the modules in LAZY_MODULES.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 50
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# median wall time in ms each command may take, interpreter startup included
+BUDGETS = {
+    "-v": 120,
+    "-h": 120,
+    "-s": 250,
+}
+
+# modules `adt -v` must not import
+LAZY_MODULES = ["rich", "yaml", "pkg_resources", "sqlite3", "concurrent.futures", "audiodotturn.adt"]
+
+
+def wall_time(argv, env):
+    """
+    Returns the wall time in ms of running `argv` once.
+    """
+    start = time.perf_counter()
+    subprocess.run(argv, env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def imported_modules(args, env):
+    """
+    Returns the modules loaded by running the cli with `args`.
+    """
+    code = (
+        "import sys, json, contextlib, io\n"
+        f"sys.argv = ['adt', *{args!r}]\n"
+        "from audiodotturn.run import main\n"
+        "with contextlib.redirect_stdout(io.StringIO()):\n"
+        "    main()\n"
+        "print(json.dumps(sorted(sys.modules)))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], env=env, cwd=ROOT, capture_output=True, text=True, check=True)
+    return set(json.loads(result.stdout))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure adt startup time against its budget.")
+    parser.add_argument("--runs", type=int, default=20, help="Runs per command, default is 20.")
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    failed = False
+
+    # the interpreter alone, for reference
+    baseline = statistics.median(wall_time([sys.executable, "-c", "pass"], env) for _ in range(args.runs))
+    print(f"{'python -c pass':<16}{baseline:8.1f} ms")
+
+    for command, budget in BUDGETS.items():
+        median = statistics.median(
+            wall_time([sys.executable, "-m", "audiodotturn.run", command], env) for _ in range(args.runs)
+        )
+        over = median > budget
+        failed = failed or over
+        print(f"{'adt ' + command:<16}{median:8.1f} ms   budget {budget} ms{'   OVER BUDGET' if over else ''}")
+
+    loaded = imported_modules(["-v"], env)
+    eager = [module for module in LAZY_MODULES if module in loaded]
+    if eager:
+        failed = True
+        print(f"adt -v imported: {', '.join(eager)}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())